@@ -3,6 +3,14 @@
 This module defines a custom graph.
 """
 
-from agent.graph import graph
-
 __all__ = ["graph"]
+
+
+def __getattr__(name: str):
+    # Compile the graph on first access, so importing the package (or one of
+    # its submodules such as the configuration) stays cheap.
+    if name == "graph":
+        from agent.graph import graph
+
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
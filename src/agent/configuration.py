@@ -2,12 +2,11 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, fields, field
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Literal
 from typing import Annotated
-from langchain_core.runnables import RunnableConfig
 from src.agent import prompts
-from src.shared.configuration import BaseConfiguration 
+from src.shared.configuration import BaseConfiguration, _env
 
 @dataclass(kw_only=True)
 class Configuration(BaseConfiguration):
@@ -33,6 +32,104 @@ class Configuration(BaseConfiguration):
             "description": "The fields to retrieve from the Milvus search results."
         },
     )
+    top_k: int = field(
+        default=3,
+        metadata={"description": "Number of documents retrieved per query."},
+    )
+    retrieval_mode: Literal["single", "multi_query"] = field(
+        default="single",
+        metadata={
+            "description": "'single' searches with the question only. 'multi_query' also generates paraphrases "
+            "in one LLM call, searches with all of them in one batch and merges the hits before grading."
+        },
+    )
+    num_query_variants: int = field(
+        default=3,
+        metadata={"description": "Paraphrases generated in multi_query retrieval mode."},
+    )
+    diversity_mode: Literal["off", "dedup", "mmr"] = field(
+        default="off",
+        metadata={
+            "description": "Post-retrieval diversity: collapse near-duplicate hits, or collapse them and rerank "
+            "the rest by maximal marginal relevance, so fewer redundant documents are graded."
+        },
+    )
+    dedup_threshold: float = field(
+        default=0.95,
+        metadata={"description": "Cosine similarity at or above which two hits count as near-duplicates."},
+    )
+    mmr_lambda: float = field(
+        default=0.7,
+        metadata={"description": "MMR trade-off between relevance (1.0) and diversity (0.0)."},
+    )
+    diversity_fetch_factor: int = field(
+        default=2,
+        metadata={"description": "Hits fetched per requested hit when diversity is on, so removed duplicates are replaced."},
+    )
+    extract_filters: bool = field(
+        default=False,
+        metadata={
+            "description": "Let the router extract genre, year and source filters from the question; "
+            "retrieval then only searches matching documents."
+        },
+    )
+    classifier_mode: Literal["llm", "cascade"] = field(
+        default="llm",
+        metadata={
+            "description": "How routing and grading are decided: always by query_model / response_model, or by "
+            "a local embedding classifier first, calling the LLM only when it is not confident."
+        },
+    )
+    cascade_embedding_model: str = field(
+        default="local/all-MiniLM-L6-v2",
+        metadata={"description": "Embedding model of the local cascade classifiers."},
+    )
+    cascade_router_margin: float = field(
+        default=0.08,
+        metadata={"description": "Similarity margin between the two closest route centroids needed to skip the LLM router."},
+    )
+    cascade_relevance_high: float = field(
+        default=0.6,
+        metadata={"description": "Question-document similarity at or above which a document is relevant without the LLM grader."},
+    )
+    cascade_relevance_low: float = field(
+        default=0.15,
+        metadata={"description": "Question-document similarity at or below which a document is irrelevant without the LLM grader."},
+    )
+    cascade_grounding_high: float = field(
+        default=0.85,
+        metadata={"description": "Answer-document similarity at or above which an answer counts as grounded without the LLM grader."},
+    )
+    cascade_audit_rate: float = field(
+        default=0.05,
+        metadata={"description": "Share of confident local decisions also sent to the LLM to keep measuring agreement."},
+    )
+    speculative_retrieval: bool = field(
+        default=False,
+        metadata={
+            "description": "Start retrieval together with the router call. The documents are used when the query "
+            "is routed to research and discarded otherwise, saving one LLM round trip for movie queries."
+        },
+    )
+    memo_backend: Literal["off", "memory", "sqlite"] = field(
+        default="off",
+        metadata={
+            "description": "Cache of routing, grading and rewriting results keyed by their inputs, model and prompt: "
+            "a per-process LRU, or a SQLite file shared by processes and kept across restarts."
+        },
+    )
+    memo_path: str = field(
+        default_factory=_env("MEMO_DB", "node_memo.sqlite"),
+        metadata={"description": "Database file of the sqlite memo backend."},
+    )
+    memo_ttl_seconds: float = field(
+        default=3600.0,
+        metadata={"description": "Seconds a memoized result is reused."},
+    )
+    memo_max_entries: int = field(
+        default=4096,
+        metadata={"description": "Entries kept by the memo backend before the oldest are evicted."},
+    )
     # prompts
     router_system_prompt: str = field(
         default=prompts.ROUTER_SYSTEM_PROMPT,
@@ -48,18 +145,23 @@ class Configuration(BaseConfiguration):
         },
     )
 
+    multi_query_system_prompt: str = field(
+        default=prompts.MULTI_QUERY_SYSTEM_PROMPT,
+        metadata={
+            "description": "The system prompt used for generating paraphrases of the question in multi_query retrieval mode."
+        },
+    )
+
+    rewriter_system_prompt: str = field(
+        default=prompts.REWRITER_SYSTEM_PROMPT,
+        metadata={
+            "description": "The system prompt used for rewriting a question when no relevant documents were found."
+        },
+    )
+
     response_system_prompt: str = field(
         default=prompts.RESPONSE_SYSTEM_PROMPT,
         metadata={
             "description": "The system prompt used for generating responses to user questions."
         },
     )
-    
-    @classmethod
-    def from_runnable_config(
-        cls, config: Optional[RunnableConfig] = None
-    ) -> Configuration:
-        """Create a Configuration instance from a RunnableConfig object."""
-        configurable = (config.get("configurable") or {}) if config else {}
-        _fields = {f.name for f in fields(cls) if f.init}
-        return cls(**{k: v for k, v in configurable.items() if k in _fields})
@@ -3,17 +3,36 @@
 This agent returns a predefined response without using an actual LLM.
 """
 
-from typing import Any, Dict, Literal, cast
+import asyncio
+import logging
+from functools import cache
+from typing import Any, Awaitable, Callable, Dict, Literal, cast
 
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.graph import StateGraph, END, START
+from langgraph.graph import END, START, StateGraph
 
 from src.agent.configuration import Configuration
-from src.agent.state import AgentState, InputState, Router
+from src.agent.prompts import ROUTER_EXAMPLES, ROUTER_FILTERS_PROMPT
+from src.agent.rag_self_reflection.graph import fetch_documents
 from src.agent.rag_self_reflection.graph import graph as rag_self_reflection_graph
-
+from src.agent.state import AgentState, FilteredRouter, InputState, Router
+from src.services.metrics import metrics
+from src.services.resilience import ainvoke_with_retry
+from src.shared.cascade import CentroidClassifier, cascade, decide_locally, get_embedder
+from src.shared.history import (
+    history_prompt,
+    messages_to_summarize,
+    remove_messages,
+    summarize_messages,
+)
+from src.shared.memoize import memoize
 from src.shared.utils import load_chat_model
 
+logger = logging.getLogger(__name__)
+
+
 async def analyze_and_route_query(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     configuration = Configuration.from_runnable_config(config)
     # configuration = Configuration.from_runnable_config(config)
@@ -21,17 +40,129 @@ async def analyze_and_route_query(state: AgentState, config: RunnableConfig) ->
     print(configuration.query_model)
     model = load_chat_model(configuration.query_model)
     print(model)
-    messages = [
-        {"role": "system", "content": configuration.router_system_prompt}
-    ] + state.messages
+    endpoint = f"llm:{configuration.query_model}"
+    # The router sees the running summary plus a fixed window of recent messages.
+    system_prompt = configuration.router_system_prompt
+    if configuration.extract_filters:
+        system_prompt += ROUTER_FILTERS_PROMPT
+    messages = history_prompt(
+        system_prompt,
+        state.messages,
+        max_messages=configuration.max_history_messages,
+        summary=state.summary,
+    )
     print("Messages")
     print(messages)
-    response = cast(
-        Router, await model.with_structured_output(Router).ainvoke(messages)
+    def llm_route() -> Awaitable[Router]:
+        # Keyed by the whole prompt, so the same conversation is only routed once.
+        return llm_route_messages(configuration, messages)
+
+    # Filters can only come from the LLM router, so extract_filters bypasses the cascade.
+    if configuration.classifier_mode == "cascade" and not configuration.extract_filters:
+        route = cascade_route(configuration, _latest_question(state).content, llm_route)
+    else:
+        route = llm_route()
+
+    # Side work runs while the router is thinking: folding old turns into the
+    # summary and, in speculative mode, retrieval for the likely movie query.
+    to_summarize = messages_to_summarize(
+        state.messages, configuration.max_history_messages, configuration.summary_batch_size
     )
-    print("Response")
-    print(response)
-    return {"router": response}
+    summarize = prefetch = None
+    if to_summarize:
+        summarize = asyncio.create_task(summarize_messages(model, state.summary, to_summarize, endpoint=endpoint))
+    if configuration.speculative_retrieval:
+        prefetch = asyncio.create_task(fetch_documents(_latest_question(state).content, configuration))
+    try:
+        response = cast(Router, await route)
+        print("Response")
+        print(response)
+        update: Dict[str, Any] = {"router": response}
+        if summarize:
+            update["summary"] = await summarize
+            update["messages"] = remove_messages(to_summarize)
+        if prefetch:
+            # The prefetch ran unfiltered, so it is only usable when no filters were extracted.
+            needed = response["type"] == "movie" and not router_filters(response)
+            update["prefetched_documents"] = await _use_prefetch(prefetch, needed)
+        return update
+    finally:
+        for task in (summarize, prefetch):
+            if task and not task.done():
+                task.cancel()
+
+
+@memoize("router", lambda c: (c.query_model, c.extract_filters))
+async def llm_route_messages(configuration: Configuration, messages: list[Any]) -> Router:
+    """Return the LLM router's answer for a prompt built by ``history_prompt``."""
+    router_schema = FilteredRouter if configuration.extract_filters else Router
+    return await ainvoke_with_retry(
+        load_chat_model(configuration.query_model).with_structured_output(router_schema),
+        messages,
+        endpoint=f"llm:{configuration.query_model}",
+    )
+
+
+@cache
+def get_router_classifier(model_name: str, min_margin: float) -> CentroidClassifier:
+    """Local router over ``ROUTER_EXAMPLES``, built once per embedding model and margin."""
+    return CentroidClassifier(get_embedder(model_name), ROUTER_EXAMPLES, min_margin)
+
+
+async def cascade_route(
+    configuration: Configuration, question: str, llm_route: Callable[[], Awaitable[Router]]
+) -> Router:
+    """Route with the local classifier, calling the LLM router only when it is not confident."""
+    decision = await decide_locally(
+        "router",
+        lambda: get_router_classifier(
+            configuration.cascade_embedding_model, configuration.cascade_router_margin
+        ).classify(question),
+    )
+    answered: Dict[str, Router] = {}
+
+    async def escalate() -> str:
+        answered["llm"] = await llm_route()
+        return answered["llm"]["type"]
+
+    label = await cascade("router", decision, escalate, configuration.cascade_audit_rate)
+    # The LLM's answer wins whenever it was asked.
+    return answered.get("llm") or {"type": label, "logic": f"local classifier (margin {decision.confidence:.2f})"}
+
+
+def router_filters(router: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata filters (see MilvusHandler.build_filter) from the router's output."""
+    filters: Dict[str, Any] = {}
+    if router.get("genre"):
+        filters["genre"] = router["genre"]
+    if router.get("source"):
+        filters["source"] = router["source"]
+    years = {"gte": router.get("year_from"), "lte": router.get("year_to")}
+    if any(year is not None for year in years.values()):
+        filters["year"] = years
+    return filters
+
+
+def _latest_question(state: AgentState) -> HumanMessage:
+    # Older turns may have been folded into the summary, so use the latest question.
+    return next(m for m in reversed(state.messages) if isinstance(m, HumanMessage))
+
+
+async def _use_prefetch(task: asyncio.Task, needed: bool) -> list[Document]:
+    """Documents from a speculative retrieval, or [] when the route does not need them."""
+    if not needed:
+        task.cancel()
+        metrics.incr("speculation.discarded", node="retrieve_documents")
+        return []
+    try:
+        documents = await task
+    except Exception as exc:
+        # The research graph simply retrieves again.
+        logger.warning("Speculative retrieval failed: %s", exc)
+        metrics.incr("speculation.failed", node="retrieve_documents")
+        return []
+    metrics.incr("speculation.used", node="retrieve_documents")
+    return documents
 
 def route_query(state: AgentState) -> Literal["create_research_plan", "ask_for_more_info", "respond_to_general_query"]:
     """Determine the next step based on the query classification.
@@ -58,11 +189,20 @@ def route_query(state: AgentState) -> Literal["create_research_plan", "ask_for_m
 
 async def create_research_plan(state: AgentState, *, config: RunnableConfig) -> dict[str, list[str] | str]:
     print("Creating research plan")
-    print(state.messages[0])
-    question_content = state.messages[0].content
-    result = await rag_self_reflection_graph.ainvoke({"question": question_content})
+    question = _latest_question(state)
+    print(question)
+    question_content = question.content
+    # Passing the config lets the subgraph share the parent's thread and checkpointer.
+    result = await rag_self_reflection_graph.ainvoke(
+        {
+            "question": question_content,
+            "filters": router_filters(state.router),
+            "prefetched_documents": state.prefetched_documents,
+        },
+        config,
+    )
     print(result)
-    return {"steps": "result"}
+    return {"steps": "result", "prefetched_documents": []}
 
 async def ask_for_more_info(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     print("Asking for more info")
@@ -17,11 +17,68 @@ This will be used to help a user find a moview they are looking for.
 ## `general`
 Classify a user inquiry as this if it is just a general question"""
 
+# Example inquiries per route for the local cascade router (see src/shared/cascade.py).
+ROUTER_EXAMPLES = {
+    "more-info": [
+        "I don't know what to do tonight",
+        "I'm bored, help me",
+        "Can you recommend something?",
+        "I want to watch something but I can't decide",
+        "What should I pick?",
+    ],
+    "movie": [
+        "Who directed Dune: Part Two?",
+        "Recommend a science fiction movie from the 90s",
+        "What is the plot of The Godfather?",
+        "Which actors star in Parasite?",
+        "Find me a comedy film with Jim Carrey",
+        "When was Spirited Away released?",
+    ],
+    "general": [
+        "What is the capital of France?",
+        "How are you today?",
+        "Explain how photosynthesis works",
+        "What time is it in Tokyo?",
+        "Tell me a joke",
+    ],
+}
+
+ROUTER_FILTERS_PROMPT = """
+
+If the inquiry is about movies, also extract filters it clearly implies, and leave the others empty:
+- `genre`: a single lower-case genre such as "drama", "comedy" or "science fiction";
+- `year_from` / `year_to`: the release years it asks about (e.g. "90s movies" -> 1990 and 1999);
+- `source`: a specific website or source the user names."""
+
 GRADER_SYSTEM_PROMPT = """You are a grader assessing relevance of a retrieved document to a user question. \n 
 If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
 It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
 Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
 
+MULTI_QUERY_SYSTEM_PROMPT = """You are helping a vector database find documents for a user question. \
+Write {count} different versions of the question. Each version should be concise and specific, and should \
+approach the underlying intent from a different angle (other wording, synonyms, a narrower or broader phrasing), \
+so that together they retrieve documents a single phrasing would miss."""
+
+REWRITER_SYSTEM_PROMPT = """You are a question rewriter. Your job is to take an input question and improve it for use in a vector database retrieval system.
+Use the following guidelines:
+1. Focus on the underlying intent of the question.
+2. Make the question concise but specific.
+3. Ensure the rephrased question is semantically meaningful and optimized for retrieval."""
+
+HALLUCINATION_GRADER_SYSTEM_PROMPT = """You are a grader assessing whether a generated response is grounded in / supported by a set of retrieved documents.
+Use the following criteria:
+1. If the response aligns with the content of the documents, grade it as 'yes'.
+2. If the response introduces information not found in the documents or conflicts with them, grade it as 'no'.
+Provide an explanation for your grade."""
+
+HALLUCINATION_GRADER_HUMAN_PROMPT = """Set of documents:
+{context}
+
+Question: {question}
+
+Generated Response: {generation}"""
+
 
 RESPONSE_SYSTEM_PROMPT = """\
 You are an expert programmer and problem-solver, tasked with answering any question \
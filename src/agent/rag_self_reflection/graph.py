@@ -1,23 +1,127 @@
-from typing import Any, Dict, List, cast
+import asyncio
+import string
+from functools import lru_cache
+from typing import Any, Awaitable, Dict, List, Optional, cast
 from langchain_core.documents import Document
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from langchain_core.messages import BaseMessage
 
-from src.services.milvus_handler import MilvusHandler
+from src.services.milvus_handler import MilvusHandler, merge_hits
 from src.services.embedding_handler import EmbeddingHandler
+from src.services.resilience import ainvoke_with_retry
+from src.services.metrics import metrics
+from src.shared.cascade import SimilarityGate, cascade, decide_locally, get_embedder
+from src.shared.diversity import diversify
+from src.shared.memoize import memoize
 from src.shared.utils import load_chat_model, format_docs
 
+from src.agent import prompts
 from src.agent.configuration import Configuration
-from src.agent.rag_self_reflection.state import ResearcherState, Grader, RewriterResponse
+from src.agent.rag_self_reflection.state import ResearcherState, Grader, QueryVariants, RewriterResponse
 
-def retrieve_documents(
+async def generate_query_variants(question: str, configuration: Configuration) -> list[str]:
+    """Paraphrase ``question`` in a single LLM call for multi-query retrieval."""
+    model = load_chat_model(configuration.query_model)
+    messages = [
+        {
+            "role": "system",
+            "content": configuration.multi_query_system_prompt.format(count=configuration.num_query_variants),
+        },
+        {"role": "human", "content": question},
+    ]
+    response = await ainvoke_with_retry(
+        model.with_structured_output(QueryVariants), messages, endpoint=f"llm:{configuration.query_model}"
+    )
+    variants = [query.strip() for query in response["queries"] if query.strip()]
+    return variants[: configuration.num_query_variants]
+
+
+def search_documents(
+    queries: list[str], configuration: Configuration, filters: Optional[dict] = None
+) -> list[Document]:
+    """Embed ``queries`` in one batch, search them in one Milvus request and merge the hits.
+
+    With ``diversity_mode`` on, more hits are fetched together with their
+    vectors, near-duplicates are collapsed (and the rest MMR-reranked in
+    "mmr" mode) and as many hits as a plain search returns are kept.
+    Either way at most ``top_k`` documents are returned, however many
+    queries are searched.
+    """
+    # We'll embed the queries
+    embedding_handler = EmbeddingHandler(model_name=configuration.embedding_model)
+    query_vectors = embedding_handler.generate_embeddings(queries)
+    # Then call your MilvusHandler:
+    milvus_handler = MilvusHandler(
+        host=configuration.milvus_host,
+        port=configuration.milvus_port,
+        vector_storage=configuration.vector_storage,
+        tenant_partitioning=configuration.tenant_partitioning,
+        num_partitions=configuration.milvus_num_partitions,
+        rescore_factor=configuration.binary_rescore_factor,
+    )
+    milvus_handler.connect()
+    diverse = configuration.diversity_mode != "off"
+    fetch_k = configuration.top_k * (configuration.diversity_fetch_factor if diverse else 1)
+    results = milvus_handler.search(
+        collection_name=configuration.milvus_collection,
+        query_vectors=query_vectors,
+        top_k=fetch_k,
+        output_fields=[configuration.vector_output_fields],  # retrieve doc text
+        filters=filters,
+        tenant=configuration.tenant,
+        nprobe=configuration.search_params.get("nprobe", 10),
+        with_vectors=diverse,
+    )
+
+    # Each query returns up to top_k hits; the merged list is capped at top_k too,
+    # so paraphrases widen recall without multiplying the context sent to the grader.
+    hits = merge_hits(results, limit=None if diverse else configuration.top_k)
+    if diverse and hits:
+        vectors = milvus_handler.hit_vectors(hits, len(query_vectors[0]), configuration.milvus_collection)
+        keep = diversify(
+            query_vectors[0],
+            vectors,
+            configuration.top_k,
+            dedup_threshold=configuration.dedup_threshold,
+            mmr_lambda=configuration.mmr_lambda if configuration.diversity_mode == "mmr" else None,
+        )
+        metrics.incr("diversity.hits_dropped", len(hits) - len(keep), node="retrieve_documents")
+        hits = [hits[i] for i in keep]
+
+    docs: List[Document] = []
+    for hit in hits:
+        doc_text = hit.entity.get(configuration.vector_output_fields, "")
+        docs.append(Document(page_content=doc_text, metadata={"id": hit.id, "distance": hit.distance}))
+    return docs
+
+
+async def fetch_documents(
+    question: str, configuration: Configuration, filters: Optional[dict] = None
+) -> list[Document]:
+    """Search for ``question`` (and its paraphrases in ``multi_query`` mode), optionally filtered."""
+    queries = [question]
+    if configuration.retrieval_mode == "multi_query":
+        variants = await generate_query_variants(question, configuration)
+        queries += [query for query in variants if query != question]
+        print(f"Query variants: {variants}")
+
+    # Embedding and search are blocking calls; keep them off the event loop.
+    return await asyncio.to_thread(search_documents, queries, configuration, filters)
+
+
+async def retrieve_documents(
         state: ResearcherState, *, config: RunnableConfig
     ) -> dict[str, list[Document]]:
     
     """
     Retrieve documents
 
+    In ``multi_query`` mode the question is searched together with
+    paraphrases of it, so one round covers what several rewrite-and-retrieve
+    loops would. Documents prefetched by the router are used once instead of
+    searching again.
+
     Args:
         state (dict): The current graph state
 
@@ -25,62 +129,65 @@ def retrieve_documents(
         state (dict): New key added to state, documents, that contains retrieved documents
     """
     print("---RETRIEVE---")
+    if state.prefetched_documents:
+        print("Using prefetched documents")
+        return {"documents": state.prefetched_documents, "prefetched_documents": []}
+
     configuration = Configuration.from_runnable_config(config)
     question = state.question
 
     print(question)
     print(configuration)
-    # We'll embed the question
-    embedding_handler = EmbeddingHandler(model_name=configuration.embedding_model)
-    query_vector = embedding_handler.generate_embeddings([question])
-    # Then call your MilvusHandler:
-    milvus_handler = MilvusHandler(
-        host=configuration.milvus_host,
-        port=configuration.milvus_port
-    )
-    milvus_handler.connect()
-    # # Retrieval
-    # documents = retriever.invoke(question)
-    # If you want the summary text, specify output_fields=["summary"]
-    results = milvus_handler.search(
-        collection_name=config[configuration.milvus_collection],
-        query_vectors=[query_vector],
-        top_k=3,
-        output_fields=[configuration.vector_output_fields]  # retrieve doc text
-    )
-
-    docs: List[Document] = []
-    for hits in results:
-        for hit in hits:
-            # The doc text is stored in 'hit.entity["summary"]'
-            doc_text = hit.entity.get("summary", "")
-            d = Document(page_content=doc_text, metadata={"id": hit.id, "distance": hit.distance})
-            docs.append(d)
+    docs = await fetch_documents(question, configuration, state.filters)
     print(docs)
     return {"documents": docs}
 
 
+@memoize("grade_documents", lambda c: (c.query_model, c.grader_system_prompt))
+async def llm_grade_document(configuration: Configuration, question: str, document: str) -> str:
+    """Return the LLM grader's "yes"/"no" on whether ``document`` is relevant to ``question``."""
+    model = load_chat_model(configuration.query_model)
+    messages = [
+        {"role": "system", "content": configuration.grader_system_prompt},
+        {"role": "human", "content": f"Question: {question}\n\nDocument: {document}"}
+    ]
+    grade = cast(
+        Grader,
+        await ainvoke_with_retry(
+            model.with_structured_output(Grader), messages, endpoint=f"llm:{configuration.query_model}"
+        ),
+    )
+    print(grade)
+    return grade["type"]
+
+
 async def grade_documents(state: ResearcherState, *, config: RunnableConfig) -> dict[str, Any]:
     configuration = Configuration.from_runnable_config(config)
     question = state.question
     documents = state.documents
-    filtered_docs = []
-    for d in documents:
-        # need to grade each retruned document
-        model = load_chat_model(configuration.query_model)
-
-        messages = [
-            {"role": "system", "content": configuration.grader_system_prompt},
-            {"role": "human", "content": f"Question: {question}\n\nDocument: {d.page_content}"}
-        ]
 
-        print("Messages")
-        print(messages)
-        grade = cast(
-            Grader, await model.with_structured_output(Grader).ainvoke(messages)
+    # In cascade mode clear-cut documents are graded by embedding similarity,
+    # all of them in one batch, and only the uncertain ones go to the LLM.
+    decisions = None
+    if configuration.classifier_mode == "cascade":
+        gate = SimilarityGate(
+            get_embedder(configuration.cascade_embedding_model),
+            high=configuration.cascade_relevance_high,
+            low=configuration.cascade_relevance_low,
         )
-        print(grade)
-        if grade.type == "yes":
+        decisions = await decide_locally("grade_documents", gate.decide, question, [d.page_content for d in documents])
+
+    filtered_docs = []
+    for i, d in enumerate(documents):
+        # need to grade each retruned document; pairs graded before are served from the memo
+        def llm_grade(d: Document = d) -> Awaitable[str]:
+            return llm_grade_document(configuration, question, d.page_content)
+
+        if decisions is not None:
+            grade_type = await cascade("grade_documents", decisions[i], llm_grade, configuration.cascade_audit_rate)
+        else:
+            grade_type = await llm_grade()
+        if grade_type == "yes":
             print("---GRADE: DOCUMENT RELEVANT---")
             filtered_docs.append(d)
         else:
@@ -100,7 +207,7 @@ def decide_to_generate(state: ResearcherState) -> str:
     """
 
     print("---ASSESS GRADED DOCUMENTS---")
-    filtered_documents = state["documents"]
+    filtered_documents = state.documents
 
     if not filtered_documents:
         # All documents have been filtered check_relevance
@@ -114,6 +221,36 @@ def decide_to_generate(state: ResearcherState) -> str:
         print("---DECISION: GENERATE---")
         return "generate"
 
+@lru_cache(maxsize=64)
+def _response_prompt(template: str, context: str) -> str:
+    """Return the response system prompt filled with ``context``, cached for regeneration attempts."""
+    return template.format(context=context)
+
+
+@lru_cache(maxsize=64)
+def _grounding_prompt(template: str, context: str) -> tuple[tuple[str, Optional[str]], ...]:
+    """``template`` compiled with ``context`` filled in, cached for regeneration attempts.
+
+    Returns (text, field) pairs: each literal text followed by the name of the
+    field that comes after it (None at the end); render them with ``_render``.
+    """
+    parts: list[tuple[str, Optional[str]]] = []
+    text = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        text += literal
+        if field == "context":
+            text += context
+        elif field is not None:
+            parts.append((text, field))
+            text = ""
+    parts.append((text, None))
+    return tuple(parts)
+
+
+def _render(parts: tuple[tuple[str, Optional[str]], ...], **values: str) -> str:
+    return "".join(text + (values[field] if field else "") for text, field in parts)
+
+
 async def generate(state: ResearcherState, *, config: RunnableConfig) -> dict[str, Any]:
     """
     Generate answer
@@ -125,19 +262,19 @@ async def generate(state: ResearcherState, *, config: RunnableConfig) -> dict[st
         state (dict): New key added to state, generation, that contains LLM generation
     """
     print("---GENERATE---")
-    question = state["question"]
-    documents = state["documents"]
+    question = state.question
+    documents = state.documents
     configuration = Configuration.from_runnable_config(config)
     model = load_chat_model(configuration.response_model)
-    context = format_docs(state.documents)
-    prompt = configuration.response_system_prompt.format(context=context)
+    # Regenerating on the same documents reuses the rendered context and prompt.
+    prompt = _response_prompt(configuration.response_system_prompt, format_docs(documents))
     messages = [
         {"role": "system", "content": prompt},
         {"role": "user", "content": question}
     ] 
-    generation = await model.ainvoke(messages)
+    generation = await ainvoke_with_retry(model, messages, endpoint=f"llm:{configuration.response_model}")
 
-    return {"documents": documents, "question": question, "generation": generation}
+    return {"documents": documents, "question": question, "generation": state.generation + [generation.content]}
 
 async def transform_query(state: ResearcherState, *, config: RunnableConfig) -> dict[str, Any]:
     """
@@ -151,19 +288,27 @@ async def transform_query(state: ResearcherState, *, config: RunnableConfig) ->
     """
 
     print("---TRANSFORM QUERY---")
-    question = state["question"]
-    documents = state["documents"]
+    question = state.question
+    documents = state.documents
     configuration = Configuration.from_runnable_config(config)
-    # Load the LLM model
-    model = load_chat_model(configuration.query_model)
+    response = await rewrite_question(configuration, question)
 
-       # Define the system prompt for rewriting the question
-    system_prompt = """You are a question rewriter. Your job is to take an input question and improve it for use in a vector database retrieval system.
-    Use the following guidelines:
-    1. Focus on the underlying intent of the question.
-    2. Make the question concise but specific.
-    3. Ensure the rephrased question is semantically meaningful and optimized for retrieval."""
+    print(f"Rewritten Question: {response['rewritten_question']}")
+    print(f"Reasoning: {response.get('reasoning', '')}")
 
+    # Update the question in the state and keep the reasoning for debugging
+    return {
+        "documents": documents,
+        "question": response["rewritten_question"],
+        "generation": state.generation + [f"Reasoning: {response.get('reasoning', '')}"],
+    }
+
+
+@memoize("transform_query", lambda c: (c.query_model, c.rewriter_system_prompt))
+async def rewrite_question(configuration: Configuration, question: str) -> RewriterResponse:
+    """Return the rewriter's improved question and reasoning for ``question``."""
+    # Load the LLM model
+    model = load_chat_model(configuration.query_model)
 
     human_prompt = f"""Original Question: {question}
 
@@ -171,22 +316,13 @@ async def transform_query(state: ResearcherState, *, config: RunnableConfig) ->
 
     # Construct the messages for the LLM
     messages = [
-        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": configuration.rewriter_system_prompt},
         {"role": "user", "content": human_prompt}
     ]
 
-    response = cast(RewriterResponse, await model.ainvoke(messages))
-
-    print(f"Rewritten Question: {response.rewritten_question}")
-    print(f"Reasoning: {response.reasoning}")
-
-    # Update the question in the state
-    state.question = response.rewritten_question
-
-    # Optionally log the reasoning for debugging
-    state.generation.append(f"Reasoning: {response.reasoning}")
-
-    return {"documents": documents, "question": state.question}  
+    return await ainvoke_with_retry(
+        model.with_structured_output(RewriterResponse), messages, endpoint=f"llm:{configuration.query_model}"
+    )
 
 async def grade_generation_v_documents_and_question(state: ResearcherState,  *, config: RunnableConfig) -> dict[str, list[BaseMessage]]:
     """
@@ -200,41 +336,48 @@ async def grade_generation_v_documents_and_question(state: ResearcherState,  *,
     """
 
     print("---CHECK HALLUCINATIONS---")
-    question = state["question"]
-    documents = state["documents"]
-    generation = state["generation"]
+    question = state.question
+    documents = state.documents
+    generation = state.generation[-1] if state.generation else ""
     configuration = Configuration.from_runnable_config(config)
     model = load_chat_model(configuration.response_model)
 
     # Check hallucination
-    system_prompt = """You are a grader assessing whether a generated response is grounded in / supported by a set of retrieved documents.
-    Use the following criteria:
-    1. If the response aligns with the content of the documents, grade it as 'yes'.
-    2. If the response introduces information not found in the documents or conflicts with them, grade it as 'no'.
-    Provide an explanation for your grade.
-
-    Respond in the following format:
-    - grounded: "yes" or "no"
-    - reasoning: Explanation of why the response is or is not grounded."""
-
-    human_prompt = f"""Set of documents: 
-    {''.join([doc.page_content for doc in documents])}
-
-    Question: {question}
-
-    Generated Response: {generation}"""
-
     messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": human_prompt}
+        {"role": "system", "content": prompts.HALLUCINATION_GRADER_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            # Only the question and the generation are filled in per check.
+            "content": _render(
+                _grounding_prompt(prompts.HALLUCINATION_GRADER_HUMAN_PROMPT, format_docs(documents)),
+                question=question,
+                generation=generation,
+            ),
+        },
     ]
     # Use the model to grade the generation
-    grade = cast(Grader, await model.with_structured_output(Grader).ainvoke(messages))
+    async def llm_grade() -> str:
+        grade = cast(
+            Grader,
+            await ainvoke_with_retry(
+                model.with_structured_output(Grader), messages, endpoint=f"llm:{configuration.response_model}"
+            ),
+        )
+        print(f"Hallucination Grading Result: {grade}")
+        return grade["type"]
 
-    print(f"Hallucination Grading Result: {grade}")
+    if configuration.classifier_mode == "cascade":
+        # An answer that closely paraphrases one document is grounded; anything else goes to the LLM.
+        gate = SimilarityGate(
+            get_embedder(configuration.cascade_embedding_model), high=configuration.cascade_grounding_high
+        )
+        decision = await decide_locally("grade_generation", gate.best, generation, [d.page_content for d in documents])
+        grade_type = await cascade("grade_generation", decision, llm_grade, configuration.cascade_audit_rate)
+    else:
+        grade_type = await llm_grade()
 
     # Check hallucination
-    if grade == "yes":
+    if grade_type == "yes":
         print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
         # Check question-answering
         print("---GRADE GENERATION vs QUESTION---")
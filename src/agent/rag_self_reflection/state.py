@@ -19,10 +19,19 @@ class RewriterResponse:
     rewritten_question: str
     reasoning: str = ""
 
+@dataclass(kw_only=True)
+class QueryVariants:
+    queries: List[str]
+
 @dataclass(kw_only=True)
 class ResearcherState:    
+    """State of one self-reflective research run."""
     question: str
     generation: list[str] = field(default_factory=list)
     documents: list[Document] = field(default_factory=list)
+    # Metadata filters for retrieval (see MilvusHandler.build_filter).
+    filters: dict = field(default_factory=dict)
+    # Retrieved speculatively by the router; consumed by the first retrieval.
+    prefetched_documents: list[Document] = field(default_factory=list)
     iteration_count: int = 0  
     max_iterations: int = 5 
\ No newline at end of file
@@ -6,6 +6,7 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Annotated, Literal, TypedDict
 
+from langchain_core.documents import Document
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
 
@@ -26,6 +27,14 @@ class Router:
     type: Literal["more-info", "movie", "general"]
     logic: str = ""
 
+@dataclass
+class FilteredRouter(Router):
+    """Router output with metadata filters implied by the question (extract_filters)."""
+    genre: str | None = None
+    year_from: int | None = None
+    year_to: int | None = None
+    source: str | None = None
+
 @dataclass(kw_only=True)
 class AgentState(InputState):
     """Defines the input state for the agent, representing a narrower interface to the outside world.
@@ -38,4 +47,8 @@ class AgentState(InputState):
     # router: Router = field(default_factory=lambda: Router(type="general", logic=""))
 
     router: Router = field(default_factory=lambda: Router(type="general"))
+    # Rolling summary of the turns that were dropped from `messages`.
+    summary: str = ""
+    # Retrieved while the router ran (speculative_retrieval); handed to the research graph.
+    prefetched_documents: list[Document] = field(default_factory=list)
 
@@ -0,0 +1,299 @@
+"""Admission control for the LLM-bound API endpoints.
+
+Each endpoint and each model gets a concurrency gate with a bounded wait
+queue. Models can also have token buckets matching the provider's
+requests-per-minute and tokens-per-minute limits. Requests that cannot be
+admitted are shed early instead of piling onto the provider:
+
+- 429 when the wait queue is full or the rate limit cannot be met in time,
+- 503 when a queued request waits longer than the queue timeout.
+
+Limits are read from the environment (see ``AdmissionSettings.from_env``).
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.services.metrics import metrics
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second.
+
+    Waiting requests reserve their tokens up front (the balance may go
+    negative), so later requests queue behind them without holding a lock
+    while they sleep.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """Start full, refilling ``rate`` tokens per second up to ``capacity``."""
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def _cost(self, cost: float) -> float:
+        # A request larger than the bucket could never be served; let it
+        # through once the bucket is full instead.
+        return min(cost, self.capacity)
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until ``cost`` tokens are available, after the requests already waiting."""
+        self._refill()
+        return max(0.0, (self._cost(cost) - self._tokens) / self.rate)
+
+    def reserve(self, cost: float) -> None:
+        """Take ``cost`` tokens now, even if that drives the bucket into debt."""
+        self._refill()
+        self._tokens -= self._cost(cost)
+
+    def release(self, cost: float) -> None:
+        """Give back a reservation that will not be used."""
+        self._tokens = min(self.capacity, self._tokens + self._cost(cost))
+
+    async def acquire(self, cost: float, timeout: float) -> Optional[float]:
+        """Take ``cost`` tokens, waiting up to ``timeout`` seconds for the refill.
+
+        Returns:
+            Optional[float]: None on success, otherwise the number of seconds
+            after which the request could have been served.
+        """
+        return await take_tokens([(self, cost)], timeout)
+
+
+async def take_tokens(
+    reservations: List[Tuple[TokenBucket, float]], timeout: float
+) -> Optional[float]:
+    """Take tokens from several buckets, waiting up to ``timeout`` seconds in total.
+
+    Nothing is taken unless every bucket can serve its cost within the
+    timeout. The waits overlap: the request sleeps once, for the longest.
+
+    Returns:
+        Optional[float]: None on success, otherwise the number of seconds
+        after which the request could have been served.
+    """
+    # No await between checking and reserving: the reservation is atomic on the event loop.
+    wait = max((bucket.wait_time(cost) for bucket, cost in reservations), default=0.0)
+    if wait > timeout:
+        return wait
+    for bucket, cost in reservations:
+        bucket.reserve(cost)
+    if wait:
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            for bucket, cost in reservations:
+                bucket.release(cost)
+            raise
+    return None
+
+
+class Gate:
+    """Concurrency limit with a bounded queue of waiting requests."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        """Admit ``concurrency`` requests at once and queue up to ``queue_size`` more."""
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def enter(self, timeout: float) -> AsyncIterator[None]:
+        """Hold one slot for the duration of the block, waiting at most ``timeout`` seconds."""
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            metrics.incr("admission.rejected", gate=self.name, reason="queue_full")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many queued requests for {self.name}.",
+                headers={"Retry-After": str(max(1, math.ceil(timeout)))},
+            )
+
+        self.waiting += 1
+        self._report()
+        started = time.perf_counter()
+        try:
+            if self._semaphore.locked():
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            else:
+                # A free slot is taken at once, even when no wait time is left.
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            metrics.incr("admission.rejected", gate=self.name, reason="queue_timeout")
+            raise HTTPException(
+                status_code=503,
+                detail=f"Timed out waiting for capacity on {self.name}.",
+                headers={"Retry-After": str(max(1, math.ceil(timeout)))},
+            )
+        finally:
+            self.waiting -= 1
+            metrics.observe(
+                "admission.wait_seconds", time.perf_counter() - started, gate=self.name
+            )
+
+        self.in_flight += 1
+        self._report()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._report()
+
+    def _report(self) -> None:
+        metrics.set_gauge("admission.queue_depth", self.waiting, gate=self.name)
+        metrics.set_gauge("admission.in_flight", self.in_flight, gate=self.name)
+
+
+@dataclass
+class ModelLimits:
+    """Concurrency and provider rate limits for one model."""
+
+    concurrency: int = 16
+    # Provider rate limits; None disables the corresponding bucket.
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+
+@dataclass
+class AdmissionSettings:
+    """Admission limits for the API, read from the environment."""
+
+    endpoint_concurrency: Dict[str, int] = field(
+        default_factory=lambda: {"query": 32, "index": 4, "research": 8}
+    )
+    queue_size: int = 64
+    queue_timeout: float = 10.0
+    default_model_limits: ModelLimits = field(default_factory=ModelLimits)
+    model_limits: Dict[str, ModelLimits] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> "AdmissionSettings":
+        """Read limits from the environment.
+
+        ADMISSION_QUERY_CONCURRENCY / ADMISSION_INDEX_CONCURRENCY / ADMISSION_RESEARCH_CONCURRENCY:
+            in-flight requests per endpoint.
+        ADMISSION_QUEUE_SIZE: waiting requests per gate before shedding with 429.
+        ADMISSION_QUEUE_TIMEOUT: seconds a request may wait before shedding with 503.
+        ADMISSION_MODEL_LIMITS: JSON such as
+            {"openai/text-embedding-3-small": {"concurrency": 8, "rpm": 3000, "tpm": 1000000}}
+        """
+        defaults = cls()
+        model_limits = json.loads(os.getenv("ADMISSION_MODEL_LIMITS", "{}"))
+        return cls(
+            endpoint_concurrency={
+                endpoint: int(
+                    os.getenv(f"ADMISSION_{endpoint.upper()}_CONCURRENCY", limit)
+                )
+                for endpoint, limit in defaults.endpoint_concurrency.items()
+            },
+            queue_size=int(os.getenv("ADMISSION_QUEUE_SIZE", defaults.queue_size)),
+            queue_timeout=float(
+                os.getenv("ADMISSION_QUEUE_TIMEOUT", defaults.queue_timeout)
+            ),
+            model_limits={
+                name: ModelLimits(**limits) for name, limits in model_limits.items()
+            },
+        )
+
+
+class AdmissionController:
+    """Admit requests through the endpoint gate and the model gates and buckets."""
+
+    def __init__(self, settings: AdmissionSettings):
+        """Create gates and buckets lazily, on first use."""
+        self.settings = settings
+        self._gates: Dict[str, Gate] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _gate(self, name: str, concurrency: int) -> Gate:
+        if name not in self._gates:
+            self._gates[name] = Gate(name, concurrency, self.settings.queue_size)
+        return self._gates[name]
+
+    def _bucket(self, name: str, per_minute: float) -> TokenBucket:
+        if name not in self._buckets:
+            self._buckets[name] = TokenBucket(
+                rate=per_minute / 60.0, capacity=per_minute
+            )
+        return self._buckets[name]
+
+    async def _take(
+        self, name: str, limits: ModelLimits, requests: int, tokens: int, timeout: float
+    ) -> None:
+        """Take the request and token budget of ``limits`` within ``timeout`` seconds."""
+        reservations = [
+            (self._bucket(f"{name}:{kind}", per_minute), cost)
+            for kind, per_minute, cost in (
+                ("rpm", limits.rpm, requests),
+                ("tpm", limits.tpm, tokens),
+            )
+            if per_minute and cost > 0
+        ]
+        retry_after = await take_tokens(reservations, timeout)
+        if retry_after is not None:
+            metrics.incr("admission.rejected", gate=name, reason="rate_limited")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit reached for {name}.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        endpoint: str,
+        model: Optional[str] = None,
+        requests: int = 1,
+        tokens: int = 0,
+    ) -> AsyncIterator[None]:
+        """Hold an endpoint slot (and a model slot plus rate budget) while the block runs.
+
+        Args:
+            endpoint: Endpoint name, e.g. "query" or "index".
+            model: Fully specified model the request will call, if any.
+            requests: Provider requests the call is expected to make.
+            tokens: Provider tokens the call is expected to consume.
+
+        The gates and the rate limits share one ``queue_timeout``: each stage
+        only gets the time the previous ones left.
+        """
+        deadline = time.monotonic() + self.settings.queue_timeout
+
+        def remaining() -> float:
+            return max(0.0, deadline - time.monotonic())
+
+        async with AsyncExitStack() as stack:
+            concurrency = self.settings.endpoint_concurrency.get(endpoint, 8)
+            await stack.enter_async_context(
+                self._gate(f"endpoint:{endpoint}", concurrency).enter(remaining())
+            )
+            if model:
+                limits = self.settings.model_limits.get(
+                    model, self.settings.default_model_limits
+                )
+                await stack.enter_async_context(
+                    self._gate(f"model:{model}", limits.concurrency).enter(remaining())
+                )
+                await self._take(
+                    f"model:{model}", limits, requests, tokens, remaining()
+                )
+            yield
@@ -1,8 +1,76 @@
-from src.index_graph.graph import graph as index_graph
-from src.agent.graph import graph as rag_graph
+import logging
+from functools import cache
 
+logger = logging.getLogger(__name__)
+
+# Graph modules pull in langchain, pymilvus and openai, so they are imported
+# and compiled on first use instead of when the API module is imported.
+# The API compiles them with the durable checkpointer opened in the lifespan
+# (see src/shared/checkpointer.py); subgraphs inherit it from their parent.
+
+
+@cache
 def get_index_graph():
+    from src.index_graph.graph import workflow
+    from src.shared.checkpointer import get_checkpointer
+
+    index_graph = workflow.compile(checkpointer=get_checkpointer())
+    index_graph.name = "IndexGraph"
     return index_graph
 
+
+@cache
 def get_rag_graph():
-    return rag_graph
\ No newline at end of file
+    from src.agent.graph import workflow
+    from src.shared.checkpointer import get_checkpointer
+
+    rag_graph = workflow.compile(checkpointer=get_checkpointer())
+    rag_graph.name = "New Graph"
+    return rag_graph
+
+
+@cache
+def get_research_graph():
+    """Return the research graph compiled with the shared checkpointer."""
+    from src.hierarchical_graph.graph import research_builder
+    from src.shared.checkpointer import get_checkpointer
+
+    research_graph = research_builder.compile(checkpointer=get_checkpointer())
+    research_graph.name = "ResearchGraph"
+    return research_graph
+
+
+@cache
+def get_admission_controller():
+    """Return the process-wide admission controller."""
+    from src.api.admission import AdmissionController, AdmissionSettings
+
+    return AdmissionController(AdmissionSettings.from_env())
+
+
+def _milvus_handler():
+    from src.services.milvus_handler import MilvusHandler
+    from src.shared.configuration import BaseConfiguration
+
+    configuration = BaseConfiguration()
+    return MilvusHandler(host=configuration.milvus_host, port=configuration.milvus_port)
+
+
+def warm_up():
+    """Import and compile every graph and open the Milvus connection.
+
+    Runs once per worker process, so the first request does not pay for it.
+    """
+    get_index_graph()
+    get_rag_graph()
+    get_research_graph()
+    try:
+        _milvus_handler().connect()
+    except Exception as e:
+        # The handlers connect again on use; an unreachable Milvus should not stop the worker.
+        logger.warning("Milvus warm-up failed: %s", e)
+
+
+def shut_down():
+    """Release per-worker resources once in-flight requests have drained."""
+    _milvus_handler().disconnect()
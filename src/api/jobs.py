@@ -0,0 +1,423 @@
+"""Background indexing jobs.
+
+``POST /api/index`` with ``background: true`` stores the documents as a job
+in a SQLite queue and returns its id right away; ``GET /api/index/{job_id}``
+reports its progress. Worker tasks in each API process claim queued jobs
+and run the index graph over them batch by batch:
+
+- a job is identified by the hash of its documents and configuration, so
+  submitting the same content again returns the existing job;
+- progress is committed after every batch, and a claimed job holds a lease
+  that is renewed per batch. Jobs of a process that stopped are picked up
+  again once their lease expires (immediately after a graceful shutdown)
+  and resume after the last committed batch;
+- a failed batch re-queues the job until ``max_attempts`` is reached.
+
+Batches are delivered at least once: a batch that was inserted but not yet
+committed when the process died is indexed again on resume, unless its
+checkpointed run shows it already finished.
+
+``INDEX_JOBS_DB`` sets the database path; an empty value disables jobs.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_jobs (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    active_seconds REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS index_jobs_status ON index_jobs (status, created_at);
+"""
+
+_queue: Optional["JobQueue"] = None
+
+
+@dataclass
+class Job:
+    """One bulk indexing job as stored in the job table."""
+
+    id: str
+    status: str
+    total: int
+    done: int
+    error: Optional[str]
+    attempts: int
+    active_seconds: float
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    payload: Optional[dict] = None
+
+    @property
+    def docs_per_second(self) -> float:
+        """Return the indexing rate over the time the job actually ran."""
+        return self.done / self.active_seconds if self.active_seconds else 0.0
+
+
+_COLUMNS = "id, status, total, done, error, attempts, active_seconds, created_at, started_at, finished_at"
+
+
+def content_hash(documents: list[str], configurable: dict[str, Any]) -> str:
+    """Identity of a job's content, used to deduplicate submissions."""
+    body = json.dumps(
+        {"documents": documents, "configurable": configurable}, sort_keys=True
+    )
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Autocommit: every statement is its own transaction.
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class JobStore:
+    """SQLite-backed job table, shared by every API process using the same file."""
+
+    def __init__(self, path: str):
+        """Point the store at the SQLite file at ``path``; call :meth:`open` before use."""
+        self.path = path
+        self.conn: Any = None
+
+    async def open(self) -> None:
+        """Open the connection and create the job table if needed."""
+        import aiosqlite
+
+        self.conn = aiosqlite.Connection(
+            lambda: _connect(self.path), iter_chunk_size=64
+        )
+        await self.conn
+        await self.conn.executescript(_SCHEMA)
+
+    async def close(self) -> None:
+        """Close the connection if it is open."""
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def submit(
+        self, documents: list[str], configurable: dict[str, Any]
+    ) -> tuple[Job, bool]:
+        """Queue a job, or return the job with the same content; the flag tells whether it is new.
+
+        Resubmitting a failed job queues it again, resuming after its last batch.
+        """
+        digest = content_hash(documents, configurable)
+        payload = json.dumps({"documents": documents, "configurable": configurable})
+        cursor = await self.conn.execute(
+            "INSERT INTO index_jobs (id, content_hash, status, payload, total, created_at) "
+            "VALUES (?, ?, 'queued', ?, ?, ?) ON CONFLICT (content_hash) DO NOTHING",
+            (str(uuid.uuid4()), digest, payload, len(documents), time.time()),
+        )
+        created = cursor.rowcount == 1
+        if not created:
+            await self.conn.execute(
+                "UPDATE index_jobs SET status = 'queued', attempts = 0, error = NULL, finished_at = NULL "
+                "WHERE content_hash = ? AND status = 'failed'",
+                (digest,),
+            )
+        async with self.conn.execute(
+            f"SELECT {_COLUMNS} FROM index_jobs WHERE content_hash = ?", (digest,)
+        ) as rows:
+            return Job(*await rows.fetchone()), created
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Return the job ``job_id``, or None when it does not exist."""
+        async with self.conn.execute(
+            f"SELECT {_COLUMNS} FROM index_jobs WHERE id = ?", (job_id,)
+        ) as rows:
+            row = await rows.fetchone()
+        return Job(*row) if row else None
+
+    async def claim(self, lease_seconds: float) -> Optional[Job]:
+        """Take the oldest queued job, or a running one whose lease expired, with its payload.
+
+        One atomic statement, so concurrent workers (of this or other
+        processes) never claim the same job and share no open transaction.
+        """
+        now = time.time()
+        async with self.conn.execute(
+            "UPDATE index_jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+            "started_at = COALESCE(started_at, ?) "
+            "WHERE id = ("
+            "SELECT id FROM index_jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+            "ORDER BY created_at LIMIT 1"
+            f") RETURNING {_COLUMNS}, payload",
+            (now + lease_seconds, now, now),
+        ) as rows:
+            row = await rows.fetchone()
+        if row is None:
+            return None
+        return Job(*row[:-1], payload=json.loads(row[-1]))
+
+    async def progress(
+        self, job_id: str, done: int, seconds: float, lease_seconds: float
+    ) -> None:
+        """Record ``done`` documents and extend the job's lease."""
+        await self.conn.execute(
+            "UPDATE index_jobs SET done = ?, active_seconds = active_seconds + ?, lease_until = ? WHERE id = ?",
+            (done, seconds, time.time() + lease_seconds, job_id),
+        )
+
+    async def finish(self, job_id: str) -> None:
+        """Mark the job as succeeded."""
+        await self.conn.execute(
+            "UPDATE index_jobs SET status = 'succeeded', error = NULL, finished_at = ?, lease_until = NULL "
+            "WHERE id = ?",
+            (time.time(), job_id),
+        )
+
+    async def fail(self, job_id: str, error: str, retry: bool) -> None:
+        """Requeue the job when ``retry`` is set, otherwise mark it as failed."""
+        await self.conn.execute(
+            "UPDATE index_jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+            (
+                "queued" if retry else "failed",
+                error,
+                None if retry else time.time(),
+                job_id,
+            ),
+        )
+
+    async def release(self, job_id: str) -> None:
+        """Give a running job back to the queue, e.g. on shutdown."""
+        await self.conn.execute(
+            "UPDATE index_jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_until = NULL "
+            "WHERE id = ? AND status = 'running'",
+            (job_id,),
+        )
+
+
+class JobQueue:
+    """Worker tasks running queued index jobs through the index graph."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        graph_factory: Callable[[], Any],
+        admission: Any,
+        *,
+        workers: int = 2,
+        batch_size: int = 64,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        embedding_model: str = "openai/text-embedding-3-small",
+    ):
+        """Run ``workers`` workers that index claimed jobs ``batch_size`` documents at a time."""
+        self.store = store
+        self.graph_factory = graph_factory
+        self.admission = admission
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.embedding_model = embedding_model
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the worker tasks."""
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"index-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks and wait for them to exit."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self, documents: list[str], configurable: dict[str, Any]
+    ) -> tuple[Job, bool]:
+        """Store a job for ``documents`` and wake a worker; see :meth:`JobStore.submit`."""
+        job, created = await self.store.submit(documents, configurable)
+        self._wakeup.set()
+        return job, created
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self.store.claim(self.lease_seconds)
+            except Exception as e:
+                # E.g. the database is locked by another process for longer than busy_timeout.
+                logger.warning("Claiming a job failed, retrying: %s", e)
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run(job)
+            except asyncio.CancelledError:
+                await asyncio.shield(self.store.release(job.id))
+                raise
+            except Exception as e:
+                # Recording the outcome failed; the lease expires and the job is claimed again.
+                logger.warning("Job %s stopped unexpectedly: %s", job.id, e)
+                await asyncio.sleep(self.poll_interval)
+
+    async def run(self, job: Job) -> None:
+        """Index the job's remaining batches, committing progress after each one."""
+        from src.index_graph.state import IndexState
+        from src.shared.checkpointer import checkpoint_kwargs, resume_or_start
+
+        graph = self.graph_factory()
+        documents = job.payload["documents"]
+        configurable = job.payload["configurable"]
+        logger.info(
+            "Running job %s from document %d/%d (attempt %d)",
+            job.id,
+            job.done,
+            job.total,
+            job.attempts,
+        )
+        try:
+            for start in range(job.done, job.total, self.batch_size):
+                batch = documents[start : start + self.batch_size]
+                config = {
+                    "configurable": {**configurable, "thread_id": f"{job.id}:{start}"}
+                }
+                started = time.perf_counter()
+                if not await _finished(graph, config):
+                    await self._admitted(
+                        len(batch),
+                        sum(len(doc) for doc in batch) // 4,
+                        lambda: self._invoke(
+                            graph,
+                            IndexState(docs=batch),
+                            config,
+                            resume_or_start,
+                            checkpoint_kwargs,
+                        ),
+                    )
+                await self.store.progress(
+                    job.id,
+                    start + len(batch),
+                    time.perf_counter() - started,
+                    self.lease_seconds,
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            retry = job.attempts < self.max_attempts
+            logger.warning(
+                "Job %s failed (%s): %s",
+                job.id,
+                "will retry" if retry else "giving up",
+                e,
+            )
+            await self.store.fail(job.id, f"{type(e).__name__}: {e}", retry)
+            return
+        await self.store.finish(job.id)
+        logger.info("Job %s finished: %d documents", job.id, job.total)
+
+    async def _admitted(
+        self, requests: int, tokens: int, run: Callable[[], Any]
+    ) -> None:
+        """Run under the "index" admission limits, waiting out rejections instead of failing the job."""
+        while True:
+            try:
+                async with self.admission.admit(
+                    "index",
+                    model=self.embedding_model,
+                    requests=requests,
+                    tokens=tokens,
+                ):
+                    return await run()
+            except HTTPException as e:
+                if e.status_code not in (429, 503):
+                    raise
+                await asyncio.sleep(float((e.headers or {}).get("Retry-After", 1)))
+
+    @staticmethod
+    async def _invoke(
+        graph: Any,
+        state: Any,
+        config: dict,
+        resume_or_start: Callable,
+        checkpoint_kwargs: Callable,
+    ) -> None:
+        graph_input = await resume_or_start(graph, state, config)
+        await graph.ainvoke(graph_input, config=config, **checkpoint_kwargs())
+
+
+async def _finished(graph: Any, config: dict) -> bool:
+    """Whether a checkpointed run of this batch already completed."""
+    if getattr(graph, "checkpointer", None) is None:
+        return False
+    snapshot = await graph.aget_state(config)
+    return bool(snapshot.values) and not snapshot.next
+
+
+async def open_job_queue(
+    graph_factory: Callable[[], Any], admission: Any, path: Optional[str] = None
+) -> Optional[JobQueue]:
+    """Open the job database and start the process' workers. Must run inside the event loop (e.g. the lifespan)."""
+    global _queue
+    path = os.getenv("INDEX_JOBS_DB", "index_jobs.sqlite") if path is None else path
+    if not path:
+        return None
+    store = JobStore(path)
+    await store.open()
+    _queue = JobQueue(
+        store,
+        graph_factory,
+        admission,
+        workers=int(os.getenv("INDEX_JOB_WORKERS", 2)),
+        batch_size=int(os.getenv("INDEX_JOB_BATCH_SIZE", 64)),
+        lease_seconds=float(os.getenv("INDEX_JOB_LEASE_SECONDS", 300)),
+        max_attempts=int(os.getenv("INDEX_JOB_MAX_ATTEMPTS", 3)),
+    )
+    _queue.start()
+    return _queue
+
+
+async def close_job_queue() -> None:
+    """Stop the job queue's workers and close its store."""
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        await _queue.store.close()
+        _queue = None
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """Return the open job queue, or None when background jobs are disabled or not opened yet."""
+    return _queue
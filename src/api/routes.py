@@ -1,66 +1,226 @@
-from fastapi import APIRouter, Depends, HTTPException
-from src.api.schemas import DocumentRequest, IndexResponse, QueryRequest, QueryResponse, HealthResponse
-from src.api.dependencies import get_index_graph, get_rag_graph
-from src.index_graph.state import IndexState
-from langchain_core.runnables import RunnableConfig
+import math
+import uuid
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+
+from src.api.dependencies import (
+    get_admission_controller,
+    get_index_graph,
+    get_rag_graph,
+    get_research_graph,
+)
+from src.api.jobs import get_job_queue
+from src.api.schemas import (
+    DocumentRequest,
+    HealthResponse,
+    IndexJobStatus,
+    IndexResponse,
+    QueryRequest,
+    QueryResponse,
+    ResearchRequest,
+)
+from src.api.streaming import HeldStreamingResponse, stream_graph
+from src.services.metrics import metrics
+from src.services.profiling import node_profiles, profiled, should_profile
 
 router = APIRouter()
 
+
+def _resolve_configuration(cls, config):
+    """Resolve and validate the run configuration before anything runs, as a 422 on bad values."""
+    try:
+        return cls.from_runnable_config(config)
+    except (ValueError, TypeError) as e:
+        # ConfigurationError, or an environment default that fails to parse (e.g. MILVUS_NUM_PARTITIONS).
+        raise HTTPException(status_code=422, detail=str(e))
+
+
 @router.post("/index", response_model=IndexResponse)
 async def index_documents(
     request: DocumentRequest,
+    response: Response,
     graph=Depends(get_index_graph),
+    admission=Depends(get_admission_controller),
+    x_profile: Optional[str] = Header(default=None),
 ):
-    """API to index documents using the LangGraph workflow."""
+    """API to index documents using the LangGraph workflow.
+
+    With ``background`` set the documents are queued as a job and the response
+    (202) carries its id; otherwise the graph runs within the request.
+    Profiled runs (see src/services/profiling.py) report their file in ``X-Profile-File``.
+    """
     if not request.documents:
         raise HTTPException(status_code=400, detail="No documents provided.")
 
-    # Initialize the graph state
-    state = IndexState(docs=request.documents)
+    # Imported here so loading the API does not pull in langchain before the first request.
+    from langchain_core.runnables import RunnableConfig
+
+    from src.index_graph.configuration import IndexConfiguration
+    from src.index_graph.state import IndexState
+    from src.services.embedding_handler import EmbeddingHandler
+    from src.shared.checkpointer import checkpoint_kwargs, resume_or_start
 
     # Pass runtime configuration as a RunnableConfig
-    config = RunnableConfig(configurable={
-        "vector_dim": 1536,
-        "embedding_model": "openai/text-embedding-3-small",
-        "milvus_collection": "simple_embedding"
-    })
+    embedding_model = "openai/text-embedding-3-small"
+    configurable = {
+        "embedding_model": embedding_model,
+        "milvus_collection": "simple_embedding",
+        "tenant": request.tenant,
+    }
+    thread_id = request.thread_id or str(uuid.uuid4())
+    config = RunnableConfig(configurable={"thread_id": thread_id, **configurable})
+    _resolve_configuration(IndexConfiguration, config)
+
+    if request.background:
+        queue = get_job_queue()
+        if queue is None:
+            raise HTTPException(status_code=503, detail="Background indexing is disabled.")
+        # The same documents and configuration map to the same job.
+        job, created = await queue.submit(request.documents, configurable)
+        response.status_code = 202
+        return IndexResponse(
+            message="Indexing queued" if created else "Indexing already submitted",
+            documents_indexed=job.done,
+            job_id=job.id,
+            status=job.status,
+        )
 
-    # Execute the graph
-    result = await graph.ainvoke(state, config=config)
+    # Initialize the graph state
+    state = IndexState(docs=request.documents)
+
+    # Execute the graph once admitted: the handler embeds ``batch_size``
+    # documents per request, at roughly four characters per token.
+    batch_size = EmbeddingHandler(model_name=embedding_model).batch_size
+    async with admission.admit(
+        "index",
+        model=embedding_model,
+        requests=math.ceil(len(request.documents) / batch_size),
+        tokens=sum(len(doc) for doc in request.documents) // 4,
+    ):
+        graph_input = await resume_or_start(graph, state, config)
+        async with profiled("index", config, should_profile(x_profile)) as run:
+            await graph.ainvoke(graph_input, config=run.config, **checkpoint_kwargs())
+    if run.path:
+        response.headers["X-Profile-File"] = run.path
 
-    print(result)
     return IndexResponse(
         message="Indexing complete",
-        documents_indexed=len(request.documents)
+        documents_indexed=len(request.documents),
+        thread_id=thread_id,
+    )
+
+@router.get("/index/{job_id}", response_model=IndexJobStatus)
+async def index_job_status(job_id: str):
+    """Progress, throughput and last error of a background index job."""
+    queue = get_job_queue()
+    job = await queue.store.get(job_id) if queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown index job {job_id}.")
+    return IndexJobStatus(
+        job_id=job.id,
+        status=job.status,
+        documents_total=job.total,
+        documents_indexed=job.done,
+        docs_per_second=job.docs_per_second,
+        attempts=job.attempts,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+@router.post("/research/stream")
+async def stream_research(
+    request: ResearchRequest,
+    graph=Depends(get_research_graph),
+    admission=Depends(get_admission_controller),
+    x_profile: Optional[str] = Header(default=None),
+):
+    """Run the hierarchical research graph, streaming node updates and tokens as server-sent events."""
+    if not request.query:
+        raise HTTPException(status_code=400, detail="Query is required.")
+
+    from langchain_core.messages import HumanMessage
+
+    from src.hierarchical_graph.configuration import Configuration
+    from src.shared.checkpointer import checkpoint_kwargs, resume_or_start
+
+    thread_id = request.thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    configuration = _resolve_configuration(Configuration, config)
+
+    # Admit before the response starts, so rejections are still plain 429/503
+    # responses; the slot is held until the stream ends or the client leaves.
+    stack = AsyncExitStack()
+    await stack.enter_async_context(admission.admit("research", model=configuration.llm_router_model))
+    try:
+        graph_input = await resume_or_start(graph, {"messages": [HumanMessage(content=request.query)]}, config)
+        # The profile covers the whole stream; its path is known before the first event.
+        run = await stack.enter_async_context(profiled("research", config, should_profile(x_profile)))
+    except BaseException:
+        await stack.aclose()
+        raise
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if run.path:
+        headers["X-Profile-File"] = run.path
+
+    # The response releases the slot and stops the profiler when it is over,
+    # even when the client leaves before the stream starts.
+    return HeldStreamingResponse(
+        stream_graph(graph, graph_input, run.config, **checkpoint_kwargs()),
+        stack,
+        media_type="text/event-stream",
+        headers=headers,
     )
 
 @router.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@router.get("/metrics")
+async def get_metrics():
+    """Admission, retry and timing metrics of this worker process."""
+    return metrics.snapshot()
+
+@router.get("/profile/nodes")
+async def get_node_profiles():
+    """Per-node wall and sampled CPU time over the profiled runs of this worker process."""
+    return node_profiles.snapshot()
+
 @router.post("/query", response_model=QueryResponse)
 async def query(
     request: QueryRequest,
     graph=Depends(get_rag_graph),
+    admission=Depends(get_admission_controller),
 ):
     if not request.query:
         raise HTTPException(status_code=400, detail="Query is required.")
 
-    # Mocked response
-    mocked_results = [
-        {
-            "document": "Life is a journey, not a destination.",
-            "score": 0.95
-        },
-        {
-            "document": "The meaning of life depends on your perspective.",
-            "score": 0.89
-        }
-    ]
-    mocked_generated_answer = "The meaning of life is subjective and varies based on personal values and beliefs."
+    from src.agent.configuration import Configuration
+
+    # The answer below is still mocked; admission is already enforced so the
+    # endpoint keeps its limits once it invokes the graph.
+    async with admission.admit(
+        "query",
+        model=Configuration.from_runnable_config().query_model,
+        tokens=len(request.query) // 4,
+    ):
+        mocked_results = [
+            {
+                "document": "Life is a journey, not a destination.",
+                "score": 0.95
+            },
+            {
+                "document": "The meaning of life depends on your perspective.",
+                "score": 0.89
+            }
+        ]
+        mocked_generated_answer = "The meaning of life is subjective and varies based on personal values and beliefs."
 
     return QueryResponse(
         query=request.query,
         results=mocked_results,
         generated_answer=mocked_generated_answer
-    )
\ No newline at end of file
+    )
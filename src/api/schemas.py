@@ -3,21 +3,51 @@ from typing import List, Optional
 
 class DocumentRequest(BaseModel):
     documents: List[str]
+    # Tenant the documents are indexed for (the default tenant when omitted).
+    tenant: Optional[str] = None
+    # Reuse the thread_id of an interrupted run to resume it from its last checkpoint.
+    thread_id: Optional[str] = None
+    # Queue the documents as a background job and return its id right away.
+    background: bool = False
 
 class IndexResponse(BaseModel):
     message: str
     documents_indexed: int
+    thread_id: Optional[str] = None
+    # Set for background jobs; poll GET /api/index/{job_id} for progress.
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+
+class IndexJobStatus(BaseModel):
+    job_id: str
+    # queued, running, succeeded or failed
+    status: str
+    documents_total: int
+    documents_indexed: int
+    docs_per_second: float
+    attempts: int
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class ResearchRequest(BaseModel):
+    query: str
+    # Reuse the thread_id of an interrupted run to resume it from its last checkpoint.
+    thread_id: Optional[str] = None
 
 class QueryRequest(BaseModel):
     query: str
     top_k: Optional[int]
 
 class QueryResponse(BaseModel):
+    """Response body of ``/query``."""
     query: str
     results: List[dict]
     generated_answer: str
 
 class HealthResponse(BaseModel):
+    """Response body of ``/health``."""
     status: str
     vector_db: str
     embedding_model: str
\ No newline at end of file
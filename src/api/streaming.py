@@ -0,0 +1,119 @@
+"""Server-sent events for streamed graph runs.
+
+``stream_graph`` turns ``graph.astream(..., stream_mode=["updates", "messages"])``
+into SSE frames:
+
+- ``update``: a node finished; ``data`` holds its name and state update;
+- ``token``: a chunk of LLM output, with the node that produced it;
+- ``end``: the run finished; ``data`` holds the thread id;
+- ``error``: the run failed.
+
+Runs are streamed with ``subgraphs=True``, so nodes of nested agents (e.g.
+the web scraper's ReAct loop) are reported with their namespace.
+"""
+
+import dataclasses
+import json
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Iterable
+
+import anyio
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# State keys that are too large or internal to send on every update.
+logger = logging.getLogger(__name__)
+
+HIDDEN_KEYS = {"payloads"}
+
+
+def _encode(value: Any) -> Any:
+    if hasattr(value, "content") and hasattr(value, "type"):
+        # Messages and message chunks.
+        return {
+            "type": value.type,
+            "name": getattr(value, "name", None),
+            "content": value.content,
+        }
+    if hasattr(value, "page_content"):
+        return {"page_content": value.page_content, "metadata": value.metadata}
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return str(value)
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=_encode, ensure_ascii=False)}\n\n"
+
+
+def _update_events(namespace: Iterable[str], chunk: dict[str, Any]) -> Iterable[str]:
+    for node, update in chunk.items():
+        if isinstance(update, dict):
+            update = {
+                key: value for key, value in update.items() if key not in HIDDEN_KEYS
+            }
+        yield sse(
+            "update", {"namespace": list(namespace), "node": node, "update": update}
+        )
+
+
+async def stream_graph(
+    graph: Any, input: Any, config: dict[str, Any], **kwargs: Any
+) -> AsyncIterator[str]:
+    """Run ``graph`` and yield its node updates and LLM tokens as SSE frames."""
+    try:
+        async for namespace, mode, chunk in graph.astream(
+            input, config, stream_mode=["updates", "messages"], subgraphs=True, **kwargs
+        ):
+            if mode == "updates":
+                for event in _update_events(namespace, chunk):
+                    yield event
+            elif mode == "messages":
+                message, metadata = chunk
+                # Tool-call chunks (e.g. structured router output) carry no text.
+                if isinstance(message.content, str) and message.content:
+                    yield sse(
+                        "token",
+                        {
+                            "namespace": list(namespace),
+                            "node": metadata.get("langgraph_node"),
+                            "content": message.content,
+                        },
+                    )
+    except Exception as e:
+        logger.warning("Streamed run failed: %s", e)
+        yield sse("error", {"detail": str(e)})
+        return
+    yield sse("end", {"thread_id": config["configurable"]["thread_id"]})
+
+
+class HeldStreamingResponse(StreamingResponse):
+    """``StreamingResponse`` releasing ``resources`` once the response is over.
+
+    The stream (and then ``resources``) is closed however the response ends:
+    completed, failed, cancelled, or with the client gone before the first
+    chunk, when the body is never iterated.
+    """
+
+    def __init__(
+        self, content: AsyncIterator[str], resources: AsyncExitStack, **kwargs: Any
+    ):
+        """Stream ``content`` and close ``resources`` once the response is over."""
+        super().__init__(content, **kwargs)
+        self.resources = resources
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Send the response, then release the body iterator and ``resources``."""
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Shielded: a cancelled request would otherwise cancel the release too.
+            with anyio.CancelScope(shield=True):
+                try:
+                    aclose = getattr(self.body_iterator, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+                finally:
+                    await self.resources.aclose()
@@ -0,0 +1,7 @@
+"""Offline evaluation of the RAG self-reflection graph.
+
+``harness`` runs the graph over a fixture corpus and question set with the
+local stand-ins in ``stand_ins`` and reports retrieval, grading, iteration,
+latency and cost metrics per configuration; ``sweep`` compares a grid of
+configurations. Run it with ``python -m src.scripts.evaluate_rag``.
+"""
@@ -0,0 +1,344 @@
+"""Run the RAG self-reflection graph over a question set and measure it.
+
+Each question is run through the compiled graph with the stand-ins of
+``src.evaluation.stand_ins`` in place of the chat models, the embedding
+model and Milvus. From the node updates the harness records:
+
+- the first retrieval, scored as recall@k and reciprocal rank against the
+  question's relevant documents;
+- every grading decision, compared with the relevance labels;
+- how many retrievals, query rewrites and generations the self-reflection
+  loop needed, and whether it finished within ``max_steps``;
+- wall-clock time, modeled latency, tokens and cost.
+
+Settings are Configuration fields (``top_k``, ``retrieval_mode``...) plus
+harness settings: ``nprobe``, ``chunk_size``, ``chunk_overlap``, ``nlist``
+and ``grader_threshold``.
+"""
+
+import contextlib
+import io
+import itertools
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langgraph.errors import GraphRecursionError
+
+from src.evaluation.metrics import agreement, percentile, recall_at_k, reciprocal_rank
+from src.evaluation.stand_ins import (
+    HashingEmbeddings,
+    LatencyModel,
+    Ledger,
+    LocalIndex,
+    LocalMilvus,
+    StandInChatModel,
+)
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(__file__), "data", "movies.json")
+
+# USD per million (prompt, completion) tokens, used to price estimated tokens.
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-3.5-turbo-0125": (0.50, 1.50),
+}
+
+HARNESS_SETTINGS = {
+    "nprobe",
+    "chunk_size",
+    "chunk_overlap",
+    "nlist",
+    "grader_threshold",
+}
+
+
+@dataclass
+class EvalCase:
+    """One fixture question and the ids of the documents that answer it."""
+
+    question: str
+    relevant: List[str]
+
+
+def load_fixture(path: str = DEFAULT_FIXTURE) -> tuple[List[Document], List[EvalCase]]:
+    """Documents (with ``doc_id`` and filter metadata) and labeled questions of a fixture file."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    docs = [
+        Document(
+            page_content=record["text"],
+            metadata={
+                "doc_id": record["id"],
+                **{k: v for k, v in record.items() if k not in ("id", "text")},
+            },
+        )
+        for record in data["documents"]
+    ]
+    cases = [
+        EvalCase(question=case["question"], relevant=case["relevant"])
+        for case in data["questions"]
+    ]
+    return docs, cases
+
+
+def chunk_documents(
+    docs: Sequence[Document], chunk_size: int = 0, chunk_overlap: int = 0
+) -> List[Document]:
+    """Split documents into chunks of at most ``chunk_size`` characters (0 keeps them whole)."""
+    if not chunk_size:
+        return list(docs)
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    return splitter.split_documents(docs)
+
+
+@dataclass
+class QuestionResult:
+    """Retrieval, grading and cost measurements for one question."""
+
+    question: str
+    retrieved: List[str]
+    recall: float
+    reciprocal_rank: float
+    # (kept by the grader, actually relevant) per graded document.
+    grades: List[tuple[bool, bool]]
+    retrievals: int
+    rewrites: int
+    generations: int
+    completed: bool
+    wall_seconds: float
+    modeled_seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+    answer: str = ""
+
+
+@dataclass
+class EvalReport:
+    """Per-question results of one evaluation run and the settings it used."""
+
+    settings: Dict[str, Any]
+    results: List[QuestionResult] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, float]:
+        """Return the mean of each measurement across questions."""
+        results = self.results
+        n = max(len(results), 1)
+        accuracy, kappa = agreement(
+            [grade for result in results for grade in result.grades]
+        )
+        wall = [result.wall_seconds for result in results]
+        return {
+            "recall_at_k": sum(r.recall for r in results) / n,
+            "mrr": sum(r.reciprocal_rank for r in results) / n,
+            "grader_accuracy": accuracy,
+            "grader_kappa": kappa,
+            "mean_retrievals": sum(r.retrievals for r in results) / n,
+            "mean_rewrites": sum(r.rewrites for r in results) / n,
+            "mean_generations": sum(r.generations for r in results) / n,
+            "completion_rate": sum(r.completed for r in results) / n,
+            "wall_p50_seconds": percentile(wall, 50),
+            "wall_p95_seconds": percentile(wall, 95),
+            "modeled_seconds": sum(r.modeled_seconds for r in results) / n,
+            "tokens_per_question": sum(
+                r.prompt_tokens + r.completion_tokens for r in results
+            )
+            / n,
+            "cost_per_question": sum(r.cost for r in results) / n,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the report as JSON-serializable data."""
+        return {
+            "settings": self.settings,
+            "summary": self.summary(),
+            "results": [asdict(r) for r in self.results],
+        }
+
+
+def _price(ledger: Ledger, prices: Dict[str, tuple[float, float]]) -> float:
+    cost = 0.0
+    for model, tokens in ledger.prompt_tokens.items():
+        prompt_price, completion_price = prices.get(model.split("/")[-1], (0.0, 0.0))
+        cost += (
+            tokens * prompt_price
+            + ledger.completion_tokens.get(model, 0) * completion_price
+        ) / 1e6
+    return cost
+
+
+@contextlib.contextmanager
+def stand_ins(index: LocalIndex, ledger: Ledger, grader_threshold: float):
+    """Point the RAG graph's model, embedding and Milvus factories at the stand-ins."""
+    from unittest import mock
+
+    from src.agent.rag_self_reflection import graph as rag_graph
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(
+            mock.patch.object(
+                rag_graph,
+                "load_chat_model",
+                lambda name: StandInChatModel(name, ledger, grader_threshold),
+            )
+        )
+        stack.enter_context(
+            mock.patch.object(
+                rag_graph, "EmbeddingHandler", lambda **kwargs: index.embeddings
+            )
+        )
+        stack.enter_context(
+            mock.patch.object(
+                rag_graph, "MilvusHandler", lambda **kwargs: LocalMilvus(index, ledger)
+            )
+        )
+        # Cascade-mode graders embed with the same stand-in.
+        stack.enter_context(
+            mock.patch.object(
+                rag_graph,
+                "get_embedder",
+                lambda name: index.embeddings.generate_embeddings,
+            )
+        )
+        yield
+
+
+async def _run_case(
+    graph: Any, case: EvalCase, index: LocalIndex, config: Dict[str, Any], top_k: int
+) -> QuestionResult:
+    first_retrieval: Optional[List[int]] = None
+    grades: List[tuple[bool, bool]] = []
+    counts = {"retrieve_documents": 0, "transform_query": 0, "generate": 0}
+    candidates: List[Document] = []
+    answer = ""
+    relevant = set(case.relevant)
+
+    def doc_id(doc: Document) -> str:
+        return index.doc_id(doc.metadata["id"])
+
+    completed = True
+    try:
+        async for update in graph.astream(
+            {"question": case.question}, config, stream_mode="updates"
+        ):
+            for node, values in update.items():
+                if node in counts:
+                    counts[node] += 1
+                values = values or {}
+                if node == "retrieve_documents":
+                    candidates = values.get("documents", [])
+                    if first_retrieval is None:
+                        first_retrieval = [doc.metadata["id"] for doc in candidates]
+                elif node == "grade_documents":
+                    kept = {doc.metadata["id"] for doc in values.get("documents", [])}
+                    grades += [
+                        (doc.metadata["id"] in kept, doc_id(doc) in relevant)
+                        for doc in candidates
+                    ]
+                elif node == "generate" and values.get("generation"):
+                    answer = values["generation"][-1]
+    except GraphRecursionError:
+        completed = False
+
+    # Chunks of the same document count once, at their best rank.
+    retrieved = list(
+        dict.fromkeys(index.doc_id(chunk_id) for chunk_id in first_retrieval or [])
+    )
+    return QuestionResult(
+        question=case.question,
+        retrieved=retrieved,
+        recall=recall_at_k(retrieved, case.relevant, top_k),
+        reciprocal_rank=reciprocal_rank(retrieved, case.relevant),
+        grades=grades,
+        retrievals=counts["retrieve_documents"],
+        rewrites=counts["transform_query"],
+        generations=counts["generate"],
+        completed=completed,
+        wall_seconds=0.0,
+        modeled_seconds=0.0,
+        prompt_tokens=0,
+        completion_tokens=0,
+        cost=0.0,
+        answer=answer,
+    )
+
+
+async def evaluate(
+    settings: Dict[str, Any],
+    docs: Sequence[Document],
+    cases: Iterable[EvalCase],
+    *,
+    latency: Optional[LatencyModel] = None,
+    prices: Optional[Dict[str, tuple[float, float]]] = None,
+    max_steps: int = 25,
+    quiet: bool = True,
+) -> EvalReport:
+    """Run every case through the RAG graph with ``settings`` and collect the metrics."""
+    from src.agent.configuration import Configuration
+    from src.agent.rag_self_reflection.graph import graph
+
+    prices = DEFAULT_PRICES if prices is None else prices
+    configurable = {k: v for k, v in settings.items() if k not in HARNESS_SETTINGS}
+    if "nprobe" in settings:
+        configurable["search_params"] = {
+            "metric_type": "L2",
+            "nprobe": settings["nprobe"],
+        }
+    # Fails fast on settings that are not valid configuration values.
+    configuration = Configuration.from_runnable_config({"configurable": configurable})
+
+    chunks = chunk_documents(
+        docs, settings.get("chunk_size", 0), settings.get("chunk_overlap", 0)
+    )
+    index = LocalIndex(chunks, HashingEmbeddings(), nlist=settings.get("nlist", 4))
+    report = EvalReport(settings=dict(settings))
+    config = {"configurable": configurable, "recursion_limit": max_steps}
+
+    for case in cases:
+        ledger = Ledger(latency=latency or LatencyModel())
+        output = (
+            contextlib.redirect_stdout(io.StringIO())
+            if quiet
+            else contextlib.nullcontext()
+        )
+        started = time.perf_counter()
+        with stand_ins(index, ledger, settings.get("grader_threshold", 0.5)), output:
+            result = await _run_case(graph, case, index, config, configuration.top_k)
+        result.wall_seconds = time.perf_counter() - started
+        result.modeled_seconds = ledger.modeled_seconds
+        result.prompt_tokens = sum(ledger.prompt_tokens.values())
+        result.completion_tokens = sum(ledger.completion_tokens.values())
+        result.cost = _price(ledger, prices)
+        report.results.append(result)
+    return report
+
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the values in ``grid``, as settings dicts."""
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+async def sweep(
+    grid: Dict[str, Sequence[Any]],
+    docs: Sequence[Document],
+    cases: Sequence[EvalCase],
+    base: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> List[EvalReport]:
+    """Evaluate ``base`` settings overridden by each combination of ``grid``."""
+    return [
+        await evaluate({**(base or {}), **settings}, docs, cases, **kwargs)
+        for settings in expand_grid(grid)
+    ]
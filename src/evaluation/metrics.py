@@ -0,0 +1,48 @@
+"""Retrieval and grading metrics."""
+
+from typing import Iterable, Sequence
+
+
+def recall_at_k(retrieved: Sequence[str], relevant: Iterable[str], k: int) -> float:
+    """Share of the relevant documents among the first ``k`` retrieved."""
+    relevant = set(relevant)
+    if not relevant:
+        return 0.0
+    return len(relevant & set(retrieved[:k])) / len(relevant)
+
+
+def reciprocal_rank(retrieved: Sequence[str], relevant: Iterable[str]) -> float:
+    """1 / rank of the first relevant document, 0 when none was retrieved."""
+    relevant = set(relevant)
+    for rank, doc_id in enumerate(retrieved, start=1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def agreement(decisions: Sequence[tuple[bool, bool]]) -> tuple[float, float]:
+    """Accuracy and Cohen's kappa of (grader kept, actually relevant) pairs.
+
+    Kappa corrects the accuracy for agreement expected by chance; it is 0
+    when the grader does no better than chance and 1 when it agrees fully.
+    """
+    if not decisions:
+        return 0.0, 0.0
+    n = len(decisions)
+    observed = sum(kept == relevant for kept, relevant in decisions) / n
+    kept_rate = sum(kept for kept, _ in decisions) / n
+    relevant_rate = sum(relevant for _, relevant in decisions) / n
+    expected = kept_rate * relevant_rate + (1 - kept_rate) * (1 - relevant_rate)
+    kappa = 1.0 if expected == 1 else (observed - expected) / (1 - expected)
+    return observed, kappa
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the ``q``-th percentile (0-100) by linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
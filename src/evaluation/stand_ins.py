@@ -0,0 +1,356 @@
+"""Deterministic local stand-ins for the LLM, the embedding model and Milvus.
+
+They let the RAG graph run offline with reproducible results:
+
+- ``HashingEmbeddings`` embeds bags of content words into a fixed-size space;
+- ``LocalIndex`` is a small IVF index over those vectors, so ``nprobe``
+  trades recall for work the way it does in Milvus;
+- ``StandInChatModel`` answers the graph's prompts with keyword heuristics:
+  the grader keeps documents sharing enough terms with the question, the
+  rewriter keeps the content words, the generator quotes the best matching
+  sentence and the hallucination grader checks the answer against the
+  context.
+
+Every LLM call and search is recorded in a ``Ledger`` with estimated tokens
+and a modeled latency, which the harness turns into cost and latency.
+"""
+
+import operator
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from src.services.milvus_handler import RescoredHit, build_filter_expr
+
+_WORD = re.compile(r"[a-z0-9]+")
+_DOCUMENT = re.compile(r"<document(?:\s[^>]*)?>\n(.*?)\n</document>", re.DOTALL)
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have he her his how in is it its of on or she "
+    "that the their them they this to was were what when where which who whom whose why with".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    """Lower-cased content words of ``text``, in order."""
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def overlap(query: str, text: str) -> float:
+    """Share of the distinct terms of ``query`` that also occur in ``text``."""
+    wanted = set(terms(query))
+    return len(wanted & set(terms(text))) / len(wanted) if wanted else 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Return a rough token count for ``text``."""
+    # Same rough four characters per token the API uses for admission.
+    return len(text) // 4 + 1
+
+
+@dataclass
+class LatencyModel:
+    """Latency charged per operation, in seconds, so runs can be compared without real services."""
+
+    llm_call: float = 0.4
+    llm_per_output_token: float = 0.01
+    embed_call: float = 0.05
+    search_call: float = 0.01
+    # Added per IVF cluster scanned.
+    search_per_probe: float = 0.002
+
+
+@dataclass
+class Ledger:
+    """Calls made during a run, with their token counts and modeled latency."""
+
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    llm_calls: int = 0
+    searches: int = 0
+    prompt_tokens: Dict[str, int] = field(default_factory=dict)
+    completion_tokens: Dict[str, int] = field(default_factory=dict)
+    modeled_seconds: float = 0.0
+
+    def record_llm(self, model: str, prompt: str, completion: str) -> None:
+        """Count one LLM call and its prompt and completion tokens."""
+        completion_tokens = estimate_tokens(completion)
+        self.llm_calls += 1
+        self.prompt_tokens[model] = self.prompt_tokens.get(model, 0) + estimate_tokens(
+            prompt
+        )
+        self.completion_tokens[model] = (
+            self.completion_tokens.get(model, 0) + completion_tokens
+        )
+        self.modeled_seconds += (
+            self.latency.llm_call
+            + completion_tokens * self.latency.llm_per_output_token
+        )
+
+    def record_search(self, queries: int, probes: int) -> None:
+        """Count one search and add its modeled latency."""
+        self.searches += 1
+        self.modeled_seconds += (
+            self.latency.embed_call
+            + self.latency.search_call
+            + queries * probes * self.latency.search_per_probe
+        )
+
+
+class HashingEmbeddings:
+    """Stand-in for ``EmbeddingHandler``: normalized hashed bag-of-words vectors."""
+
+    def __init__(
+        self, model_name: str = "local/hashing", dim: int = 512, **kwargs: Any
+    ):
+        """Hash terms into ``dim`` buckets; ``model_name`` is reported only."""
+        self.model_name = model_name
+        self.vector_dim = dim
+
+    def generate_embeddings(self, texts: Sequence[str]) -> np.ndarray:
+        """Return unit-length bag-of-words vectors for ``texts``."""
+        vectors = np.zeros((len(texts), self.vector_dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in terms(text):
+                vectors[row, zlib.crc32(term.encode()) % self.vector_dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class LocalIndex:
+    """IVF-flat index over document chunks with L2 distances, like the Milvus float32 index."""
+
+    def __init__(
+        self,
+        chunks: Sequence[Document],
+        embeddings: HashingEmbeddings,
+        nlist: int = 4,
+        seed: int = 0,
+        iterations: int = 10,
+    ):
+        """Embed ``chunks`` and cluster them into ``nlist`` inverted lists."""
+        self.chunks = list(chunks)
+        self.embeddings = embeddings
+        self.vectors = embeddings.generate_embeddings(
+            [chunk.page_content for chunk in self.chunks]
+        )
+        nlist = max(1, min(nlist, len(self.chunks)))
+        rng = np.random.default_rng(seed)
+        self.centroids = self.vectors[
+            rng.choice(len(self.chunks), nlist, replace=False)
+        ]
+        for _ in range(iterations):
+            self.assignments = self._nearest_centroids(self.vectors, 1)[:, 0]
+            for cluster in range(nlist):
+                members = self.vectors[self.assignments == cluster]
+                if len(members):
+                    self.centroids[cluster] = members.mean(axis=0)
+        self.assignments = self._nearest_centroids(self.vectors, 1)[:, 0]
+
+    def _nearest_centroids(self, vectors: np.ndarray, count: int) -> np.ndarray:
+        distances = ((vectors[:, None, :] - self.centroids[None, :, :]) ** 2).sum(
+            axis=2
+        )
+        return np.argsort(distances, axis=1, kind="stable")[:, :count]
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int,
+        nprobe: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[List[tuple[int, float]]]:
+        """(chunk id, squared L2 distance) of the ``top_k`` nearest chunks in the ``nprobe`` nearest clusters."""
+        probes = self._nearest_centroids(
+            query_vectors, min(nprobe, len(self.centroids))
+        )
+        results = []
+        for query, clusters in zip(query_vectors, probes):
+            candidates = np.flatnonzero(np.isin(self.assignments, clusters))
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            distances = ((self.vectors[candidates] - query) ** 2).sum(axis=1)
+            order = np.argsort(distances, kind="stable")[:top_k]
+            results.append([(int(candidates[i]), float(distances[i])) for i in order])
+        return results
+
+    def doc_id(self, chunk_id: int) -> str:
+        """Return the document id of chunk ``chunk_id``."""
+        return self.chunks[chunk_id].metadata["doc_id"]
+
+
+_BOUNDS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+
+
+def _matches(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    for name, condition in filters.items():
+        value = metadata.get(name)
+        if condition is None:
+            continue
+        if isinstance(condition, dict):
+            if value is None or not all(
+                _BOUNDS[op](value, int(b))
+                for op, b in condition.items()
+                if b is not None
+            ):
+                return False
+        elif isinstance(condition, (list, tuple, set)):
+            if str(value).lower() not in {str(c).lower() for c in condition}:
+                return False
+        elif str(value).lower() != str(condition).lower():
+            return False
+    return True
+
+
+class LocalMilvus:
+    """Stand-in for ``MilvusHandler`` searching a ``LocalIndex``; metadata filters are applied in memory."""
+
+    def __init__(self, index: LocalIndex, ledger: Ledger, **kwargs: Any):
+        """Search ``index`` and record each search in ``ledger``."""
+        self.index = index
+        self.ledger = ledger
+
+    def connect(self) -> None:
+        """Do nothing; there is no server to connect to."""
+        pass
+
+    def search(
+        self,
+        collection_name: str,
+        query_vectors: Any,
+        top_k: int = 3,
+        output_fields: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        tenant: Optional[str] = None,
+        nprobe: int = 10,
+        with_vectors: bool = False,
+    ) -> List[List[RescoredHit]]:
+        """Search the local index with the real handler's arguments."""
+        # Validate filters exactly like the real handler does.
+        build_filter_expr(filters)
+        allowed = None
+        if filters:
+            allowed = np.array(
+                [_matches(chunk.metadata, filters) for chunk in self.index.chunks]
+            )
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        self.ledger.record_search(len(queries), min(nprobe, len(self.index.centroids)))
+        results = []
+        for hits in self.index.search(queries, top_k, nprobe, allowed):
+            results.append(
+                [
+                    RescoredHit(
+                        id=chunk_id,
+                        distance=distance,
+                        entity={
+                            name: self.index.chunks[chunk_id].page_content
+                            for name in output_fields or []
+                        },
+                    )
+                    for chunk_id, distance in hits
+                ]
+            )
+        return results
+
+    def hit_vectors(
+        self,
+        hits: Sequence[RescoredHit],
+        dim: int,
+        collection_name: Optional[str] = None,
+    ) -> np.ndarray:
+        """Return the stored vectors of ``hits``."""
+        return self.index.vectors[[hit.id for hit in hits]]
+
+
+def _text(messages: Any) -> tuple[str, str]:
+    """(system, human) text of a prompt given as a string or as role/content dicts."""
+    if isinstance(messages, str):
+        return "", messages
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    human = "\n".join(m["content"] for m in messages if m["role"] != "system")
+    return system, human
+
+
+def _after(label: str, text: str) -> str:
+    start = text.find(label)
+    return text[start + len(label) :].strip() if start >= 0 else text
+
+
+class StandInChatModel:
+    """Keyword-heuristic stand-in for the chat models the RAG graph loads."""
+
+    def __init__(self, model_name: str, ledger: Ledger, grader_threshold: float = 0.5):
+        """Answer with heuristics and record each call in ``ledger``."""
+        self.model_name = model_name
+        self.ledger = ledger
+        self.grader_threshold = grader_threshold
+
+    def with_structured_output(self, schema: type) -> "_StructuredStandIn":
+        """Return a model that answers with ``schema``-shaped output."""
+        return _StructuredStandIn(self, schema.__name__)
+
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> AIMessage:
+        """Answer ``messages`` and record the call."""
+        system, human = _text(messages)
+        content = self.answer(human, system)
+        self.ledger.record_llm(self.model_name, system + human, content)
+        return AIMessage(content=content)
+
+    def answer(self, question: str, context: str) -> str:
+        """Return the context sentence that best covers the question."""
+        passages = _DOCUMENT.findall(context)
+        sentences = [
+            s for passage in passages for s in _SENTENCE.split(passage) if s.strip()
+        ]
+        if not sentences:
+            return "I don't know."
+        return max(sentences, key=lambda sentence: overlap(question, sentence))
+
+    def structured(self, schema: str, system: str, human: str) -> Dict[str, Any]:
+        """Return the heuristic answer for the structured ``schema``."""
+        if schema == "Grader":
+            if human.startswith("Question:") and "\n\nDocument:" in human:
+                question, document = human[len("Question:") :].split("\n\nDocument:", 1)
+                relevant = overlap(question, document) >= self.grader_threshold
+            else:
+                # Hallucination check: the answer's terms must appear in the documents.
+                generation = _after("Generated Response:", human)
+                relevant = (
+                    overlap(generation, human[: human.rfind("Generated Response:")])
+                    >= 0.8
+                )
+            return {"type": "yes" if relevant else "no", "logic": ""}
+        if schema == "RewriterResponse":
+            question = _after("Original Question:", human).split("\n")[0]
+            return {
+                "rewritten_question": " ".join(terms(question)),
+                "reasoning": "kept the content words",
+            }
+        if schema == "QueryVariants":
+            words = terms(human)
+            half = max(1, len(words) // 2)
+            return {
+                "queries": [
+                    " ".join(words),
+                    " ".join(words[:half]),
+                    " ".join(words[half:]),
+                ]
+            }
+        raise ValueError(f"No stand-in output for {schema}.")
+
+
+class _StructuredStandIn:
+    def __init__(self, model: StandInChatModel, schema: str):
+        self.model = model
+        self.schema = schema
+
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> Dict[str, Any]:
+        system, human = _text(messages)
+        output = self.model.structured(self.schema, system, human)
+        self.model.ledger.record_llm(self.model.model_name, system + human, str(output))
+        return output
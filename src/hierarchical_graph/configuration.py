@@ -2,10 +2,8 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, fields, field
-from typing import Optional
+from dataclasses import dataclass, field
 from typing import Annotated
-from langchain_core.runnables import RunnableConfig
 from src.agent import prompts
 from src.shared.configuration import BaseConfiguration 
 
@@ -25,6 +23,28 @@ class Configuration(BaseConfiguration):
             "description": "The language model used for processing and refining queries. Should be in the form: provider/model-name."
         },
     )
+    scrape_summary_model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = field(
+        default="gpt-4o-mini",
+        metadata={
+            "description": "The language model used for summarizing long scraped pages. Should be in the form: provider/model-name."
+        },
+    )
+    scrape_max_page_chars: int = field(
+        default=6000,
+        metadata={"description": "Most characters of one scraped page passed to the web scraper agent."},
+    )
+    scrape_max_total_chars: int = field(
+        default=16000,
+        metadata={"description": "Most characters of all scraped pages together passed to the web scraper agent."},
+    )
+    scrape_summarize_above_chars: int = field(
+        default=3000,
+        metadata={"description": "Scraped pages longer than this are map-reduce summarized; 0 disables summarization."},
+    )
+    scrape_summary_concurrency: int = field(
+        default=4,
+        metadata={"description": "Summarization calls in flight at once while processing scraped pages."},
+    )
     # prompts
     router_system_prompt: str = field(
         default=prompts.ROUTER_SYSTEM_PROMPT,
@@ -32,12 +52,3 @@ class Configuration(BaseConfiguration):
             "description": "The system prompt used for classifying user questions to route them to the correct node."
         },
     )
-    
-    @classmethod
-    def from_runnable_config(
-        cls, config: Optional[RunnableConfig] = None
-    ) -> Configuration:
-        """Create a Configuration instance from a RunnableConfig object."""
-        configurable = (config.get("configurable") or {}) if config else {}
-        _fields = {f.name for f in fields(cls) if f.init}
-        return cls(**{k: v for k, v in configurable.items() if k in _fields})
\ No newline at end of file
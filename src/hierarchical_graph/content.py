@@ -0,0 +1,285 @@
+"""Prepare scraped pages for the LLM.
+
+Raw page text is mostly navigation, repeated blocks and more words than the
+agent needs. Before it reaches the ReAct agent's context, every page goes
+through:
+
+1. boilerplate stripping (menus, cookie banners, footers);
+2. near-duplicate paragraph removal across all pages, using word shingles;
+3. map-reduce summarization of long pages, with bounded parallelism;
+4. per-page and total size budgets.
+
+The output size is bounded by ``ContentLimits.max_total_chars``, and the
+summarization cost by ``max_input_chars`` / ``chunk_chars`` map calls per
+page.
+"""
+
+import asyncio
+import logging
+import re
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from src.services.resilience import ainvoke_with_retry
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT = """Summarize the following part of the web page "{title}". Keep names, numbers, dates and \
+other concrete facts; drop navigation, ads and repetition. Answer with the summary only.
+
+{text}"""
+
+REDUCE_PROMPT = """Combine these partial summaries of the web page "{title}" into one summary of at most \
+{max_chars} characters. Keep concrete facts and drop repetition. Answer with the summary only.
+
+{text}"""
+
+# Banners and notices, matched from the start of the line so prose that merely
+# mentions cookies, logins or JavaScript is kept.
+_BOILERPLATE = re.compile(
+    r"^(?:"
+    r"(?:©|\(c\)|copyright\b)"
+    r"|(?:we use|this (?:web)?site uses) cookies\b"
+    r"|(?:accept|allow|reject|manage) (?:all )?cookies\b"
+    r"|(?:subscribe|sign up) (?:to|for) (?:our |the )?newsletter\b"
+    r"|(?:please )?(?:enable|turn on) javascript\b"
+    r"|javascript is (?:disabled|required|not enabled)\b"
+    r"|skip to (?:main )?content\b"
+    r"|advertisement\b"
+    r")"
+    r"|\ball rights reserved\.?$",
+    re.IGNORECASE,
+)
+# Footer and menu lines made only of link labels, e.g. "Privacy Policy | Terms of Use".
+_LINK_LABEL = re.compile(
+    r"privacy(?: policy)?|terms(?: of (?:use|service))?|cookies?(?: policy| settings| preferences)?|"
+    r"sign (?:in|up|out)|log ?(?:in|out)|register|subscribe|newsletter|contact(?: us)?|about(?: us)?|"
+    r"sitemap|help|faq|careers|press|home|menu|share(?: this| on \w+)?|follow us(?: on \w+)?|"
+    r"facebook|twitter|x|instagram|youtube|linkedin|rss",
+    re.IGNORECASE,
+)
+_LINK_SEPARATORS = re.compile(r"\s*[|·•/]\s*")
+# Short lines without digits or punctuation, e.g. "Movies" or "TV Shows": menu
+# entries when they sit in a menu or repeat across pages, headings otherwise.
+_MENU_ENTRY = re.compile(r"[^\W\d_]+(?:[ &'-]+[^\W\d_]+){0,2}")
+
+
+@dataclass
+class ContentLimits:
+    """Size limits applied to fetched pages."""
+
+    # Size of each page and of all pages together after processing.
+    max_page_chars: int = 6000
+    max_total_chars: int = 16000
+    # Pages longer than this are summarized (None disables summarization).
+    summarize_above_chars: Optional[int] = 3000
+    # Map step: chunk size and the most text of a page that is summarized.
+    chunk_chars: int = 4000
+    max_input_chars: int = 40000
+    # Map-reduce calls in flight across all pages.
+    max_concurrency: int = 4
+    # Jaccard similarity of word shingles above which a paragraph is a duplicate.
+    dedup_threshold: float = 0.7
+
+
+def strip_boilerplate(text: str, navigation: frozenset[str] = frozenset()) -> list[str]:
+    """Split page text into paragraphs, dropping menus, banners and footers.
+
+    A menu is a run of short label lines that includes a common link label
+    (e.g. "Home"). Short label lines in ``navigation`` (see
+    ``repeated_labels``) are dropped wherever they appear. Other short lines,
+    such as headings, names, dates and figures, are kept.
+    """
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    menu = _menu_lines(lines)
+    paragraphs = []
+    for i, line in enumerate(lines):
+        if i in menu or line in navigation:
+            continue
+        if len(line) < 160 and (_BOILERPLATE.search(line) or _is_link_bar(line)):
+            continue
+        paragraphs.append(line)
+    return paragraphs
+
+
+def _menu_lines(lines: Sequence[str]) -> set[int]:
+    """Return the indices of runs of menu entries containing at least one link label."""
+    menu: set[int] = set()
+    run: list[int] = []
+    for i, line in enumerate([*lines, ""]):
+        if line and _MENU_ENTRY.fullmatch(line):
+            run.append(i)
+            continue
+        if any(_LINK_LABEL.fullmatch(lines[j]) for j in run):
+            menu.update(run)
+        run = []
+    return menu
+
+
+def repeated_labels(texts: Sequence[str]) -> frozenset[str]:
+    """Short label lines found on more than one page: site navigation."""
+    counts: Counter = Counter()
+    for text in texts:
+        labels = {" ".join(line.split()) for line in text.splitlines()}
+        counts.update(label for label in labels if _MENU_ENTRY.fullmatch(label))
+    return frozenset(label for label, count in counts.items() if count > 1)
+
+
+def _is_link_bar(line: str) -> bool:
+    labels = [label for label in _LINK_SEPARATORS.split(line) if label]
+    return bool(labels) and all(_LINK_LABEL.fullmatch(label) for label in labels)
+
+
+def shingles(text: str, k: int = 5) -> set[int]:
+    """Hashes of the word k-grams of ``text``."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i : i + k]).encode())
+        for i in range(len(words) - k + 1)
+    }
+
+
+class NearDuplicateFilter:
+    """Remember paragraphs and report ones that mostly repeat an earlier paragraph.
+
+    An inverted index from shingle hash to paragraph keeps each check
+    proportional to the paragraph's length rather than to everything seen.
+    """
+
+    def __init__(self, threshold: float = 0.7, k: int = 5):
+        """Flag pages sharing at least ``threshold`` of their ``k``-word shingles with one seen before."""
+        self.threshold = threshold
+        self.k = k
+        self._index: defaultdict[int, list[int]] = defaultdict(list)
+        self._sizes: list[int] = []
+
+    def is_duplicate(self, text: str) -> bool:
+        """Return True when ``text`` near-duplicates a page seen before, otherwise remember it."""
+        grams = shingles(text, self.k)
+        if not grams:
+            return True
+        shared = Counter(pid for gram in grams for pid in self._index.get(gram, ()))
+        for pid, count in shared.items():
+            if count / (len(grams) + self._sizes[pid] - count) >= self.threshold:
+                return True
+        pid = len(self._sizes)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._index[gram].append(pid)
+        return False
+
+
+def truncate(text: str, limit: int) -> str:
+    """Cut ``text`` to ``limit`` characters, at a paragraph or word boundary when possible."""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(" ", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut].rstrip() + " […]"
+
+
+def clean_pages(
+    docs: Sequence[Document], limits: ContentLimits
+) -> list[tuple[str, str]]:
+    """Strip boilerplate and cross-page duplicates; returns (title, text) for pages with content left."""
+    seen = NearDuplicateFilter(limits.dedup_threshold)
+    navigation = repeated_labels([doc.page_content for doc in docs])
+    pages = []
+    for doc in docs:
+        paragraphs = [
+            p
+            for p in strip_boilerplate(doc.page_content, navigation)
+            if not seen.is_duplicate(p)
+        ]
+        if paragraphs:
+            title = doc.metadata.get("title") or doc.metadata.get("source", "")
+            pages.append((title, "\n".join(paragraphs)))
+    return pages
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    chunks, current, length = [], [], 0
+    for paragraph in text.split("\n"):
+        if current and length + len(paragraph) > size:
+            chunks.append("\n".join(current))
+            current, length = [], 0
+        current.append(paragraph[:size])
+        length += len(paragraph) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+async def summarize_page(
+    model: Any,
+    title: str,
+    text: str,
+    limits: ContentLimits,
+    semaphore: asyncio.Semaphore,
+    endpoint: str,
+) -> str:
+    """Map-reduce summary of one page: summarize chunks in parallel, then combine them."""
+
+    async def call(prompt: str) -> str:
+        async with semaphore:
+            response = await ainvoke_with_retry(model, prompt, endpoint=endpoint)
+        return str(response.content).strip()
+
+    chunks = _chunks(text[: limits.max_input_chars], limits.chunk_chars)
+    partials = await asyncio.gather(
+        *(call(MAP_PROMPT.format(title=title, text=chunk)) for chunk in chunks)
+    )
+    if len(partials) == 1:
+        return partials[0]
+    return await call(
+        REDUCE_PROMPT.format(
+            title=title, max_chars=limits.max_page_chars, text="\n\n".join(partials)
+        )
+    )
+
+
+async def prepare_content(
+    docs: Sequence[Document],
+    limits: ContentLimits,
+    model: Optional[Any] = None,
+    endpoint: str = "llm:scrape_summary",
+) -> list[tuple[str, str]]:
+    """Run the pipeline over loaded pages and return (title, text) within the size budgets.
+
+    Without ``model`` long pages are truncated instead of summarized.
+    """
+    pages = clean_pages(docs, limits)
+    if not pages:
+        return []
+
+    if model is not None and limits.summarize_above_chars is not None:
+        semaphore = asyncio.Semaphore(limits.max_concurrency)
+
+        async def process(title: str, text: str) -> str:
+            if len(text) <= limits.summarize_above_chars:
+                return text
+            try:
+                return await summarize_page(
+                    model, title, text, limits, semaphore, endpoint
+                )
+            except Exception as e:
+                # A failed summary falls back to the truncated page.
+                logger.warning("Summarizing %r failed: %s", title, e)
+                return text
+
+        texts = await asyncio.gather(*(process(title, text) for title, text in pages))
+        pages = [(title, text) for (title, _), text in zip(pages, texts)]
+
+    # Each page gets an equal share of the total budget.
+    share = min(limits.max_page_chars, limits.max_total_chars // len(pages))
+    return [(title, truncate(text, share)) for title, text in pages]
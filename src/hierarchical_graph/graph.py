@@ -1,19 +1,23 @@
-from typing import Any, Dict, Literal, cast, TypedDict, List
+import asyncio
+from functools import cache
+from typing import List, Literal, TypedDict
 
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_core.language_models.chat_models import BaseChatModel
-from langgraph.graph import StateGraph, END, START
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import create_react_agent
 from langgraph.types import Command
-from src.shared.utils import load_chat_model, format_docs
-
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.tools import tool
 
-from langchain_core.messages import AIMessage
 from src.hierarchical_graph.configuration import Configuration
+from src.hierarchical_graph.content import ContentLimits, prepare_content
 from src.hierarchical_graph.state import AgentState, InputState
+from src.services.resilience import acall_with_retry, ainvoke_with_retry
+from src.shared.history import history_prompt, offload_payload, resolve_payload
+from src.shared.utils import get_chat_model
+
+# Workers managed by the supervisor
+MEMBERS = ("search", "web_scraper")
 
 async def research_supervisor_node(
     state: AgentState, *,
@@ -22,25 +26,22 @@ async def research_supervisor_node(
     """
     Supervisor node for research tasks.
     """
-    # Load configuration and LLM
+    # Load configuration; the supervisor for it is built once and shared by all runs
     configuration = Configuration.from_runnable_config(config)
-    print(configuration)
-    llm = load_chat_model(configuration.llm_router_model)
-
-    # Define workers managed by the supervisor
-    members = ["search", "web_scraper"]
-
-    # Dynamically generate the supervisor function
-    supervisor_func = make_supervisor_node(llm, members)
+    supervisor_func = make_supervisor_node(
+        configuration.llm_router_model, MEMBERS, max_messages=configuration.max_history_messages
+    )
 
     # Call the supervisor function with the current state
-    return supervisor_func(state)
+    return await supervisor_func(state)
 
-def make_supervisor_node(llm: BaseChatModel, members: list[str]) -> str:
-    options = ["FINISH"] + members
+@cache
+def make_supervisor_node(model_name: str, members: tuple[str, ...], max_messages: int = 8):
+    """Build the supervisor for ``model_name`` once: prompt, router schema and structured model."""
+    options = ["FINISH", *members]
     system_prompt = (
         "You are a supervisor tasked with managing a conversation between the"
-        f" following workers: {members}. Given the following user request,"
+        f" following workers: {list(members)}. Given the following user request,"
         " respond with the worker to act next. Each worker will perform a"
         " task and respond with their results and status. When finished,"
         " respond with FINISH."
@@ -51,17 +52,18 @@ def make_supervisor_node(llm: BaseChatModel, members: list[str]) -> str:
 
         next: Literal[*options]
 
-    def supervisor_node(state: AgentState) -> Command[Literal[*members, "__end__"]]:
+    router_llm = get_chat_model(model_name).with_structured_output(Router)
+    endpoint = f"llm:{model_name}"
+
+    async def supervisor_node(state: AgentState) -> Command[Literal[*members, "__end__"]]:
         """An LLM-based router."""
         print("\n[Supervisor Node] Current State:")
         print(state)
-        print(state.messages)
-        messages = [
-            {"role": "system", "content": system_prompt},
-        ] + state.messages
+        # Keep the original request plus the most recent worker reports.
+        messages = history_prompt(system_prompt, state.messages, max_messages=max_messages, keep_first=True)
         print("\n[Supervisor Node] Messages:")
         print(messages)
-        response = llm.with_structured_output(Router).invoke(messages)
+        response = await ainvoke_with_retry(router_llm, messages, endpoint=endpoint)
         goto = response["next"]
         if goto == "FINISH":
             print("[Supervisor Node] Finished")
@@ -71,17 +73,24 @@ def make_supervisor_node(llm: BaseChatModel, members: list[str]) -> str:
 
     return supervisor_node
 
-tavily_tool = TavilySearchResults(max_results=3)
+@cache
+def get_tavily_tool():
+    """Create the Tavily search tool on first use and reuse it afterwards."""
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    return TavilySearchResults(max_results=3)
 
 @tool
-def scrape_webpages(urls: List[str]) -> str:
+async def scrape_webpages(urls: List[str], config: RunnableConfig) -> str:
     """Use requests and bs4 to scrape the provided web pages for detailed information."""
+    from langchain_community.document_loaders import WebBaseLoader
+
     print("[scrape_webpages] Called with URLs:", urls)
     loader = WebBaseLoader(urls)
     
     # Optionally wrap in a try/except to see if an error is thrown
     try:
-        docs = loader.load()
+        docs = await asyncio.to_thread(loader.load)
     except Exception as e:
         print(f"[scrape_webpages] Error while loading pages: {e}")
         return "Error loading pages: " + str(e)
@@ -90,63 +99,83 @@ def scrape_webpages(urls: List[str]) -> str:
         print("[scrape_webpages] No documents were loaded!")
         return "No documents loaded."
 
-    print("[scrape_webpages] Loaded Documents:")
-    print(f"Count: {len(docs)}")
-    for i, doc in enumerate(docs):
-        # Print partial content or metadata
-        print(f"--- Document #{i} ---")
-        print("Metadata:", doc.metadata)
-        print("Content (first 500 chars):")
-        print(doc.page_content[:500])
-        print("------")
-
-    # Finally, return the combined string
+    # Strip, deduplicate, summarize and cap the pages before they reach the agent's context.
+    configuration = Configuration.from_runnable_config(config)
+    limits = ContentLimits(
+        max_page_chars=configuration.scrape_max_page_chars,
+        max_total_chars=configuration.scrape_max_total_chars,
+        summarize_above_chars=configuration.scrape_summarize_above_chars or None,
+        max_concurrency=configuration.scrape_summary_concurrency,
+    )
+    pages = await prepare_content(
+        docs,
+        limits,
+        model=get_chat_model(configuration.scrape_summary_model),
+        endpoint=f"llm:{configuration.scrape_summary_model}",
+    )
+    print(
+        f"[scrape_webpages] {len(docs)} pages, {sum(len(doc.page_content) for doc in docs)} chars "
+        f"-> {sum(len(text) for _, text in pages)} chars"
+    )
+
+    if not pages:
+        return "No content left after removing boilerplate."
     return "\n\n".join(
         [
-            f'<Document name="{doc.metadata.get("title", "")}">\n{doc.page_content}\n</Document>'
-            for doc in docs
+            f'<Document name="{title}">\n{text}\n</Document>'
+            for title, text in pages
         ]
     )
 
-def search_node(state: AgentState, *, config: RunnableConfig) -> Command[Literal["supervisor"]]:
+async def search_node(state: AgentState, *, config: RunnableConfig) -> Command[Literal["supervisor"]]:
+    configuration = Configuration.from_runnable_config(config)
     query = state.messages[-1].content
-    search_results = tavily_tool.invoke(query)
+    search_results = await acall_with_retry(
+        lambda: get_tavily_tool().ainvoke(query), endpoint="tavily.search", hedge=True
+    )
 
+    # Large results are stored once in `payloads`; the message only carries a
+    # preview and the reference, and the responses below carry the reference.
+    content, payloads = offload_payload(
+        "Search result", search_results, configuration.max_inline_payload_chars
+    )
+    new_message = AIMessage(content=content, name="search")
     result = {
-        "result": search_results,
+        "result": next(iter(payloads), search_results),
         "status": "completed"
     }
     print("[Search Node] Returning Updated Data:")
     print(result)
-    new_message = AIMessage(content=f"Search result: {result['result']}", name="search")
-    updated_messages = state.messages + [new_message]
-   
-    task_history = state.task_history or []
-    task_history.append({
+
+    task_history = state.task_history + [{
         "task": "search_node",
-        "result": search_results,
+        "result": result["result"],
         "status": "completed"
-    })
+    }]
 
 
     return Command(
         update = {
             "search_response": result,
-            "messages": updated_messages,
+            "messages": [new_message],
             "task_history": task_history,
+            "payloads": payloads,
         },
         goto="supervisor",
     )
 
-def web_scraper_node(state: AgentState, *, config: RunnableConfig) -> Command[Literal["supervisor"]]:
-    configuration = Configuration.from_runnable_config(config)
-    llm = load_chat_model(configuration.llm_router_model)
+@cache
+def get_web_scraper_agent(model_name: str):
+    """Create the ReAct agent with the `scrape_webpages` tool once per model."""
+    return create_react_agent(get_chat_model(model_name), tools=[scrape_webpages])
 
-    # Create the ReAct agent with your `scrape_webpages` tool
-    web_scraper_agent = create_react_agent(llm, tools=[scrape_webpages])
+async def web_scraper_node(state: AgentState, *, config: RunnableConfig) -> Command[Literal["supervisor"]]:
+    configuration = Configuration.from_runnable_config(config)
+    web_scraper_agent = get_web_scraper_agent(configuration.llm_router_model)
 
     # Build the prompt that the ReAct agent will see
-    urls = [item["url"] for item in state.search_response["result"]]
+    search_results = resolve_payload(state.payloads, state.search_response["result"])
+    urls = [item["url"] for item in search_results]
     user_prompt = (
         f"Scrape the following URLs and return their combined text:\n{urls}\n\n"
         "Use the `scrape_webpages` tool to retrieve the content. Then summarize or return the raw content."
@@ -161,19 +190,19 @@ def web_scraper_node(state: AgentState, *, config: RunnableConfig) -> Command[Li
     }
 
     # Invoke the compiled agent graph with that input
-    result_state = web_scraper_agent.invoke(inputs)
+    # Passing the config lets streamed runs report the agent's steps and tokens.
+    result_state = await web_scraper_agent.ainvoke(inputs, config)
     final_message = result_state["messages"][-1]
     print("[Web Scraper Node] Final Message:")
     print(final_message)
 
     # Now store that text in your own conversation
     new_message = AIMessage(content="finished scraping", name="web_scraper")
-    updated_messages = state.messages + [new_message]
 
     # Return a proper Command with a dict in update
     return Command(
         update={
-            "messages": updated_messages,
+            "messages": [new_message],
             "web_scraper_response": final_message.content,
         },
         goto="supervisor",
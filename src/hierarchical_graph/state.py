@@ -4,11 +4,13 @@ from __future__ import annotations
 
 
 from dataclasses import dataclass, field
-from typing import Annotated, Literal, TypedDict, Optional
+from typing import Annotated, Any, Literal, TypedDict, Optional
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
 
+from src.shared.history import merge_payloads
+
 @dataclass(kw_only=True)
 class InputState:
     messages: Annotated[list[AnyMessage], add_messages]
@@ -25,6 +27,8 @@ class AgentState(InputState):
     web_scraper_response: list[dict] = field(default_factory=list)
     supervisor_response: Optional[str] = None
     task_history: list[dict] = field(default_factory=list)
+    # Large tool outputs, referenced from messages as "payload:<hash>".
+    payloads: Annotated[dict[str, Any], merge_payloads] = field(default_factory=dict)
 
 
 @dataclass(kw_only=True)
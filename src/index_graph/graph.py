@@ -1,8 +1,11 @@
 # src/index_graph.py
 from __future__ import annotations
+
+import asyncio
 from typing import Optional
 
 from langgraph.graph import StateGraph, START, END
+from langchain_core.documents import Document
 from langchain_core.runnables import RunnableConfig
 
 from src.index_graph.configuration import IndexConfiguration
@@ -11,6 +14,36 @@ from src.index_graph.state import IndexState
 from src.services.milvus_handler import MilvusHandler
 from src.services.embedding_handler import EmbeddingHandler
 
+def _index_documents(docs: list, configuration: IndexConfiguration) -> None:
+    """Embed ``docs`` and insert them into Milvus; blocking, so it runs in a worker thread."""
+    milvus_handler = MilvusHandler(
+        host=configuration.milvus_host,
+        port=configuration.milvus_port,
+        vector_storage=configuration.vector_storage,
+        tenant_partitioning=configuration.tenant_partitioning,
+        num_partitions=configuration.milvus_num_partitions,
+    )
+    milvus_handler.connect()
+    embedding_handler = EmbeddingHandler(model_name=configuration.embedding_model)
+    # The collection is sized by the embedding model, not by a fixed vector_dim.
+    milvus_handler.ensure_collection(
+        configuration.milvus_collection, vector_dim=embedding_handler.vector_dim
+    )
+    print(docs)
+      # Generate embeddings for documents
+    texts = [doc.page_content if isinstance(doc, Document) else doc for doc in docs]
+    metadata = [doc.metadata if isinstance(doc, Document) else {} for doc in docs]
+    embeddings = embedding_handler.embed(texts)
+    
+    milvus_handler.insert_data(
+        collection_name=configuration.milvus_collection,
+        embeddings=embeddings,
+        texts=texts,
+        metadata=metadata,
+        tenant=configuration.tenant,
+    )
+
+
 async def index_docs(
     state: IndexState, *, config: Optional[RunnableConfig] = None
 ) -> dict[str, str]:
@@ -21,17 +54,9 @@ async def index_docs(
     # Load configuration
     configuration = IndexConfiguration.from_runnable_config(config)
     print("Loaded configuration:", configuration)
-    milvus_handler = MilvusHandler(
-        host=configuration.milvus_host,
-        port=configuration.milvus_port
-    )
-    milvus_handler.connect()
-    embedding_handler = EmbeddingHandler(model_name=configuration.embedding_model)
-    print(state.docs)
-      # Generate embeddings for documents
-    embeddings = embedding_handler.generate_embeddings(state.docs)
-    
-    milvus_handler.insert_data(collection_name=configuration.milvus_collection, embeddings=embeddings)
+    # Embedding (local inference or OpenAI calls), Milvus calls and their retry
+    # backoff all block; keep them off the event loop serving other requests.
+    await asyncio.to_thread(_index_documents, state.docs, configuration)
     # Index embeddings in Milvus
     return {"docs": "no_docs_indexed"}
 
@@ -1,23 +1,69 @@
-from fastapi import FastAPI
-from dotenv import load_dotenv
+import asyncio
 import os
+import signal
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import FastAPI
 
 # Load environment variables before any other imports
 load_dotenv()
 
 from src.api.routes import router as api_router
 
-app = FastAPI(title="LangGraph API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the checkpointer and the job queue, and warm up the graphs.
+
+    APP_WARMUP: "background" compiles the graphs while the worker is already
+    serving, "blocking" finishes before accepting requests, "off" waits for
+    the first request to need them.
+    """
+    from src.api.dependencies import (
+        get_admission_controller,
+        get_index_graph,
+        shut_down,
+        warm_up,
+    )
+    from src.api.jobs import close_job_queue, open_job_queue
+    from src.shared.checkpointer import close_checkpointer, open_checkpointer
+    from src.shared.configuration import reload_configuration
+
+    # The checkpointer has to exist before any graph is compiled.
+    await open_checkpointer()
+    # Workers pick up queued jobs, including those interrupted by a restart.
+    await open_job_queue(get_index_graph, get_admission_controller())
+
+    # SIGHUP re-reads .env and the environment; runs resolve their configuration again.
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_configuration, ".env")
+
+    mode = os.getenv("APP_WARMUP", "background")
+    warmup_task = None
+    if mode == "blocking":
+        await asyncio.to_thread(warm_up)
+    elif mode == "background":
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    # Uvicorn only runs this after in-flight requests have finished (or the
+    # graceful shutdown timeout expired).
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    # Running jobs go back to the queue and resume from their last batch.
+    await close_job_queue()
+    await asyncio.to_thread(shut_down)
+    await close_checkpointer()
+
+
+app = FastAPI(title="LangGraph API", lifespan=lifespan)
 
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
 if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(
-        "src.main:app",
-        host=os.getenv("APP_HOST", "127.0.0.1"),
-        port=int(os.getenv("APP_PORT", 8000)),
-        reload=True,
-    )
\ No newline at end of file
+    # Development server with auto-reload; `python -m src.server --mode prod`
+    # (or APP_MODE=prod) runs the multi-worker production server.
+    from src.server import main
+
+    main()
@@ -6,6 +6,61 @@ from pymilvus import (
     utility,
 )
 
+from src.services.quantization import stored_bytes_per_vector
+
+DEFAULT_VECTOR_DIM = 1536
+
+# Milvus field type used for each vector storage mode (see src/services/quantization.py)
+VECTOR_DTYPES = {
+    "float32": DataType.FLOAT_VECTOR,
+    "float16": DataType.FLOAT16_VECTOR,
+    "bfloat16": DataType.BFLOAT16_VECTOR,
+    "int8": DataType.INT8_VECTOR,
+    "binary": DataType.BINARY_VECTOR,
+}
+
+# Index built on the embedding field for each storage mode. INT8_VECTOR only
+# supports HNSW; binary vectors are compared by Hamming distance.
+INDEX_PARAMS = {
+    "float32": {"index_type": "IVF_FLAT", "metric_type": "L2", "params": {"nlist": 128}},
+    "float16": {"index_type": "IVF_FLAT", "metric_type": "L2", "params": {"nlist": 128}},
+    "bfloat16": {"index_type": "IVF_FLAT", "metric_type": "L2", "params": {"nlist": 128}},
+    "int8": {"index_type": "HNSW", "metric_type": "L2", "params": {"M": 16, "efConstruction": 200}},
+    "binary": {"index_type": "BIN_IVF_FLAT", "metric_type": "HAMMING", "params": {"nlist": 128}},
+}
+
+# Binary collections keep int8 codes next to the sign bits so coarse hits can
+# be rescored. The field is memory-mapped, so it costs disk rather than RAM,
+# but it stores 8x more bytes per row than the sign bits themselves.
+RESCORE_FIELD = "embedding_rescore"
+
+# Collection property holding the scale of the int8 codes (int8 and binary
+# storage), calibrated from the first inserted batch.
+INT8_SCALE_PROPERTY = "int8_scale"
+
+# Document text, returned as an output field (see Configuration.vector_output_fields).
+TEXT_FIELD = "summary"
+TEXT_MAX_BYTES = 65535
+
+# Scalar metadata fields that searches can filter on, with the scalar index
+# built for each: BITMAP for low-cardinality values, INVERTED otherwise.
+# All are nullable, so documents without the metadata still insert.
+SCALAR_FIELDS = {
+    "source": {"dtype": DataType.VARCHAR, "max_length": 1024, "index_type": "INVERTED"},
+    "genre": {"dtype": DataType.VARCHAR, "max_length": 64, "index_type": "BITMAP"},
+    "year": {"dtype": DataType.INT64, "index_type": "INVERTED"},
+}
+
+# Tenant of each document. In "partition_key" mode Milvus hashes it into
+# ``num_partitions`` partitions and prunes searches filtered on it; in
+# "partitions" mode every tenant gets a named partition that can be loaded
+# and released on its own (see MilvusHandler).
+TENANT_FIELD = "tenant"
+TENANT_MAX_LENGTH = 256
+DEFAULT_TENANT = "default"
+TENANT_PARTITIONING = ("partition_key", "partitions")
+DEFAULT_NUM_PARTITIONS = 64
+
 # -- Field: Primary key (auto-generated ID)
 id_field = FieldSchema(
     name="id",
@@ -14,23 +69,87 @@ id_field = FieldSchema(
     auto_id=True,
 )
 
-# -- Field: Embedding (1536-dimensional float vector)
-embedding_field = FieldSchema(
-    name="embedding",
-    dtype=DataType.FLOAT_VECTOR,
-    dim=1536
-)
 
-# -- Combine fields into a schema
-schema = CollectionSchema(
-    fields=[id_field, embedding_field],
-    description="Storing only embeddings in Milvus"
-)
+def build_schema(
+    vector_dim: int = DEFAULT_VECTOR_DIM,
+    vector_storage: str = "float32",
+    tenant_partitioning: str = "partition_key",
+) -> CollectionSchema:
+    """Build the collection schema for embeddings of the given dimension and storage."""
+    if vector_storage not in VECTOR_DTYPES:
+        raise ValueError(f"Unsupported vector storage: {vector_storage}")
+    if tenant_partitioning not in TENANT_PARTITIONING:
+        raise ValueError(f"Unsupported tenant partitioning: {tenant_partitioning}")
+
+    # -- Field: Embedding, sized to the embedding model
+    embedding_field = FieldSchema(
+        name="embedding",
+        dtype=VECTOR_DTYPES[vector_storage],
+        dim=vector_dim
+    )
+    fields = [id_field, embedding_field]
+    fields.append(FieldSchema(name=TEXT_FIELD, dtype=DataType.VARCHAR, max_length=TEXT_MAX_BYTES, nullable=True))
+    for name, spec in SCALAR_FIELDS.items():
+        params = {key: value for key, value in spec.items() if key not in ("dtype", "index_type")}
+        fields.append(FieldSchema(name=name, dtype=spec["dtype"], nullable=True, **params))
+    fields.append(FieldSchema(
+        name=TENANT_FIELD,
+        dtype=DataType.VARCHAR,
+        max_length=TENANT_MAX_LENGTH,
+        is_partition_key=tenant_partitioning == "partition_key",
+    ))
+
+    if vector_storage == "binary":
+        fields.append(FieldSchema(
+            name=RESCORE_FIELD,
+            dtype=DataType.ARRAY,
+            element_type=DataType.INT8,
+            max_capacity=vector_dim,
+            mmap_enabled=True,
+        ))
+
+    # -- Combine fields into a schema
+    return CollectionSchema(
+        fields=fields,
+        description="Embeddings with document text and filterable metadata"
+    )
+
+
+schema = build_schema()
+
+
+def create_indexes(collection: Collection, vector_storage: str) -> None:
+    """Build the vector index and the scalar indexes used by filtered searches."""
+    collection.create_index("embedding", INDEX_PARAMS[vector_storage])
+    for name, spec in SCALAR_FIELDS.items():
+        collection.create_index(name, {"index_type": spec["index_type"]}, index_name=f"{name}_idx")
+
+
+def collection_kwargs(tenant_partitioning: str, num_partitions: int = DEFAULT_NUM_PARTITIONS) -> dict:
+    """Extra ``Collection(...)`` arguments for the tenant partitioning mode."""
+    if tenant_partitioning == "partition_key":
+        return {"num_partitions": num_partitions}
+    return {}
+
 
-def create_collection(collection_name: str) -> Collection:
+def create_collection(
+    collection_name: str,
+    vector_dim: int = DEFAULT_VECTOR_DIM,
+    vector_storage: str = "float32",
+    tenant_partitioning: str = "partition_key",
+    num_partitions: int = DEFAULT_NUM_PARTITIONS,
+) -> Collection:
     """Create a collection in Milvus."""
     if utility.has_collection(collection_name):
         utility.drop_collection(collection_name)
-    collection = Collection(name=collection_name, schema=schema)
-    print(f"Collection '{collection_name}' created.")
-    return collection
\ No newline at end of file
+    collection = Collection(
+        name=collection_name,
+        schema=build_schema(vector_dim, vector_storage, tenant_partitioning),
+        **collection_kwargs(tenant_partitioning, num_partitions),
+    )
+    create_indexes(collection, vector_storage)
+    print(
+        f"Collection '{collection_name}' created "
+        f"({vector_storage}, {stored_bytes_per_vector(vector_dim, vector_storage)} bytes per vector)."
+    )
+    return collection
@@ -0,0 +1,405 @@
+"""Bulk-load a document corpus into Milvus.
+
+Reads JSON (a list of documents), JSONL and Parquet files, embeds batches on
+a worker pool and writes them to Milvus in order. Progress is checkpointed
+after every written batch, so an interrupted load resumes where it stopped
+when run again with the same arguments.
+
+Delivery is at least once: a load interrupted after a batch was written but
+before the checkpoint was saved writes that batch again on resume, and row
+inserts get new auto IDs, so up to one batch may be duplicated. Delete the
+extra rows, or reload with ``--recreate``, when duplicates matter.
+
+Usage:
+    python -m src.scripts.bulk_index [FILES ...] [--collection NAME] [--batch-size 256]
+        [--workers 4] [--checkpoint PATH] [--bulk-dir DIR] [--recreate] [--tenant NAME]
+
+Without FILES the configured ``IndexConfiguration.docs_file`` is loaded. With
+``--bulk-dir`` batches are written as Parquet bulk-insert files (requires
+``pymilvus[bulk_writer]``) instead of row inserts; upload them to the Milvus
+bucket and import them with ``utility.do_bulk_insert``.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.models.index_schema import SCALAR_FIELDS
+
+DEFAULT_TEXT_FIELDS = ("page_content", "text", "content")
+
+
+def _document(record: Any, text_field: Optional[str]) -> Document:
+    if isinstance(record, str):
+        return Document(page_content=record)
+    fields = (text_field,) if text_field else DEFAULT_TEXT_FIELDS
+    for name in fields:
+        if record.get(name):
+            # Filterable metadata may sit under "metadata" or at the top level.
+            metadata = {
+                key: record[key] for key in SCALAR_FIELDS if record.get(key) is not None
+            }
+            metadata.update(record.get("metadata") or {})
+            return Document(page_content=str(record[name]), metadata=metadata)
+    raise ValueError(f"Record has no text in {', '.join(fields)}: {str(record)[:200]}")
+
+
+def iter_documents(path: str, text_field: Optional[str] = None) -> Iterator[Document]:
+    """Yield documents, with their metadata, from a .json, .jsonl or .parquet file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            yield _document(record, text_field)
+    elif extension in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _document(json.loads(line), text_field)
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        names = parquet.schema_arrow.names
+        column = text_field or next(
+            (name for name in DEFAULT_TEXT_FIELDS if name in names), None
+        )
+        if column is None:
+            raise ValueError(f"{path} has no text column; pass --text-field.")
+        columns = [column] + [name for name in SCALAR_FIELDS if name in names]
+        for batch in parquet.iter_batches(columns=columns):
+            for record in batch.to_pylist():
+                if record.get(column):
+                    yield _document(record, column)
+    else:
+        raise ValueError(f"Unsupported file type: {path}")
+
+
+def iter_batches(docs: Iterable[Document], batch_size: int) -> Iterator[List[Document]]:
+    """Yield lists of at most ``batch_size`` documents."""
+    iterator = iter(docs)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+@dataclass
+class Progress:
+    """Load progress persisted between runs; ``key`` identifies the inputs."""
+
+    key: str
+    batches: int = 0
+    documents: int = 0
+
+    @classmethod
+    def load(cls, path: Optional[str], key: str) -> "Progress":
+        """Load saved progress for ``key``, or start from scratch."""
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("key") == key:
+                return cls(**saved)
+            print(f"Ignoring checkpoint {path}: it belongs to a different load.")  # noqa: T201
+        return cls(key=key)
+
+    def save(self, path: Optional[str]) -> None:
+        """Atomically write the progress to ``path``, if set."""
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.__dict__, f)
+        os.replace(tmp, path)
+
+
+@dataclass
+class LoadStats:
+    """Counters and timings of one bulk load."""
+
+    documents: int = 0
+    vectors: int = 0
+    batches: int = 0
+    embed_seconds: float = 0.0
+    write_seconds: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+
+    def report(self) -> str:
+        """Return a one-line throughput summary."""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (
+            f"{self.documents} docs in {elapsed:.1f}s: {self.documents / elapsed:.1f} docs/s, "
+            f"{self.vectors / max(self.write_seconds, 1e-9):.1f} vectors/s written "
+            f"(embed {self.embed_seconds:.1f}s across workers, write {self.write_seconds:.1f}s)"
+        )
+
+
+def load_key(paths: Sequence[str], collection: str, batch_size: int) -> str:
+    """Identify a load by its inputs and batch size, so a checkpoint is only reused for the same load."""
+    parts = [collection, str(batch_size)]
+    for path in paths:
+        stat = os.stat(path)
+        parts += [os.path.abspath(path), str(stat.st_size), str(int(stat.st_mtime))]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def bulk_load(
+    docs: Iterable[Document],
+    embed: Callable[[List[str]], np.ndarray],
+    write: Callable[[List[Document], np.ndarray], None],
+    *,
+    batch_size: int = 256,
+    workers: int = 4,
+    progress: Optional[Progress] = None,
+    checkpoint: Optional[str] = None,
+) -> LoadStats:
+    """Embed ``docs`` in batches on a thread pool and write them in order.
+
+    At most ``2 * workers`` batches are in flight, so memory stays bounded for
+    corpora of any size. Batches already recorded in ``progress`` are skipped.
+    """
+    progress = progress or Progress(key="")
+    stats = LoadStats()
+    batches = iter_batches(docs, batch_size)
+    for _ in islice(batches, progress.batches):
+        pass
+
+    def timed_embed(batch: List[Document]) -> tuple[np.ndarray, float]:
+        started = time.perf_counter()
+        return embed([doc.page_content for doc in batch]), time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+        pending: deque = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(timed_embed, batch)))
+            if len(pending) >= 2 * workers:
+                _write_next(pending, write, stats, progress, checkpoint)
+        while pending:
+            _write_next(pending, write, stats, progress, checkpoint)
+    return stats
+
+
+def _write_next(
+    pending: deque,
+    write,
+    stats: LoadStats,
+    progress: Progress,
+    checkpoint: Optional[str],
+) -> None:
+    batch, future = pending.popleft()
+    vectors, embed_seconds = future.result()
+    started = time.perf_counter()
+    write(batch, vectors)
+    stats.write_seconds += time.perf_counter() - started
+    stats.embed_seconds += embed_seconds
+    stats.documents += len(batch)
+    stats.vectors += len(vectors)
+    stats.batches += 1
+    progress.batches += 1
+    progress.documents += len(batch)
+    progress.save(checkpoint)
+    print(f"[batch {progress.batches}] {stats.report()}")  # noqa: T201
+
+
+def bulk_file_writer(
+    directory: str,
+    vector_dim: int,
+    vector_storage: str,
+    tenant_partitioning: str = "partition_key",
+    tenant: Optional[str] = None,
+    int8_scale: Optional[float] = None,
+) -> Callable[[List[Document], np.ndarray], None]:
+    """Writer producing Milvus bulk-insert Parquet files, one set per batch.
+
+    In "partitions" tenancy import the files into the tenant's partition
+    (``tenant_partition_name``). For int8 and binary storage the int8 scale
+    is calibrated from the first batch unless given, and written to
+    ``collection_properties.json``: set those properties on the collection
+    the files are imported into.
+    """
+    from pymilvus.bulk_writer import BulkFileType, LocalBulkWriter
+
+    from src.models.index_schema import (
+        DEFAULT_TENANT,
+        INT8_SCALE_PROPERTY,
+        RESCORE_FIELD,
+        TENANT_FIELD,
+        build_schema,
+    )
+    from src.services.milvus_handler import document_fields
+    from src.services.quantization import (
+        calibrate_int8_scale,
+        encode_for_storage,
+        quantize_int8,
+    )
+
+    schema = build_schema(vector_dim, vector_storage, tenant_partitioning)
+
+    def calibrated_scale(vectors: np.ndarray) -> float:
+        nonlocal int8_scale
+        if int8_scale is None:
+            int8_scale = calibrate_int8_scale(vectors)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, "collection_properties.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({INT8_SCALE_PROPERTY: str(int8_scale)}, f)
+            print(  # noqa: T201
+                f"Calibrated int8 scale {int8_scale:.1f}; set the properties in {path} on the collection."
+            )
+        return int8_scale
+
+    def write(docs: List[Document], vectors: np.ndarray) -> None:
+        writer = LocalBulkWriter(
+            schema=schema, local_path=directory, file_type=BulkFileType.PARQUET
+        )
+        codes = None
+        if vector_storage in ("int8", "binary"):
+            encoded = encode_for_storage(
+                vectors, vector_storage, calibrated_scale(vectors)
+            )
+            if vector_storage == "binary":
+                codes = quantize_int8(vectors, int8_scale)
+        else:
+            encoded = encode_for_storage(vectors, vector_storage)
+        for i, doc in enumerate(docs):
+            row = {
+                "embedding": encoded[i],
+                **document_fields(doc.page_content, doc.metadata),
+            }
+            row[TENANT_FIELD] = tenant or DEFAULT_TENANT
+            if codes is not None:
+                row[RESCORE_FIELD] = codes[i].tolist()
+            writer.append_row(row)
+        writer.commit()
+        for files in writer.batch_files:
+            print(f"Wrote bulk-insert files: {files}")  # noqa: T201
+
+    return write
+
+
+def main() -> int:
+    """Run the bulk loader from the command line."""
+    from src.index_graph.configuration import IndexConfiguration
+
+    defaults = IndexConfiguration()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", default=[defaults.docs_file])
+    parser.add_argument("--collection", default=defaults.milvus_collection)
+    parser.add_argument("--embedding-model", default=defaults.embedding_model)
+    parser.add_argument("--vector-storage", default=defaults.vector_storage)
+    parser.add_argument(
+        "--text-field",
+        default=None,
+        help="Field holding the text (default: page_content/text/content).",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=int(os.getenv("BULK_INDEX_BATCH_SIZE", 256))
+    )
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("BULK_INDEX_WORKERS", 4))
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Progress file (default: .bulk_index.<collection>.json).",
+    )
+    parser.add_argument(
+        "--bulk-dir",
+        default=None,
+        help="Write bulk-insert files here instead of inserting rows.",
+    )
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="Drop and recreate the collection first.",
+    )
+    parser.add_argument(
+        "--tenant", default=defaults.tenant, help="Tenant the documents belong to."
+    )
+    parser.add_argument(
+        "--tenant-partitioning",
+        default=defaults.tenant_partitioning,
+        choices=["partition_key", "partitions"],
+        help="Tenancy of a newly created collection.",
+    )
+    args = parser.parse_args()
+
+    from src.services.embedding_handler import EmbeddingHandler
+    from src.services.milvus_handler import MilvusHandler
+
+    checkpoint = args.checkpoint or f".bulk_index.{args.collection}.json"
+    embedding_handler = EmbeddingHandler(model_name=args.embedding_model)
+
+    if args.bulk_dir:
+        write = bulk_file_writer(
+            args.bulk_dir,
+            embedding_handler.vector_dim,
+            args.vector_storage,
+            args.tenant_partitioning,
+            args.tenant,
+        )
+    else:
+        milvus_handler = MilvusHandler(
+            host=defaults.milvus_host,
+            port=defaults.milvus_port,
+            vector_storage=args.vector_storage,
+            tenant_partitioning=args.tenant_partitioning,
+            num_partitions=defaults.milvus_num_partitions,
+        )
+        milvus_handler.connect()
+        if args.recreate:
+            milvus_handler.drop_collection(args.collection)
+            milvus_handler.create_collection(
+                args.collection, vector_dim=embedding_handler.vector_dim
+            )
+            if os.path.exists(checkpoint):
+                os.remove(checkpoint)
+        else:
+            milvus_handler.ensure_collection(
+                args.collection, vector_dim=embedding_handler.vector_dim
+            )
+
+        def write(docs: List[Document], vectors: np.ndarray) -> None:
+            milvus_handler.insert_data(
+                collection_name=args.collection,
+                embeddings=vectors,
+                texts=[doc.page_content for doc in docs],
+                metadata=[doc.metadata for doc in docs],
+                tenant=args.tenant,
+            )
+
+    progress = Progress.load(
+        checkpoint,
+        load_key(args.files, f"{args.collection}:{args.tenant}", args.batch_size),
+    )
+    if progress.batches:
+        print(  # noqa: T201
+            f"Resuming after {progress.documents} documents ({progress.batches} batches). "
+            "The next batch may already be in the collection if the last run stopped while writing it."
+        )
+
+    docs = (doc for path in args.files for doc in iter_documents(path, args.text_field))
+    stats = bulk_load(
+        docs,
+        embedding_handler.generate_embeddings,
+        write,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        progress=progress,
+        checkpoint=checkpoint,
+    )
+    print(f"Done: {stats.report()}")  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,61 @@
+"""Create the Milvus collection described by the index configuration.
+
+The collection is sized to the embedding model and uses the configured
+vector storage. An existing collection is checked and kept unless
+``--recreate`` is given.
+
+Usage:
+    python -m src.scripts.create_milvus_collection [--collection NAME] [--recreate]
+        [--tenant-partitioning partition_key|partitions] [--num-partitions 64]
+"""
+
+import argparse
+
+
+def main() -> int:
+    """Create the collection from the command line."""
+    from src.index_graph.configuration import IndexConfiguration
+    from src.services.embedding_handler import EmbeddingHandler
+    from src.services.milvus_handler import MilvusHandler
+
+    defaults = IndexConfiguration()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collection", default=defaults.milvus_collection)
+    parser.add_argument("--embedding-model", default=defaults.embedding_model)
+    parser.add_argument("--vector-storage", default=defaults.vector_storage)
+    parser.add_argument(
+        "--tenant-partitioning",
+        default=defaults.tenant_partitioning,
+        choices=["partition_key", "partitions"],
+    )
+    parser.add_argument(
+        "--num-partitions", type=int, default=defaults.milvus_num_partitions
+    )
+    parser.add_argument(
+        "--recreate", action="store_true", help="Drop the collection if it exists."
+    )
+    args = parser.parse_args()
+
+    vector_dim = EmbeddingHandler(model_name=args.embedding_model).vector_dim
+    milvus_handler = MilvusHandler(
+        host=defaults.milvus_host,
+        port=defaults.milvus_port,
+        vector_storage=args.vector_storage,
+        tenant_partitioning=args.tenant_partitioning,
+        num_partitions=args.num_partitions,
+    )
+    milvus_handler.connect()
+    try:
+        if args.recreate:
+            milvus_handler.drop_collection(args.collection)
+            milvus_handler.create_collection(args.collection, vector_dim=vector_dim)
+        else:
+            milvus_handler.ensure_collection(args.collection, vector_dim=vector_dim)
+            print(f"Collection '{args.collection}' is ready.")  # noqa: T201
+    finally:
+        milvus_handler.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
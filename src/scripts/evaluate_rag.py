@@ -0,0 +1,112 @@
+"""Evaluate the RAG self-reflection graph offline over a parameter grid.
+
+Runs the fixture question set (default: src/evaluation/data/movies.json)
+through the graph with local stand-ins for the LLM, embeddings and Milvus,
+once per combination of the grid, and prints recall@k, MRR, grader
+agreement, self-reflection iterations, latency and cost per configuration.
+
+Usage:
+    python -m src.scripts.evaluate_rag [--grid top_k=1,3,5] [--grid nprobe=1,4]
+        [--grid chunk_size=0,200] [--set retrieval_mode=multi_query]
+        [--fixture PATH] [--output results.json]
+
+Grid and fixed values are parsed as JSON when possible, so numbers stay numbers.
+"""
+
+import argparse
+import asyncio
+import json
+from typing import Any
+
+
+def _value(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def _assignment(text: str) -> tuple[str, str]:
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got {text!r}.")
+    return name.strip(), value
+
+
+COLUMNS = [
+    ("recall_at_k", "recall@k", "{:.3f}"),
+    ("mrr", "MRR", "{:.3f}"),
+    ("grader_kappa", "grader κ", "{:.2f}"),
+    ("mean_retrievals", "retrievals", "{:.2f}"),
+    ("completion_rate", "completed", "{:.0%}"),
+    ("modeled_seconds", "latency s", "{:.2f}"),
+    ("tokens_per_question", "tokens/q", "{:.0f}"),
+    ("cost_per_question", "$/q", "{:.5f}"),
+]
+
+
+def format_table(reports) -> str:
+    """Return the summaries of ``reports`` as a text table."""
+    rows = [["settings"] + [title for _, title, _ in COLUMNS]]
+    for report in reports:
+        summary = report.summary()
+        settings = (
+            " ".join(f"{k}={v}" for k, v in report.settings.items()) or "(defaults)"
+        )
+        rows.append([settings] + [fmt.format(summary[key]) for key, _, fmt in COLUMNS])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows
+    )
+
+
+def main() -> int:
+    """Run the evaluation sweep from the command line."""
+    from src.evaluation.harness import DEFAULT_FIXTURE, load_fixture, sweep
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--grid",
+        type=_assignment,
+        action="append",
+        default=[],
+        help="NAME=V1,V2,... values to sweep; repeat for a cartesian grid.",
+    )
+    parser.add_argument(
+        "--set",
+        type=_assignment,
+        action="append",
+        default=[],
+        dest="fixed",
+        help="NAME=VALUE applied to every run.",
+    )
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=25,
+        help="Graph steps before a question counts as unfinished.",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write every report, with per-question results, as JSON.",
+    )
+    args = parser.parse_args()
+
+    grid = {name: [_value(v) for v in values.split(",")] for name, values in args.grid}
+    base = {name: _value(value) for name, value in args.fixed}
+    docs, cases = load_fixture(args.fixture)
+    reports = asyncio.run(sweep(grid, docs, cases, base=base, max_steps=args.max_steps))
+
+    print(f"{len(cases)} questions, {len(docs)} documents")  # noqa: T201
+    print(format_table(reports))  # noqa: T201
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([report.to_dict() for report in reports], f, indent=2)
+        print(f"Wrote {args.output}")  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
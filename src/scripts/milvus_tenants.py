@@ -0,0 +1,42 @@
+"""Load or release tenants of a Milvus collection.
+
+Collections created with "partitions" tenancy keep every tenant in its own
+partition. Loading the partitions of hot tenants ahead of traffic saves the
+first searches the load; releasing cold ones frees query-node memory. A
+released tenant is loaded again by its next search.
+
+Usage:
+    python -m src.scripts.milvus_tenants {load,release} TENANT [TENANT ...] [--collection NAME]
+"""
+
+import argparse
+
+
+def main() -> int:
+    """Manage tenant partitions from the command line."""
+    from src.services.milvus_handler import MilvusHandler
+    from src.shared.configuration import BaseConfiguration
+
+    defaults = BaseConfiguration()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("action", choices=["load", "release"])
+    parser.add_argument("tenants", nargs="+")
+    parser.add_argument("--collection", default=defaults.milvus_collection)
+    args = parser.parse_args()
+
+    milvus_handler = MilvusHandler(host=defaults.milvus_host, port=defaults.milvus_port)
+    milvus_handler.connect()
+    try:
+        if args.action == "load":
+            partitions = milvus_handler.load_tenants(args.collection, args.tenants)
+        else:
+            partitions = milvus_handler.release_tenants(args.collection, args.tenants)
+    finally:
+        milvus_handler.disconnect()
+    if not partitions:
+        print("No tenant partitions matched.")  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+"""Measure the cold-start import time of the API application.
+
+Runs ``python -X importtime`` in a fresh interpreter and prints the slowest
+modules by cumulative import time.
+
+Usage:
+    python -m src.scripts.profile_imports [--module src.main] [--top 25] [--budget 1.0]
+
+With ``--budget`` (seconds) the script exits non-zero when the import is
+slower, so it can guard cold-start time in CI.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def profile_imports(module: str) -> list[tuple[int, int, int, str]]:
+    """Import ``module`` in a fresh interpreter and parse the importtime report.
+
+    Returns:
+        list[tuple[int, int, int, str]]: (self_us, cumulative_us, depth, module) rows.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append(
+                (int(self_us), int(cumulative_us), (len(indent) - 1) // 2, name)
+            )
+    return rows
+
+
+def main() -> int:
+    """Report the slowest imports from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument(
+        "--budget", type=float, default=None, help="Fail above this many seconds."
+    )
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total = next(
+        cumulative
+        for _, cumulative, depth, name in rows
+        if name == args.module and depth == 0
+    )
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")  # noqa: T201
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda r: -r[1])[
+        : args.top
+    ]:
+        print(  # noqa: T201
+            f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {'  ' * depth}{name}"
+        )
+    print(f"\nimport {args.module}: {total / 1e6:.3f}s")  # noqa: T201
+
+    if args.budget is not None and total / 1e6 > args.budget:
+        print(f"Import time exceeds the {args.budget:.3f}s budget.")  # noqa: T201
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
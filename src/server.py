@@ -0,0 +1,175 @@
+"""Launch the API in development or production mode.
+
+Development (the default) runs a single uvicorn process with auto-reload.
+Production runs several worker processes, under gunicorn when it is installed
+(``pip install .[server]``) and under uvicorn's own process manager otherwise.
+uvloop and httptools are used whenever they are available.
+
+Usage:
+    python -m src.server [--mode dev|prod] [--workers N]
+
+Every option can also be set with the environment variables read by
+``ServerSettings.from_env``.
+"""
+
+import argparse
+import importlib.util
+import os
+from dataclasses import dataclass, replace
+from typing import Optional
+
+APP = "src.main:app"
+
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+
+@dataclass
+class ServerSettings:
+    """Process and connection settings for the API server."""
+
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    # Seconds an idle keep-alive connection stays open.
+    keep_alive: int = 5
+    # Concurrent connections per worker before new ones get a 503.
+    limit_concurrency: Optional[int] = None
+    backlog: int = 2048
+    # Recycle a worker after this many requests (0 disables), with jitter so
+    # workers do not all restart at once.
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    # Seconds in-flight requests get to finish on shutdown before workers are killed.
+    graceful_timeout: int = 30
+    timeout: int = 120
+
+    @classmethod
+    def from_env(cls) -> "ServerSettings":
+        """Read the settings from ``APP_*`` environment variables."""
+        return cls(
+            host=os.getenv("APP_HOST", "127.0.0.1"),
+            port=int(os.getenv("APP_PORT", 8000)),
+            workers=int(os.getenv("APP_WORKERS", os.cpu_count() or 1)),
+            keep_alive=int(os.getenv("APP_KEEP_ALIVE", 5)),
+            limit_concurrency=_optional_int(os.getenv("APP_LIMIT_CONCURRENCY")),
+            backlog=int(os.getenv("APP_BACKLOG", 2048)),
+            max_requests=int(os.getenv("APP_MAX_REQUESTS", 0)),
+            max_requests_jitter=int(os.getenv("APP_MAX_REQUESTS_JITTER", 0)),
+            graceful_timeout=int(os.getenv("APP_GRACEFUL_TIMEOUT", 30)),
+            timeout=int(os.getenv("APP_WORKER_TIMEOUT", 120)),
+        )
+
+
+def event_loop() -> str:
+    """Return the fastest event loop that is installed."""
+    return "uvloop" if _has_module("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    """Return the fastest HTTP protocol implementation that is installed."""
+    return "httptools" if _has_module("httptools") else "h11"
+
+
+def run_dev(settings: ServerSettings) -> None:
+    """Single process with auto-reload, for local development."""
+    import uvicorn
+
+    uvicorn.run(APP, host=settings.host, port=settings.port, reload=True)
+
+
+def run_prod(settings: ServerSettings) -> None:
+    """Multiple worker processes without the file watcher."""
+    # Each worker compiles the graphs and connects to Milvus before it accepts traffic.
+    os.environ.setdefault("APP_WARMUP", "blocking")
+    # Gunicorn workers rebuild their settings from the environment.
+    if settings.limit_concurrency:
+        os.environ["APP_LIMIT_CONCURRENCY"] = str(settings.limit_concurrency)
+    os.environ["APP_GRACEFUL_TIMEOUT"] = str(settings.graceful_timeout)
+
+    if _has_module("gunicorn"):
+        _run_gunicorn(settings)
+        return
+
+    import uvicorn
+
+    uvicorn.run(
+        APP,
+        host=settings.host,
+        port=settings.port,
+        workers=settings.workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        timeout_keep_alive=settings.keep_alive,
+        limit_concurrency=settings.limit_concurrency,
+        limit_max_requests=settings.max_requests or None,
+        backlog=settings.backlog,
+        timeout_graceful_shutdown=settings.graceful_timeout,
+        reload=False,
+    )
+
+
+def _run_gunicorn(settings: ServerSettings) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        "bind": f"{settings.host}:{settings.port}",
+        "workers": settings.workers,
+        "worker_class": "src.server_worker.ApiWorker",
+        "keepalive": settings.keep_alive,
+        "backlog": settings.backlog,
+        "max_requests": settings.max_requests,
+        "max_requests_jitter": settings.max_requests_jitter,
+        "graceful_timeout": settings.graceful_timeout,
+        "timeout": settings.timeout,
+        # Workers load the app after fork, so each gets its own event loop and
+        # Milvus connection.
+        "preload_app": False,
+    }
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from src.main import app
+
+            return app
+
+    print(  # noqa: T201
+        f"Starting {settings.workers} gunicorn workers ({event_loop()}, {http_protocol()})"
+    )
+    Application().run()
+
+
+def main() -> None:
+    """Serve the API with the settings from the environment."""
+    from dotenv import load_dotenv
+
+    # Settings are read before the app (which loads .env itself) is imported.
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run the LangGraph API server.")
+    parser.add_argument(
+        "--mode", choices=["dev", "prod"], default=os.getenv("APP_MODE", "dev")
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = ServerSettings.from_env()
+    if args.workers:
+        settings = replace(settings, workers=args.workers)
+
+    if args.mode == "prod":
+        run_prod(settings)
+    else:
+        run_dev(settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""Gunicorn worker class for the API (see src/server.py)."""
+
+try:
+    from uvicorn_worker import UvicornWorker
+except ImportError:  # uvicorn.workers is deprecated in favour of uvicorn-worker
+    from uvicorn.workers import UvicornWorker
+
+from src.server import ServerSettings, event_loop, http_protocol
+
+_settings = ServerSettings.from_env()
+
+
+class ApiWorker(UvicornWorker):
+    """Uvicorn worker with the concurrency limit and drain timeout from ServerSettings."""
+
+    CONFIG_KWARGS = {
+        "loop": event_loop(),
+        "http": http_protocol(),
+        "limit_concurrency": _settings.limit_concurrency,
+        "timeout_graceful_shutdown": _settings.graceful_timeout,
+    }
@@ -1,21 +1,182 @@
-from openai import OpenAI
-from typing import List
+import binascii
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.services.resilience import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+# Known output sizes for the hosted models; local models report their own.
+OPENAI_EMBEDDING_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+LOCAL_PREFIX = "local/"
+
+# Sentence-transformers models are expensive to load, so each one is loaded
+# at most once per process and shared by every EmbeddingHandler instance.
+_local_models: Dict[str, Any] = {}
+_local_models_lock = threading.Lock()
+
+
+def _default_num_threads() -> int:
+    return int(os.getenv("EMBEDDING_NUM_THREADS", min(4, os.cpu_count() or 1)))
+
+
+def _load_local_model(model: str, num_threads: int) -> Any:
+    """Load a sentence-transformers model on CPU, caching it for the process."""
+    if model in _local_models:
+        return _local_models[model]
+    with _local_models_lock:
+        if model not in _local_models:
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            # Cap intra-op parallelism so the encoder does not compete with
+            # the API event loop and other workers for every core.
+            torch.set_num_threads(num_threads)
+            _local_models[model] = SentenceTransformer(model, device="cpu")
+            logger.info(
+                "Loaded local embedding model '%s' (%d threads)", model, num_threads
+            )
+    return _local_models[model]
+
+
+@dataclass(frozen=True)
+class EmbeddingBatch:
+    """Embeddings of a batch of texts: one C-contiguous (n, dim) float32 matrix, row i for text i.
+
+    ``np.asarray(batch)`` returns the matrix itself, so batches can be passed
+    wherever vectors are expected (e.g. ``MilvusHandler.insert_data``)
+    without a copy.
+    """
+    vectors: np.ndarray
+    model: str
+
+    def __post_init__(self):
+        """Check that the vectors are a C-contiguous 2-D float32 matrix."""
+        if self.vectors.dtype != np.float32 or self.vectors.ndim != 2 or not self.vectors.flags.c_contiguous:
+            raise ValueError("EmbeddingBatch vectors must be a C-contiguous 2-D float32 matrix.")
+
+    def __len__(self) -> int:
+        """Return the number of vectors."""
+        return len(self.vectors)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """Return the vectors as a NumPy array."""
+        return np.array(self.vectors, dtype=dtype, copy=copy)
+
+    @property
+    def dim(self) -> int:
+        """Dimension of the vectors."""
+        return self.vectors.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the vectors in bytes."""
+        return self.vectors.nbytes
+
+
+def decode_base64_embeddings(items: Sequence[Any], out: np.ndarray, offset: int = 0) -> None:
+    """Decode base64 embeddings of an OpenAI response into rows of ``out``.
+
+    Each item's little-endian float32 bytes are viewed in place and copied
+    once, into row ``offset + item.index``; no Python floats are created.
+    """
+    for item in items:
+        vector = np.frombuffer(binascii.a2b_base64(item.embedding), dtype="<f4")
+        if vector.shape[0] != out.shape[1]:
+            raise ValueError(f"Expected {out.shape[1]}-dimensional embeddings, got {vector.shape[0]}.")
+        out[offset + item.index] = vector
+
 
 class EmbeddingHandler:
-    def __init__(self, model_name: str):
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: Optional[int] = None,
+        num_threads: Optional[int] = None,
+    ):
         self.model_name = model_name
-        self.openai_client = OpenAI()
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+        self.num_threads = num_threads or _default_num_threads()
+        self._openai_client = None
+
+    @property
+    def is_local(self) -> bool:
+        """Whether the model is computed locally rather than through an API."""
+        return self.model_name.startswith(LOCAL_PREFIX)
 
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts using the selected model."""
-        if self.model_name == "openai/text-embedding-3-small":
-            return [self._emb_text_openai(text) for text in texts]
+    @property
+    def openai_client(self):
+        """OpenAI client, created on first use."""
+        if self._openai_client is None:
+            from openai import OpenAI
+
+            # Retries are handled by call_with_retry, not by the SDK.
+            self._openai_client = OpenAI(max_retries=0)
+        return self._openai_client
+
+    @property
+    def vector_dim(self) -> int:
+        """Dimension of the vectors produced by the selected model."""
+        if self.is_local:
+            return self._local_model().get_sentence_embedding_dimension()
+        provider, _, model = self.model_name.partition("/")
+        if provider == "openai" and model in OPENAI_EMBEDDING_DIMS:
+            return OPENAI_EMBEDDING_DIMS[model]
+        raise ValueError(f"Unsupported embedding model: {self.model_name}")
+
+    def embed(self, texts: List[str]) -> EmbeddingBatch:
+        """Generate embeddings for a list of texts as an ``EmbeddingBatch``."""
+        if self.is_local:
+            vectors = self._emb_texts_local(texts)
+        elif self.model_name == "openai/text-embedding-3-small":
+            vectors = self._emb_texts_openai(texts)
         else:
             raise ValueError(f"Unsupported embedding model: {self.model_name}")
+        return EmbeddingBatch(vectors=np.ascontiguousarray(vectors), model=self.model_name)
+
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for a list of texts as a (len(texts), dim) float32 matrix."""
+        return self.embed(texts).vectors
 
-    def _emb_text_openai(self, text: str) -> List[float]:
-        """Generate an embedding using OpenAI's API."""
-        response = self.openai_client.embeddings.create(
-            input=text, model="text-embedding-3-small"
+    def _local_model(self) -> Any:
+        return _load_local_model(self.model_name[len(LOCAL_PREFIX):], self.num_threads)
+
+    def _emb_texts_local(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings on CPU with a local sentence-transformers model."""
+        vectors = self._local_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
         )
-        return response.data[0].embedding
\ No newline at end of file
+        return vectors.astype(np.float32, copy=False)
+
+    def _emb_texts_openai(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings with OpenAI's API, ``batch_size`` texts per request.
+
+        Embeddings are requested base64-encoded and decoded straight into a
+        preallocated float32 matrix.
+        """
+        out = np.empty((len(texts), self.vector_dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            response = call_with_retry(
+                lambda: self.openai_client.embeddings.create(
+                    input=batch, model="text-embedding-3-small", encoding_format="base64"
+                ),
+                endpoint="openai.embeddings",
+                hedge=True,
+            )
+            decode_base64_embeddings(response.data, out, offset=start)
+        return out
@@ -0,0 +1,92 @@
+"""In-process metrics registry.
+
+Counters, gauges and timing summaries keyed by name and labels. The API
+exposes a snapshot at ``GET /api/metrics``; each worker process reports its
+own numbers.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+@dataclass
+class Summary:
+    """Running count/total/max of observed durations, in seconds."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return the count, total, mean and max."""
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "total": self.total, "mean": mean, "max": self.max}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_key(key: MetricKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe counters, gauges and summaries keyed by name and labels."""
+
+    def __init__(self):
+        """Start with no metrics."""
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._summaries: Dict[MetricKey, Summary] = {}
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add ``value`` to a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Record the current value of a gauge."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """Add a duration to a timing summary."""
+        key = _key(name, labels)
+        with self._lock:
+            self._summaries.setdefault(key, Summary()).observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return every metric as plain JSON-serializable data."""
+        with self._lock:
+            return {
+                "counters": {_format_key(k): v for k, v in self._counters.items()},
+                "gauges": {_format_key(k): v for k, v in self._gauges.items()},
+                "timings": {
+                    _format_key(k): s.as_dict() for k, s in self._summaries.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Drop every metric."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+metrics = Metrics()
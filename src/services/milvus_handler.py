@@ -1,69 +1,499 @@
+import json
+import logging
+import re
+import zlib
+from dataclasses import dataclass, field
 from random import random
-from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType
-from typing import List
+from pymilvus import connections, Collection, DataType, utility
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from src.models.index_schema import (
+    DEFAULT_NUM_PARTITIONS,
+    DEFAULT_TENANT,
+    INDEX_PARAMS,
+    INT8_SCALE_PROPERTY,
+    RESCORE_FIELD,
+    SCALAR_FIELDS,
+    TENANT_FIELD,
+    TENANT_MAX_LENGTH,
+    TEXT_FIELD,
+    TEXT_MAX_BYTES,
+    VECTOR_DTYPES,
+    build_schema,
+    collection_kwargs,
+    create_indexes,
+)
+from src.services.quantization import (
+    INT8_SCALE,
+    as_float32_matrix,
+    calibrate_int8_scale,
+    decode_from_storage,
+    encode_for_storage,
+    quantize_int8,
+    rescore,
+)
+from src.services.resilience import call_with_retry, is_unavailable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RescoredHit:
+    """A search hit reranked client-side; ``distance`` is the negated dot product."""
+    id: Any
+    distance: float
+    entity: Dict[str, Any] = field(default_factory=dict)
+
+
+def merge_hits(results, limit: Optional[int] = None) -> List[Any]:
+    """Merge the hit lists of a multi-query search into one list.
+
+    Hits are deduplicated by id, keeping the closest match, and sorted by
+    ascending distance. This works for L2 and for rescored hits, where a
+    smaller distance is a better match. At most ``limit`` hits are kept.
+    """
+    best: Dict[Any, Any] = {}
+    for hits in results:
+        for hit in hits:
+            if hit.id not in best or hit.distance < best[hit.id].distance:
+                best[hit.id] = hit
+    return sorted(best.values(), key=lambda hit: hit.distance)[:limit]
+
+
+_RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+# Stored and matched in lower case so "Sci-Fi" and "sci-fi" filter alike.
+_CASE_INSENSITIVE_FIELDS = {"genre"}
+
+
+def _normalize(name: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if SCALAR_FIELDS[name]["dtype"] == DataType.INT64:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    value = str(value)
+    return value.lower() if name in _CASE_INSENSITIVE_FIELDS else value
+
+
+def _literal(name: str, value: Any) -> str:
+    value = _normalize(name, value)
+    if value is None:
+        raise ValueError(f"Invalid filter value for '{name}'.")
+    if isinstance(value, str):
+        # JSON string escaping matches Milvus string literals.
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def build_filter_expr(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Build a Milvus boolean expression from metadata filters.
+
+    Supported forms, combined with ``and``:
+        {"genre": "drama"}                     -> genre == "drama"
+        {"genre": ["drama", "comedy"]}         -> genre in ["drama", "comedy"]
+        {"year": {"gte": 1990, "lt": 2000}}    -> year >= 1990 and year < 2000
+
+    Only fields in ``SCALAR_FIELDS`` can be filtered; None values are ignored.
+
+    Raises:
+        ValueError: For unknown fields or operators.
+    """
+    clauses = []
+    for name, condition in (filters or {}).items():
+        if name not in SCALAR_FIELDS:
+            raise ValueError(f"Cannot filter on unknown field '{name}'.")
+        if condition is None:
+            continue
+        if isinstance(condition, dict):
+            for op, value in condition.items():
+                if op not in _RANGE_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator '{op}' for '{name}'.")
+                if value is not None:
+                    clauses.append(f"{name} {_RANGE_OPERATORS[op]} {_literal(name, value)}")
+        elif isinstance(condition, (list, tuple, set)):
+            values = [_literal(name, value) for value in condition if value is not None]
+            if values:
+                clauses.append(f"{name} in [{', '.join(values)}]")
+        else:
+            clauses.append(f"{name} == {_literal(name, condition)}")
+    return " and ".join(clauses) or None
+
+
+def tenant_expr(tenant: str) -> str:
+    """Filter clause selecting one tenant; on partition-key collections Milvus prunes partitions by it."""
+    return f"{TENANT_FIELD} == {json.dumps(tenant, ensure_ascii=False)}"
+
+
+def tenant_partition_name(tenant: str) -> str:
+    """Name of the partition holding ``tenant`` in "partitions" mode.
+
+    The default tenant lives in Milvus' ``_default`` partition, so data
+    inserted before tenants existed stays searchable. Other names are made
+    safe for Milvus, with a checksum when characters had to be replaced.
+    """
+    if tenant == DEFAULT_TENANT:
+        return "_default"
+    safe = re.sub(r"[^0-9A-Za-z_]", "_", tenant)[:200]
+    if safe != tenant:
+        safe = f"{safe}_{zlib.crc32(tenant.encode('utf-8')):08x}"
+    return f"tenant_{safe}"
+
+
+def _check_tenant(tenant: str) -> str:
+    if not tenant or len(tenant.encode("utf-8")) > TENANT_MAX_LENGTH:
+        raise ValueError(f"Tenant must be 1 to {TENANT_MAX_LENGTH} bytes long.")
+    return tenant
+
+
+def _clip_text(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return text.encode("utf-8")[:TEXT_MAX_BYTES].decode("utf-8", errors="ignore")
+
+
+def document_fields(text: Optional[str], metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Text and scalar metadata columns of one document, normalized for storage."""
+    fields = {TEXT_FIELD: _clip_text(text)}
+    for name in SCALAR_FIELDS:
+        fields[name] = _normalize(name, (metadata or {}).get(name))
+    return fields
+
 
 class MilvusHandler:
-    def __init__(self, host="127.0.0.1", port="19530"):
+    """Milvus access for one vector storage mode.
+
+    Documents belong to a tenant (``DEFAULT_TENANT`` unless given). How
+    tenants are separated is chosen when a collection is created:
+
+    - ``partition_key``: the tenant field is the collection's partition key.
+      Milvus hashes tenants into ``num_partitions`` partitions and searches
+      for one tenant only scan its partition. Scales to many tenants, but the
+      collection is loaded and released as a whole.
+    - ``partitions``: every tenant gets a named partition. Searches load and
+      scan only that partition, and ``load_tenants``/``release_tenants`` keep
+      hot tenants in memory and free cold ones. Suited to a few large tenants
+      (Milvus allows at most 1024 partitions per collection).
+
+    Existing collections are used in the mode they were created with.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port="19530",
+        vector_storage="float32",
+        rescore_factor=4,
+        tenant_partitioning="partition_key",
+        num_partitions=DEFAULT_NUM_PARTITIONS,
+    ):
         self.host = host
         self.port = port
         self.alias = "default"
+        self.vector_storage = vector_storage
+        # Binary search over-fetches this many candidates per requested hit before rescoring.
+        self.rescore_factor = rescore_factor
+        self.tenant_partitioning = tenant_partitioning
+        self.num_partitions = num_partitions
+        self._int8_scales: Dict[str, float] = {}
+
+    build_filter = staticmethod(build_filter_expr)
 
     def connect(self):
         """Establish a connection to Milvus."""
         connections.connect(alias=self.alias, host=self.host, port=self.port)
-        print(f"Connected to Milvus at {self.host}:{self.port}")
+        logger.info("Connected to Milvus at %s:%s", self.host, self.port)
+
+    def disconnect(self):
+        """Close the connection to Milvus."""
+        connections.disconnect(alias=self.alias)
 
     def create_collection(self, collection_name, vector_dim=128):
         """Create a collection in Milvus."""
-        field1 = FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True)
-        field2 = FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=vector_dim)
-        schema = CollectionSchema(fields=[field1, field2], description="Document collection")
-        collection = Collection(name=collection_name, schema=schema)
-        print(f"Collection '{collection_name}' created.")
+        collection = Collection(
+            name=collection_name,
+            schema=build_schema(vector_dim, self.vector_storage, self.tenant_partitioning),
+            **collection_kwargs(self.tenant_partitioning, self.num_partitions),
+        )
+        create_indexes(collection, self.vector_storage)
+        logger.info("Collection '%s' created (%s tenancy).", collection_name, self.tenant_partitioning)
+        return collection
+
+    def drop_collection(self, collection_name):
+        """Drop the collection if it exists."""
+        if utility.has_collection(collection_name, using=self.alias):
+            utility.drop_collection(collection_name, using=self.alias)
+            logger.info("Collection '%s' dropped.", collection_name)
+
+    def ensure_collection(self, collection_name, vector_dim):
+        """Create the collection if needed and check its vector field matches."""
+        if not utility.has_collection(collection_name, using=self.alias):
+            return self.create_collection(collection_name, vector_dim=vector_dim)
+
+        collection = Collection(name=collection_name)
+        embedding_field = next(f for f in collection.schema.fields if f.name == "embedding")
+        if embedding_field.dtype != VECTOR_DTYPES[self.vector_storage]:
+            raise ValueError(
+                f"Collection '{collection_name}' stores {embedding_field.dtype.name} vectors, "
+                f"but vector_storage is '{self.vector_storage}'."
+            )
+        existing_dim = int(embedding_field.params.get("dim"))
+        if existing_dim != vector_dim:
+            raise ValueError(
+                f"Collection '{collection_name}' stores {existing_dim}-dimensional vectors, "
+                f"but the embedding model produces {vector_dim}-dimensional vectors."
+            )
         return collection
 
-    def insert_data(self, collection_name, embeddings):
-        """Insert embeddings into the collection and handle Milvus response."""
+    @staticmethod
+    def _uses_partition_key(collection: Collection) -> bool:
+        key = getattr(collection.schema, "partition_key_field", None)
+        return key is not None and key.name == TENANT_FIELD
+
+    def _tenant_partition(self, collection: Collection, tenant: str, create: bool = False) -> Optional[str]:
+        """Partition of ``tenant`` in a "partitions" collection, or None if it has none yet."""
+        name = tenant_partition_name(tenant)
+        if collection.has_partition(name):
+            return name
+        if not create:
+            return None
+        collection.create_partition(name)
+        logger.info("Partition '%s' created for tenant '%s'.", name, tenant)
+        return name
 
+    def load_tenants(self, collection_name: str, tenants: List[str]) -> List[str]:
+        """Load the partitions of ``tenants`` into memory; returns the partitions loaded.
+
+        Only collections using "partitions" tenancy can load tenants
+        separately; partition-key collections are loaded as a whole.
+        """
         collection = Collection(name=collection_name)
+        if self._uses_partition_key(collection):
+            collection.load()
+            return []
+        names = [name for name in (self._tenant_partition(collection, t) for t in tenants) if name]
+        if names:
+            collection.load(partition_names=names)
+            logger.info("Loaded partitions %s of '%s'.", names, collection_name)
+        return names
+
+    def release_tenants(self, collection_name: str, tenants: List[str]) -> List[str]:
+        """Release the partitions of ``tenants`` from memory; returns the partitions released.
+
+        Raises:
+            ValueError: For partition-key collections, which can only be released as a whole.
+        """
+        collection = Collection(name=collection_name)
+        if self._uses_partition_key(collection):
+            raise ValueError(
+                f"Collection '{collection_name}' uses a partition key; release the whole collection instead."
+            )
+        names = [name for name in (self._tenant_partition(collection, t) for t in tenants) if name]
+        for name in names:
+            collection.partition(name).release()
+        if names:
+            logger.info("Released partitions %s of '%s'.", names, collection_name)
+        return names
+
+    def _int8_scale(self, collection: Collection, sample: Optional[np.ndarray] = None) -> float:
+        """Scale of the collection's int8 codes (int8 and binary storage).
+
+        It is calibrated from ``sample``, the first batch inserted into an
+        empty collection, and stored as the ``INT8_SCALE_PROPERTY`` collection
+        property. Collections filled before calibration existed use ``INT8_SCALE``.
+        """
+        if collection.name in self._int8_scales:
+            return self._int8_scales[collection.name]
+        properties = collection.describe().get("properties") or {}
+        if INT8_SCALE_PROPERTY in properties:
+            scale = float(properties[INT8_SCALE_PROPERTY])
+        elif sample is not None and collection.num_entities == 0:
+            scale = calibrate_int8_scale(sample)
+            collection.set_properties({INT8_SCALE_PROPERTY: str(scale)})
+            logger.info("Calibrated int8 scale %.1f for '%s'.", scale, collection.name)
+        else:
+            # Not calibrated yet (empty collection) or filled with the fixed scale; decide again next time.
+            return INT8_SCALE
+        self._int8_scales[collection.name] = scale
+        return scale
+
+    def insert_data(
+        self,
+        collection_name,
+        embeddings,
+        texts: Optional[List[str]] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        tenant: Optional[str] = None,
+    ):
+        """Insert embeddings, with their texts and filterable metadata, into the collection.
+
+        Metadata keys outside ``SCALAR_FIELDS`` are ignored; fields the
+        collection does not have (older collections) are skipped. Documents
+        are stored for ``tenant``, in its partition unless the collection
+        uses a partition key.
+        """
+
+        collection = Collection(name=collection_name)
+        tenant = _check_tenant(tenant or DEFAULT_TENANT)
+        partition_name = None
+        if not self._uses_partition_key(collection):
+            partition_name = self._tenant_partition(collection, tenant, create=True)
+
+        # Embeddings stay a float32 matrix until they are encoded for the field type.
+        matrix = as_float32_matrix(embeddings)
+        count = len(matrix)
+        int8_scale = INT8_SCALE
+        if self.vector_storage in ("int8", "binary"):
+            int8_scale = self._int8_scale(collection, sample=matrix)
+        data = {"embedding": encode_for_storage(matrix, self.vector_storage, int8_scale)}
+        if self.vector_storage == "binary":
+            data[RESCORE_FIELD] = list(quantize_int8(matrix, int8_scale))
+        rows = [
+            document_fields(texts[i] if texts is not None else None, metadata[i] if metadata else None)
+            for i in range(count)
+        ]
+        for name in [TEXT_FIELD, *SCALAR_FIELDS]:
+            data[name] = [row[name] for row in rows]
+        data[TENANT_FIELD] = [tenant] * count
+        columns = [
+            data[f.name] for f in collection.schema.fields if not f.auto_id and f.name in data
+        ]
+
+        # Perform the insertion. Inserts get auto-generated IDs, so they are only
+        # retried when Milvus refused them, never after a timeout that may have landed.
+        insert_response = call_with_retry(
+            lambda: collection.insert(columns, partition_name=partition_name),
+            endpoint="milvus.insert",
+            retry_on=is_unavailable,
+        )
 
-        # Perform the insertion
-        insert_response = collection.insert([embeddings])
-        
         # Access the IDs from the MutationResult
         if hasattr(insert_response, "primary_keys"):
             inserted_ids = insert_response.primary_keys
-            print(f"Successfully inserted {len(inserted_ids)} records into '{collection_name}'.")
-            print(f"Milvus response (IDs of inserted records): {inserted_ids}")
+            logger.info("Successfully inserted %d records into '%s'.", len(inserted_ids), collection_name)
         else:
-            print(f"Failed to retrieve IDs from insert response. Raw response: {insert_response}")
+            logger.warning("Failed to retrieve IDs from insert response. Raw response: %s", insert_response)
 
         return insert_response
 
     def search(
-        self, 
-        collection_name: str, 
-        query_vectors: List[List[float]], 
-        top_k: int = 3, 
-        output_fields: List[str] = None
+        self,
+        collection_name: str,
+        query_vectors: Union[np.ndarray, List[List[float]]],
+        top_k: int = 3,
+        output_fields: List[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        tenant: Optional[str] = None,
+        nprobe: int = 10,
+        with_vectors: bool = False,
     ):
         """
         Search for similar vectors, returning any 'output_fields' you want.
         Example: output_fields=["summary"] if you want the text from each doc.
+
+        For binary collections the Hamming search over-fetches candidates and
+        returns them reranked against the float query as RescoredHit lists.
+
+        ``filters`` (see ``build_filter_expr``) restrict the search to
+        matching documents using the scalar indexes. With ``tenant`` only that
+        tenant's documents are searched, and only its partition is loaded
+        and scanned; without it the whole collection is searched. ``nprobe``
+        is the number of IVF clusters scanned (ignored by HNSW indexes).
+        With ``with_vectors`` the stored vectors are returned too; read them
+        with ``hit_vectors``.
         """
         collection = Collection(collection_name)
-        collection.load()  # ensure data is loaded
+        queries = as_float32_matrix(query_vectors)
+        expr = build_filter_expr(filters)
+        partition_names = None
+        if tenant is None or self._uses_partition_key(collection):
+            collection.load()  # ensure data is loaded
+            if tenant is not None:
+                tenant_clause = tenant_expr(_check_tenant(tenant))
+                expr = f"{tenant_clause} and ({expr})" if expr else tenant_clause
+        else:
+            partition = self._tenant_partition(collection, _check_tenant(tenant))
+            if partition is None:
+                # The tenant has not indexed anything yet.
+                return [[] for _ in queries]
+            partition_names = [partition]
+            collection.load(partition_names=partition_names)
 
         if output_fields is None:
             # By default, return only primary key & distance (no extra fields)
             output_fields = []
 
-        search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
-        results = collection.search(
-            data=query_vectors,
-            anns_field="embedding",
-            param=search_params,
-            limit=top_k,
-            output_fields=output_fields,
+        index_params = INDEX_PARAMS[self.vector_storage]
+        limit = top_k
+        requested = list(output_fields)
+        if self.vector_storage == "binary":
+            limit = top_k * self.rescore_factor
+            # The int8 rescoring codes double as the returned vectors.
+            if with_vectors:
+                requested.append(RESCORE_FIELD)
+            output_fields = output_fields + [RESCORE_FIELD]
+        elif with_vectors and "embedding" not in output_fields:
+            output_fields = output_fields + ["embedding"]
+
+        if index_params["index_type"] == "HNSW":
+            params = {"ef": max(64, limit)}
+        else:
+            params = {"nprobe": nprobe}
+        search_params = {"metric_type": index_params["metric_type"], "params": params}
+        int8_scale = INT8_SCALE
+        if self.vector_storage in ("int8", "binary"):
+            int8_scale = self._int8_scale(collection)
+        # int8 queries are quantized with the documents' scale.
+        data = encode_for_storage(queries, self.vector_storage, int8_scale)
+        results = call_with_retry(
+            lambda: collection.search(
+                data=data,
+                anns_field="embedding",
+                param=search_params,
+                limit=limit,
+                expr=expr,
+                partition_names=partition_names,
+                output_fields=output_fields,
+            ),
+            endpoint="milvus.search",
+            hedge=True,
         )
-        return results
\ No newline at end of file
+        if self.vector_storage == "binary":
+            return [
+                self._rescore_hits(query, hits, top_k, requested, int8_scale)
+                for query, hits in zip(queries, results)
+            ]
+        return results
+
+    def hit_vectors(self, hits, dim: int, collection_name: Optional[str] = None) -> np.ndarray:
+        """Float32 matrix of the vectors of hits returned by ``search(..., with_vectors=True)``.
+
+        ``collection_name`` is the searched collection, whose int8 scale
+        decodes int8 and binary hits.
+        """
+        int8_scale = self._int8_scales.get(collection_name, INT8_SCALE)
+        if self.vector_storage == "binary":
+            return decode_from_storage([hit.entity.get(RESCORE_FIELD) for hit in hits], dim, "int8", int8_scale)
+        return decode_from_storage(
+            [hit.entity.get("embedding") for hit in hits], dim, self.vector_storage, int8_scale
+        )
+
+    def _rescore_hits(
+        self, query: np.ndarray, hits, top_k: int, output_fields: List[str], int8_scale: float = INT8_SCALE
+    ) -> List[RescoredHit]:
+        """Rerank Hamming candidates using their stored int8 codes."""
+        hits = list(hits)
+        if not hits:
+            return []
+        codes = [hit.entity.get(RESCORE_FIELD) for hit in hits]
+        candidates = decode_from_storage(codes, len(query), "int8", int8_scale)
+        order, scores = rescore(query, candidates, top_k)
+        reranked = []
+        for i, score in zip(order, scores):
+            hit = hits[i]
+            entity = {name: hit.entity.get(name) for name in output_fields}
+            reranked.append(RescoredHit(id=hit.id, distance=-float(score), entity=entity))
+        return reranked
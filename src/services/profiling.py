@@ -0,0 +1,394 @@
+"""Opt-in sampling profiler for graph runs.
+
+A profiled run is sampled by a background thread that records the Python
+stack of every thread each ``interval`` seconds (``sys._current_frames``;
+no extra dependency). A LangChain callback tracks which graph nodes are
+running, and each sample is prefixed with frames for the active nodes, so
+the flamegraph splits time by node, subgraph nodes nested under their
+parent.
+
+Samples whose innermost frame is a known wait (the event loop's selector,
+lock and queue waits, socket reads) count as waiting on I/O. All other
+samples count as on-CPU Python time. Samples taken outside any node
+(reducers, checkpointing and other graph overhead) are reported under
+``(graph)``.
+
+Every run is saved as a speedscope file (https://www.speedscope.app), one
+profile per thread that did work. Its per-node wall time (from the
+callbacks) and sampled CPU time are added to ``node_profiles``, the report
+aggregated across runs and served at ``GET /api/profile/nodes``.
+
+The sampler sees the whole process. While other requests run concurrently,
+their frames show up in the profile, but are only attributed to nodes
+while a node of the profiled run is active.
+
+Settings: ``PROFILE_MODE`` is ``off`` (default), ``header`` (profile
+requests sent with ``X-Profile: 1``) or ``all``. ``PROFILE_DIR`` is where
+files are written, and ``PROFILE_INTERVAL_MS`` is the sampling interval.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+GRAPH_OVERHEAD = "(graph)"
+
+# (file suffix, function) of frames that block without using the CPU.
+_WAITS = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("ssl.py", "recv_into"),
+    ("subprocess.py", "_wait"),
+}
+
+Frame = Tuple[str, str, int]
+
+
+def profile_mode() -> str:
+    """Return the ``PROFILE_MODE`` setting."""
+    return os.getenv("PROFILE_MODE", "off")
+
+
+def should_profile(header: Optional[str]) -> bool:
+    """Whether a request with this ``X-Profile`` header value is profiled under ``PROFILE_MODE``."""
+    mode = profile_mode()
+    if mode == "all":
+        return True
+    return mode == "header" and (header or "").lower() in ("1", "true", "yes")
+
+
+class NodeTracker(BaseCallbackHandler):
+    """Callback recording when graph nodes (of the run and its subgraphs) start and end."""
+
+    # Called in the event loop, not in an executor, so the timestamps are exact.
+    run_inline = True
+
+    def __init__(self):
+        """Start with no intervals."""
+        self._lock = threading.Lock()
+        self._active: Dict[Any, Tuple[str, float]] = {}
+        self.intervals: List[Tuple[str, float, float]] = []
+
+    def on_chain_start(
+        self,
+        serialized: Any,
+        inputs: Any,
+        *,
+        run_id: Any,
+        metadata: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Note the start of a graph node's own run."""
+        node = (metadata or {}).get("langgraph_node")
+        # Runnables inside a node inherit its metadata; only the node's own run has its name.
+        if node is not None and kwargs.get("name") == node:
+            with self._lock:
+                self._active[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs: Any, *, run_id: Any, **kwargs: Any) -> None:
+        """Close the node's interval."""
+        self._finish(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: Any, **kwargs: Any
+    ) -> None:
+        """Close the node's interval."""
+        self._finish(run_id)
+
+    def _finish(self, run_id: Any) -> None:
+        with self._lock:
+            started = self._active.pop(run_id, None)
+            if started is not None:
+                self.intervals.append((started[0], started[1], time.perf_counter()))
+
+    def active(self) -> Tuple[str, ...]:
+        """Names of the running nodes, outermost first."""
+        with self._lock:
+            return tuple(
+                node
+                for node, _ in sorted(self._active.values(), key=lambda entry: entry[1])
+            )
+
+
+@dataclass
+class _Sample:
+    thread: int
+    weight: float
+    stack: Tuple[int, ...]
+    nodes: Tuple[str, ...]
+    waiting: bool
+
+
+class SamplingProfiler:
+    """Background thread sampling the stacks of every other thread."""
+
+    def __init__(self, tracker: Optional[NodeTracker] = None, interval: float = 0.005):
+        """Sample every ``interval`` seconds, attributing samples to ``tracker``'s nodes."""
+        self.tracker = tracker
+        self.interval = interval
+        self.frames: List[Frame] = []
+        self._frame_index: Dict[Frame, int] = {}
+        self.samples: List[_Sample] = []
+        self.thread_names: Dict[int, str] = {}
+        self.started = self.stopped = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start sampling in a background thread."""
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped = time.perf_counter()
+        self.thread_names.update(
+            {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+        )
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            nodes = self.tracker.active() if self.tracker is not None else ()
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stack = self._stack(frame)
+                    self.samples.append(
+                        _Sample(ident, now - last, stack, nodes, self._is_wait(stack))
+                    )
+            self.thread_names.update(
+                {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            )
+            last = now
+
+    def _stack(self, frame: Any) -> Tuple[int, ...]:
+        """Frame indices of ``frame``'s stack, outermost first."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append(key)
+            stack.append(index)
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def _is_wait(self, stack: Tuple[int, ...]) -> bool:
+        if not stack:
+            return True
+        name, filename, _ = self.frames[stack[-1]]
+        return (os.path.basename(filename), name) in _WAITS
+
+    def node_seconds(self) -> Dict[str, float]:
+        """Return the sampled on-CPU seconds per node, inclusive of nested nodes."""
+        seconds: Dict[str, float] = {}
+        for sample in self.samples:
+            if sample.waiting:
+                continue
+            for node in set(sample.nodes) or {GRAPH_OVERHEAD}:
+                seconds[node] = seconds.get(node, 0.0) + sample.weight
+        return seconds
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        """Speedscope file with one sampled profile per thread that was not only waiting."""
+        frames = [
+            {"name": fn, "file": filename, "line": line}
+            for fn, filename, line in self.frames
+        ]
+        node_frames: Dict[str, int] = {}
+
+        def node_frame(node: str) -> int:
+            if node not in node_frames:
+                node_frames[node] = len(frames)
+                frames.append({"name": f"[node] {node}"})
+            return node_frames[node]
+
+        by_thread: Dict[int, List[_Sample]] = {}
+        for sample in self.samples:
+            by_thread.setdefault(sample.thread, []).append(sample)
+        profiles = []
+        for ident, samples in by_thread.items():
+            if all(sample.waiting for sample in samples):
+                continue
+            stacks = [
+                [node_frame(node) for node in sample.nodes] + list(sample.stack)
+                for sample in samples
+            ]
+            weights = [sample.weight for sample in samples]
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": self.thread_names.get(ident, str(ident)),
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": stacks,
+                    "weights": weights,
+                }
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "src.services.profiling",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+@dataclass
+class NodeStats:
+    """Totals for one graph node across profiled runs."""
+
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return the totals and per-call means."""
+        calls = max(self.calls, 1)
+        return {
+            "calls": self.calls,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "mean_wall_seconds": self.wall_seconds / calls,
+            "mean_cpu_seconds": self.cpu_seconds / calls,
+        }
+
+
+@dataclass
+class NodeProfileReport:
+    """Per-node wall and sampled CPU time, summed over every profiled run of the process."""
+
+    runs: int = 0
+    nodes: Dict[str, NodeStats] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, tracker: NodeTracker, profiler: SamplingProfiler) -> None:
+        """Add one run's node intervals and samples."""
+        with self._lock:
+            self.runs += 1
+            for node, started, ended in tracker.intervals:
+                stats = self.nodes.setdefault(node, NodeStats())
+                stats.calls += 1
+                stats.wall_seconds += ended - started
+            for node, seconds in profiler.node_seconds().items():
+                self.nodes.setdefault(node, NodeStats()).cpu_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the totals per node, slowest first."""
+        with self._lock:
+            ranked = sorted(
+                self.nodes.items(), key=lambda item: item[1].wall_seconds, reverse=True
+            )
+            return {
+                "runs": self.runs,
+                "nodes": {node: stats.as_dict() for node, stats in ranked},
+            }
+
+    def reset(self) -> None:
+        """Drop every recorded run."""
+        with self._lock:
+            self.runs = 0
+            self.nodes.clear()
+
+
+node_profiles = NodeProfileReport()
+
+
+@dataclass
+class ProfiledRun:
+    """A profiled run in progress: pass ``config`` to the graph; the file is written to ``path``."""
+
+    config: Dict[str, Any]
+    path: Optional[str] = None
+
+
+def _with_callback(
+    config: Dict[str, Any], handler: BaseCallbackHandler
+) -> Dict[str, Any]:
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, handler]
+    else:
+        # A callback manager.
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    return {**config, "callbacks": callbacks}
+
+
+def _save(profile: Dict[str, Any], path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+
+
+@asynccontextmanager
+async def profiled(
+    label: str, config: Dict[str, Any], enabled: bool = True
+) -> AsyncIterator[ProfiledRun]:
+    """Profile the graph run started inside the block with the yielded ``config``.
+
+    When disabled the config is yielded unchanged and nothing is sampled.
+    """
+    if not enabled:
+        yield ProfiledRun(config=config)
+        return
+    directory = os.getenv("PROFILE_DIR", "profiles")
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+    tracker = NodeTracker()
+    profiler = SamplingProfiler(
+        tracker, interval=float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+    )
+    run = ProfiledRun(
+        config=_with_callback(config, tracker),
+        path=os.path.join(directory, f"{name}.speedscope.json"),
+    )
+    cpu_started = time.process_time()
+    profiler.start()
+    try:
+        yield run
+    finally:
+        profiler.stop()
+        cpu_seconds = time.process_time() - cpu_started
+        node_profiles.add(tracker, profiler)
+        try:
+            # Large profiles take a while to serialize; keep that off the event loop.
+            await asyncio.to_thread(_save, profiler.to_speedscope(name), run.path)
+            logger.info(
+                "%s: %.3fs wall, %.3fs process CPU, %d samples -> %s",
+                label,
+                profiler.stopped - profiler.started,
+                cpu_seconds,
+                len(profiler.samples),
+                run.path,
+            )
+        except OSError as e:
+            logger.warning("Could not write %s: %s", run.path, e)
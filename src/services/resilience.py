@@ -0,0 +1,411 @@
+"""Retries, circuit breakers and hedged requests for external calls.
+
+Every call goes through a named endpoint (e.g. ``"openai.embeddings"``,
+``"milvus.search"``, ``"llm:gpt-4o-mini"``) that owns a circuit breaker and a
+retry budget shared by all callers in the process:
+
+- transient failures are retried with full-jitter exponential backoff,
+  honouring ``Retry-After`` when the provider sends one;
+- retries are capped to a fraction of recent traffic (the retry budget) so an
+  outage does not multiply the load on the provider;
+- after repeated failures the breaker opens and calls fail fast until a
+  probe succeeds;
+- idempotent calls can be hedged: a second attempt starts if the first has
+  not answered after a delay, and the first result wins.
+
+Settings come from the environment (``RESILIENCE_*``); attempts, retries,
+hedges and breaker state are recorded in ``src.services.metrics``.
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when an endpoint's circuit breaker is open."""
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt`` (starting at 1)."""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+
+class RetryBudget:
+    """Limit retries to a fraction of recent requests.
+
+    Each request deposits ``ratio`` tokens and each retry spends one, with a
+    small floor so low-traffic endpoints can still retry.
+    """
+
+    def __init__(
+        self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0
+    ):
+        """Earn ``ratio`` retries per request, holding between ``min_tokens`` and ``max_tokens``."""
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        """Earn a fraction of a retry for one request."""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Spend one retry, returning False when the budget is exhausted."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures -> half-open after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """Open after ``failure_threshold`` failures and probe again after ``reset_timeout`` seconds."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """``closed``, ``open`` or ``half_open``."""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return whether a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                # Let a single probe through; its outcome closes or re-opens the breaker.
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Close the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the breaker at the threshold or on a failed probe."""
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+@dataclass
+class Endpoint:
+    """Retry policy, circuit breaker and retry budget shared by calls to one service."""
+
+    name: str
+    policy: RetryPolicy = field(default_factory=RetryPolicy)
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    budget: RetryBudget = field(default_factory=RetryBudget)
+    # Seconds before a hedged second attempt starts; None disables hedging.
+    hedge_after: Optional[float] = None
+
+
+_endpoints: Dict[str, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+def get_endpoint(name: str) -> Endpoint:
+    """Return the shared state for ``name``, creating it from the environment."""
+    with _endpoints_lock:
+        if name not in _endpoints:
+            hedges = json.loads(os.getenv("RESILIENCE_HEDGE_AFTER", "{}"))
+            _endpoints[name] = Endpoint(
+                name=name,
+                policy=RetryPolicy(
+                    max_attempts=int(os.getenv("RESILIENCE_MAX_ATTEMPTS", 4)),
+                    base_delay=float(os.getenv("RESILIENCE_BASE_DELAY", 0.5)),
+                    max_delay=float(os.getenv("RESILIENCE_MAX_DELAY", 20.0)),
+                ),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("RESILIENCE_BREAKER_THRESHOLD", 5)),
+                    reset_timeout=float(os.getenv("RESILIENCE_BREAKER_RESET", 30.0)),
+                ),
+                budget=RetryBudget(
+                    ratio=float(os.getenv("RESILIENCE_RETRY_RATIO", 0.2))
+                ),
+                hedge_after=hedges.get(name),
+            )
+        return _endpoints[name]
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_unavailable(exc: BaseException) -> bool:
+    """Return True when the server never got or refused the request, so a retry is safe."""
+    if isinstance(exc, ConnectionError):
+        return True
+    if _status_code(exc) in (429, 503):
+        return True
+    name = type(exc).__name__
+    return name in {
+        "APIConnectionError",
+        "RateLimitError",
+        "MilvusUnavailableException",
+    }
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient failures worth retrying: connection problems, timeouts, throttling and 5xx."""
+    if isinstance(exc, (CircuitOpenError, asyncio.CancelledError)):
+        return False
+    if is_unavailable(exc) or isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    if _status_code(exc) in RETRYABLE_STATUS_CODES:
+        return True
+    return type(exc).__name__ in {"APITimeoutError", "InternalServerError"}
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def _next_delay(
+    endpoint: Endpoint, attempt: int, exc: BaseException, retry_on
+) -> Optional[float]:
+    """Delay before the next attempt, or None if the failure should be raised."""
+    if attempt >= endpoint.policy.max_attempts or not retry_on(exc):
+        return None
+    if not endpoint.budget.try_spend():
+        metrics.incr("resilience.retry_budget_exhausted", endpoint=endpoint.name)
+        return None
+    delay = endpoint.policy.backoff(attempt)
+    server_delay = retry_after(exc)
+    if server_delay is not None:
+        delay = min(max(delay, server_delay), endpoint.policy.max_delay)
+    metrics.incr("resilience.retries", endpoint=endpoint.name)
+    return delay
+
+
+def _before_attempt(endpoint: Endpoint) -> None:
+    if not endpoint.breaker.allow():
+        metrics.incr("resilience.circuit_rejections", endpoint=endpoint.name)
+        raise CircuitOpenError(f"Circuit breaker for {endpoint.name} is open.")
+    metrics.incr("resilience.attempts", endpoint=endpoint.name)
+
+
+def _record(endpoint: Endpoint, exc: Optional[BaseException], retry_on) -> None:
+    if exc is not None and retry_on(exc):
+        endpoint.breaker.record_failure()
+        metrics.incr("resilience.failures", endpoint=endpoint.name)
+    else:
+        # Only transient failures count against the breaker; a rejected bad
+        # request still shows the endpoint is reachable.
+        endpoint.breaker.record_success()
+    metrics.set_gauge(
+        "resilience.circuit_open",
+        endpoint.breaker.state != "closed",
+        endpoint=endpoint.name,
+    )
+
+
+def _hedged(fn: Callable[[], T], endpoint: Endpoint) -> T:
+    primary = _hedge_pool.submit(fn)
+    done, _ = wait([primary], timeout=endpoint.hedge_after)
+    if done:
+        return primary.result()
+    metrics.incr("resilience.hedges", endpoint=endpoint.name)
+    backup = _hedge_pool.submit(fn)
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is backup:
+                    metrics.incr("resilience.hedge_wins", endpoint=endpoint.name)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def _ahedged(fn: Callable[[], Awaitable[T]], endpoint: Endpoint) -> T:
+    primary = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({primary}, timeout=endpoint.hedge_after)
+    if done:
+        return primary.result()
+    metrics.incr("resilience.hedges", endpoint=endpoint.name)
+    backup = asyncio.ensure_future(fn())
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        metrics.incr("resilience.hedge_wins", endpoint=endpoint.name)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _check_not_on_event_loop(endpoint: str) -> None:
+    """Report a blocking backoff on a running event loop, which stalls every task on it."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    metrics.incr("resilience.blocking_backoffs", endpoint=endpoint)
+    logger.warning(
+        "%s: blocking retry backoff on the event loop; offload the caller to a thread",
+        endpoint,
+    )
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    *,
+    endpoint: str,
+    retry_on: Callable[[BaseException], bool] = is_retryable,
+    hedge: bool = False,
+) -> T:
+    """Call ``fn`` through the named endpoint's breaker, retry budget and backoff.
+
+    Args:
+        fn: Zero-argument callable performing the request.
+        endpoint: Endpoint name; breakers and budgets are shared per name.
+        retry_on: Predicate selecting retryable exceptions. Use ``is_unavailable``
+            for non-idempotent calls that must not be repeated after a timeout.
+        hedge: Allow a hedged second attempt (idempotent calls only) when the
+            endpoint has a hedge delay configured.
+
+    The backoff sleeps the calling thread, so async code must run the caller
+    in a worker thread (``asyncio.to_thread``) or use ``acall_with_retry``.
+    """
+    state = get_endpoint(endpoint)
+    state.budget.record_request()
+    attempt = 0
+    while True:
+        attempt += 1
+        _before_attempt(state)
+        try:
+            if hedge and state.hedge_after is not None:
+                result = _hedged(fn, state)
+            else:
+                result = fn()
+        except Exception as exc:
+            _record(state, exc, retry_on)
+            delay = _next_delay(state, attempt, exc, retry_on)
+            if delay is None:
+                raise
+            _check_not_on_event_loop(state.name)
+            time.sleep(delay)
+            continue
+        _record(state, None, retry_on)
+        return result
+
+
+async def acall_with_retry(
+    fn: Callable[[], Awaitable[T]],
+    *,
+    endpoint: str,
+    retry_on: Callable[[BaseException], bool] = is_retryable,
+    hedge: bool = False,
+) -> T:
+    """Async version of ``call_with_retry``; ``fn`` returns a fresh awaitable per attempt."""
+    state = get_endpoint(endpoint)
+    state.budget.record_request()
+    attempt = 0
+    while True:
+        attempt += 1
+        _before_attempt(state)
+        try:
+            if hedge and state.hedge_after is not None:
+                result = await _ahedged(fn, state)
+            else:
+                result = await fn()
+        except Exception as exc:
+            _record(state, exc, retry_on)
+            delay = _next_delay(state, attempt, exc, retry_on)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        _record(state, None, retry_on)
+        return result
+
+
+async def ainvoke_with_retry(
+    runnable: Any, input: Any, *, endpoint: str, **kwargs: Any
+) -> Any:
+    """``await runnable.ainvoke(input)`` with the endpoint's retry policy."""
+    return await acall_with_retry(
+        lambda: runnable.ainvoke(input, **kwargs), endpoint=endpoint
+    )
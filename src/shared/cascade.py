@@ -0,0 +1,176 @@
+"""Cheap local classifiers in front of LLM classification calls.
+
+Routing and grading are small classification problems, yet each one costs a
+chat-model round trip. In cascade mode a local embedding model answers
+first, and the LLM is only called when the local answer is not confident:
+
+- ``CentroidClassifier`` labels a text by its nearest class centroid, built
+  from a few example texts per class; the margin between the two most
+  similar centroids is its confidence;
+- ``SimilarityGate`` answers yes/no for (query, text) pairs from their
+  cosine similarity: above ``high`` is yes, below ``low`` is no, anything
+  in between is escalated.
+
+``cascade`` records, per task, how many calls were answered locally or
+escalated and, whenever both answers are known, whether they agreed.
+A small ``audit_rate`` of confident decisions is also sent to the LLM, so
+agreement keeps being measured after the thresholds are tuned.
+"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, Awaitable, Callable, Mapping, Optional, Sequence, TypeVar
+
+import numpy as np
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Embed = Callable[[Sequence[str]], np.ndarray]
+T = TypeVar("T")
+
+
+@dataclass
+class LocalDecision:
+    """The local classifier's best guess, and whether it is confident enough to skip the LLM."""
+
+    guess: str
+    confidence: float
+    confident: bool
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class CentroidClassifier:
+    """Nearest-centroid classifier over sentence embeddings."""
+
+    def __init__(
+        self, embed: Embed, examples: Mapping[str, Sequence[str]], min_margin: float
+    ):
+        """Average the embeddings of each label's ``examples`` into a centroid."""
+        self.embed = embed
+        self.labels = list(examples)
+        self.min_margin = min_margin
+        self.centroids = _unit(
+            np.stack(
+                [_unit(embed(list(texts))).mean(axis=0) for texts in examples.values()]
+            )
+        )
+
+    def classify(self, text: str) -> LocalDecision:
+        """Return the nearest label and its margin over the runner-up."""
+        similarities = self.centroids @ _unit(self.embed([text]))[0]
+        order = np.argsort(similarities)[::-1]
+        margin = (
+            float(similarities[order[0]] - similarities[order[1]])
+            if len(order) > 1
+            else 1.0
+        )
+        return LocalDecision(
+            guess=self.labels[order[0]],
+            confidence=margin,
+            confident=margin >= self.min_margin,
+        )
+
+
+class SimilarityGate:
+    """Yes/no decisions for (query, text) pairs from embedding similarity."""
+
+    def __init__(self, embed: Embed, high: float, low: Optional[float] = None):
+        """Hold ``high`` (and optionally ``low``) similarity thresholds."""
+        self.embed = embed
+        self.high = high
+        self.low = low
+
+    def decide(self, query: str, texts: Sequence[str]) -> list[LocalDecision]:
+        """One decision per text; all texts are embedded together with the query in one batch."""
+        if not texts:
+            return []
+        vectors = _unit(self.embed([query, *texts]))
+        decisions = []
+        for similarity in (vectors[1:] @ vectors[0]).tolist():
+            if similarity >= self.high:
+                decisions.append(LocalDecision("yes", similarity, True))
+            elif self.low is not None and similarity <= self.low:
+                decisions.append(LocalDecision("no", similarity, True))
+            else:
+                midpoint = (
+                    self.high + (self.low if self.low is not None else self.high)
+                ) / 2
+                decisions.append(
+                    LocalDecision(
+                        "yes" if similarity >= midpoint else "no", similarity, False
+                    )
+                )
+        return decisions
+
+    def best(self, query: str, texts: Sequence[str]) -> Optional[LocalDecision]:
+        """Decision for the text most similar to ``query`` (e.g. the document supporting an answer)."""
+        decisions = self.decide(query, texts)
+        return max(decisions, key=lambda d: d.confidence) if decisions else None
+
+
+@cache
+def get_embedder(model_name: str) -> Embed:
+    """Embedding function for ``model_name``; local models are loaded once per process."""
+    from src.services.embedding_handler import EmbeddingHandler
+
+    return EmbeddingHandler(model_name=model_name).generate_embeddings
+
+
+async def decide_locally(
+    task: str, classify: Callable[..., T], *args: Any
+) -> Optional[T]:
+    """Run a local classifier off the event loop; None (so the LLM decides) if it fails."""
+    try:
+        return await asyncio.to_thread(classify, *args)
+    except Exception as e:
+        logger.warning("%s: local classifier failed, using the LLM: %s", task, e)
+        metrics.incr("cascade.errors", task=task)
+        return None
+
+
+async def cascade(
+    task: str,
+    decision: Optional[LocalDecision],
+    escalate: Callable[[], Awaitable[str]],
+    audit_rate: float = 0.0,
+) -> str:
+    """Return the local label when confident, otherwise the label from ``escalate()``.
+
+    Metrics: ``cascade.calls{task,path}`` with path local, escalated or
+    audited, and ``cascade.agreement{task,agree,confident}`` whenever the
+    LLM answered and a local guess existed.
+    """
+    if decision is not None and decision.confident and random.random() >= audit_rate:
+        metrics.incr("cascade.calls", task=task, path="local")
+        return decision.guess
+
+    path = "audited" if decision is not None and decision.confident else "escalated"
+    metrics.incr("cascade.calls", task=task, path=path)
+    label = await escalate()
+    if decision is not None:
+        agree = label == decision.guess
+        metrics.incr(
+            "cascade.agreement",
+            task=task,
+            agree=str(agree).lower(),
+            confident=str(decision.confident).lower(),
+        )
+        logger.info(
+            "%s: %s, local guess %r (%.2f) %s LLM %r",
+            task,
+            path,
+            decision.guess,
+            decision.confidence,
+            "agrees with" if agree else "differs from",
+            label,
+        )
+    return label
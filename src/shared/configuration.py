@@ -1,12 +1,40 @@
 # base_configuration.py
 
 import os
+import threading
+import types
+from collections import OrderedDict
 from dataclasses import dataclass, field, fields
-from typing import Annotated, Literal, Optional, Type, TypeVar, Any
+from functools import cache
+from typing import (
+    Annotated,
+    Any,
+    Literal,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
 from langchain_core.runnables import RunnableConfig, ensure_config
 
 T = TypeVar("T", bound="BaseConfiguration")
 
+# Resolved configurations kept per (class, configurable values).
+CONFIG_CACHE_SIZE = 256
+
+
+class ConfigurationError(ValueError):
+    """A configurable value does not match the type of its field."""
+
+
+def _env(name: str, default: str, cast: Any = str) -> Any:
+    """Default read from the environment each time a configuration is built, so reloads pick it up."""
+    return lambda: cast(os.getenv(name, default))
+
 @dataclass(kw_only=True)
 class BaseConfiguration:
     """
@@ -14,14 +42,59 @@ class BaseConfiguration:
     that can be inherited by other configuration classes.
     """
         # Fetch sensitive info from environment variables
-    milvus_host: str = os.getenv("MILVUS_HOST", "127.0.0.1")
-    milvus_port: str = os.getenv("MILVUS_PORT", "19530")
-    milvus_collection: str = os.getenv("MILVUS_COLLECTION", "default_collection")
+    milvus_host: str = field(default_factory=_env("MILVUS_HOST", "127.0.0.1"))
+    milvus_port: str = field(default_factory=_env("MILVUS_PORT", "19530"))
+    milvus_collection: str = field(default_factory=_env("MILVUS_COLLECTION", "default_collection"))
     vector_dim: int = 1536
+    tenant: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "Tenant whose documents are indexed and searched. Searches without a tenant "
+            "cover the whole collection; indexing without one stores documents for the default tenant."
+        },
+    )
+    tenant_partitioning: Literal["partition_key", "partitions"] = field(
+        default_factory=_env("MILVUS_TENANT_PARTITIONING", "partition_key"),
+        metadata={
+            "description": "How new collections separate tenants: a partition key hashed into "
+            "milvus_num_partitions partitions (many tenants), or one named partition per tenant that "
+            "can be loaded and released on its own (a few large tenants)."
+        },
+    )
+    milvus_num_partitions: int = field(
+        default_factory=_env("MILVUS_NUM_PARTITIONS", "64", int),
+        metadata={"description": "Partitions of new partition-key collections."},
+    )
     
     embedding_model: str = field(
         default="openai/text-embedding-3-small",
-        metadata={"description": "Name of the embedding model to use."},
+        metadata={
+            "description": "Name of the embedding model to use. Use 'local/<sentence-transformers model>' "
+            "(e.g. 'local/all-MiniLM-L6-v2') to embed on CPU without calling the OpenAI API."
+        },
+    )
+    vector_storage: Literal["float32", "float16", "bfloat16", "int8", "binary"] = field(
+        default="float32",
+        metadata={
+            "description": "How embeddings are stored in Milvus: float32, half precision (float16/bfloat16, 2x smaller), "
+            "int8 scalar quantization (4x smaller) or binary sign bits with int8 rescoring (32x smaller index)."
+        },
+    )
+    binary_rescore_factor: int = field(
+        default=4,
+        metadata={"description": "Candidates fetched per requested hit before rescoring binary vectors."},
+    )
+    max_history_messages: int = field(
+        default=8,
+        metadata={"description": "Most recent messages sent verbatim to the router and supervisor models."},
+    )
+    summary_batch_size: int = field(
+        default=4,
+        metadata={"description": "Messages older than the window that are folded into the rolling summary at once."},
+    )
+    max_inline_payload_chars: int = field(
+        default=1000,
+        metadata={"description": "Tool results longer than this are stored by reference instead of inline in messages."},
     )
     search_params: dict = field(
         default_factory=lambda: {"metric_type": "L2", "nprobe": 10},
@@ -36,13 +109,112 @@ class BaseConfiguration:
         metadata={"description": "Default retriever provider used by derived configurations."},
     )
 
+    def __post_init__(self) -> None:
+        """Validate the fields."""
+        self.validate()
+
+    def validate(self) -> None:
+        """Check every field against its type annotation.
+
+        Raises:
+            ConfigurationError: For the first field whose value does not match.
+        """
+        for name, hint in _type_hints(type(self)).items():
+            value = getattr(self, name)
+            if not _matches(value, hint):
+                raise ConfigurationError(
+                    f"Invalid configuration value for '{name}': {value!r} (expected {_describe(hint)})."
+                )
+
     @classmethod
     def from_runnable_config(
         cls: Type[T], config: Optional[RunnableConfig] = None
     ) -> T:
+        """Resolve the configuration of ``config``, reusing the instance built for the same values.
+
+        The returned instance is shared between calls and must not be modified.
+        """
         config = ensure_config(config)
         configurable = config.get("configurable") or {}
-        _fields = {f.name for f in fields(cls) if f.init}
-        
+        _fields = _init_fields(cls)
         kwargs = {k: v for k, v in configurable.items() if k in _fields}
-        return cls(**kwargs)
\ No newline at end of file
+        try:
+            key = (cls, frozenset((k, _freeze(v)) for k, v in kwargs.items()))
+        except TypeError:
+            # Values that cannot be hashed are resolved without the cache.
+            return cls(**kwargs)
+        with _cache_lock:
+            cached = _cache.get(key)
+            if cached is not None:
+                _cache.move_to_end(key)
+                return cached
+        resolved = cls(**kwargs)
+        with _cache_lock:
+            _cache[key] = resolved
+            if len(_cache) > CONFIG_CACHE_SIZE:
+                _cache.popitem(last=False)
+        return resolved
+
+
+_cache: "OrderedDict[tuple, BaseConfiguration]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def reload_configuration(env_file: Optional[str] = None) -> None:
+    """Forget resolved configurations so the next resolution reads the environment again.
+
+    With ``env_file`` the file is loaded first, overriding the current
+    environment, so edited settings apply without a restart.
+    """
+    if env_file:
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file, override=True)
+    with _cache_lock:
+        _cache.clear()
+
+
+@cache
+def _init_fields(cls: type) -> frozenset:
+    return frozenset(f.name for f in fields(cls) if f.init)
+
+
+@cache
+def _type_hints(cls: type) -> dict:
+    hints = get_type_hints(cls)
+    return {f.name: hints[f.name] for f in fields(cls) if f.name in hints}
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable cache key for ``value``, tagged with types so True, 1 and 1.0 resolve separately."""
+    if isinstance(value, dict):
+        return dict, frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(_freeze(v) for v in value)
+    hash(value)
+    return type(value), value
+
+
+def _matches(value: Any, hint: Any) -> bool:
+    origin = get_origin(hint)
+    if hint is Any:
+        return True
+    if origin is Literal:
+        return value in get_args(hint)
+    if origin is Union or origin is types.UnionType:
+        return any(_matches(value, arg) for arg in get_args(hint))
+    if origin is not None:
+        return isinstance(value, origin) if isinstance(origin, type) else True
+    if hint is type(None):
+        return value is None
+    if hint is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if hint is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, hint) if isinstance(hint, type) else True
+
+
+def _describe(hint: Any) -> str:
+    if get_origin(hint) is Literal:
+        return " | ".join(repr(arg) for arg in get_args(hint))
+    return getattr(hint, "__name__", None) or str(hint)
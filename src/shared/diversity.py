@@ -0,0 +1,87 @@
+"""Post-retrieval diversity: near-duplicate collapse and MMR reranking.
+
+Overlapping chunks and duplicated documents come back from the vector
+search as near-identical hits. Each one costs its own grading call and room
+in the generation context without adding information. Working on the hit
+vectors returned by the search:
+
+- ``collapse_near_duplicates`` keeps the best-ranked hit of every group
+  whose cosine similarity reaches a threshold;
+- ``mmr`` reorders hits by maximal marginal relevance, trading similarity
+  to the query against similarity to the hits already picked.
+
+Similarities are computed as one matrix product over the unit-normalized
+vectors, so the cost is a single (n x d) @ (d x n) for n hits.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def collapse_near_duplicates(vectors: np.ndarray, threshold: float) -> List[int]:
+    """Return the indices of the rows to keep, in order; a row is dropped when an earlier kept row is at least ``threshold`` similar.
+
+    Rows are expected in rank order, so each group keeps its best-ranked hit.
+    """
+    n = len(vectors)
+    if n < 2:
+        return list(range(n))
+    unit = _unit(vectors)
+    duplicate = np.triu(unit @ unit.T >= threshold, k=1)
+    keep = np.ones(n, dtype=bool)
+    for i in range(n):
+        if keep[i]:
+            keep &= ~duplicate[i]
+    return np.flatnonzero(keep).tolist()
+
+
+def mmr(
+    query: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.7
+) -> List[int]:
+    """Return the indices of ``k`` rows picked by maximal marginal relevance.
+
+    Each step picks the row maximizing
+    ``lambda_mult * sim(query, row) - (1 - lambda_mult) * max sim(row, picked)``;
+    ``lambda_mult=1`` is plain relevance order, lower values favour diversity.
+    """
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    unit = _unit(vectors)
+    relevance = unit @ _unit(query)
+    similarity = unit @ unit.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    for _ in range(k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+def diversify(
+    query: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    dedup_threshold: Optional[float] = None,
+    mmr_lambda: Optional[float] = None,
+) -> List[int]:
+    """Return the indices of at most ``k`` hits after near-duplicate collapse and, with ``mmr_lambda``, MMR reranking."""
+    indices = list(range(len(vectors)))
+    if dedup_threshold is not None:
+        indices = collapse_near_duplicates(vectors, dedup_threshold)
+    if mmr_lambda is not None:
+        order = mmr(query, np.asarray(vectors)[indices], k, mmr_lambda)
+        return [indices[i] for i in order]
+    return indices[:k]
@@ -0,0 +1,158 @@
+"""Compact message history for router and supervisor prompts.
+
+Prompts built from ``state.messages`` grow with every turn. This module keeps
+them close to a fixed size:
+
+- only the last ``max_messages`` messages are sent verbatim (the window);
+- older turns are folded into a rolling summary stored in the state and
+  removed from the message list;
+- large tool payloads (search results, scraped pages) are kept in the state
+  under a ``payload:<hash>`` reference, and the message carries only a short
+  preview and the reference.
+"""
+
+import hashlib
+import json
+from typing import Any, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AnyMessage,
+    RemoveMessage,
+    ToolMessage,
+    get_buffer_string,
+)
+
+from src.services.resilience import ainvoke_with_retry
+
+PAYLOAD_REF_PREFIX = "payload:"
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an assistant.
+
+Keep every fact, preference and open question that later turns may depend on, and drop small talk. \
+Answer with the updated summary only, in at most 200 words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+def window_messages(
+    messages: Sequence[AnyMessage], max_messages: int, keep_first: bool = False
+) -> list[AnyMessage]:
+    """Return the last ``max_messages`` messages.
+
+    Args:
+        messages: The full message history.
+        max_messages: Maximum number of messages to return.
+        keep_first: Also keep the first message (e.g. the task given to a
+            supervisor), counted against ``max_messages``.
+    """
+    messages = list(messages)
+    if len(messages) <= max_messages:
+        return messages
+    head = messages[:1] if keep_first else []
+    start = len(messages) - max(1, max_messages - len(head))
+    # A tool result is meaningless without the tool call that produced it.
+    while start < len(messages) - 1 and isinstance(messages[start], ToolMessage):
+        start += 1
+    return head + messages[start:]
+
+
+def messages_to_summarize(
+    messages: Sequence[AnyMessage], max_messages: int, batch_size: int
+) -> list[AnyMessage]:
+    """Messages older than the window, once at least ``batch_size`` of them have piled up.
+
+    Folding in batches keeps the summarization call off most turns.
+    """
+    overflow = len(messages) - max_messages
+    if overflow < max(1, batch_size):
+        return []
+    # Do not separate a tool call from its results.
+    while overflow < len(messages) - 1 and isinstance(messages[overflow], ToolMessage):
+        overflow += 1
+    return list(messages[:overflow])
+
+
+async def summarize_messages(
+    model: BaseChatModel, summary: str, messages: Sequence[AnyMessage], *, endpoint: str
+) -> str:
+    """Fold ``messages`` into the running ``summary``."""
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(empty)", messages=get_buffer_string(messages)
+    )
+    response = await ainvoke_with_retry(model, prompt, endpoint=endpoint)
+    return str(response.content).strip()
+
+
+def remove_messages(messages: Sequence[AnyMessage]) -> list[RemoveMessage]:
+    """``add_messages`` updates that delete ``messages`` from the state."""
+    return [RemoveMessage(id=message.id) for message in messages if message.id]
+
+
+def history_prompt(
+    system_prompt: str,
+    messages: Sequence[AnyMessage],
+    *,
+    max_messages: int,
+    summary: str = "",
+    keep_first: bool = False,
+) -> list[Any]:
+    """System prompt, running summary and the windowed history, ready for ``ainvoke``."""
+    prompt: list[Any] = [{"role": "system", "content": system_prompt}]
+    if summary:
+        prompt.append(
+            {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}",
+            }
+        )
+    return prompt + window_messages(messages, max_messages, keep_first=keep_first)
+
+
+def merge_payloads(
+    existing: Optional[dict[str, Any]], new: Optional[dict[str, Any]]
+) -> dict[str, Any]:
+    """State reducer for stored payloads."""
+    return {**(existing or {}), **(new or {})}
+
+
+def _serialize(payload: Any) -> str:
+    if isinstance(payload, str):
+        return payload
+    return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def offload_payload(
+    label: str, payload: Any, max_inline_chars: int
+) -> tuple[str, dict[str, Any]]:
+    """Message content for a tool payload, storing it by reference when it is large.
+
+    Args:
+        label: Short description of the payload, e.g. "Search result".
+        payload: The raw tool output.
+        max_inline_chars: Payloads up to this size are inlined in the message.
+
+    Returns:
+        tuple[str, dict[str, Any]]: The message content and the ``payloads``
+        state update (empty when the payload was inlined).
+    """
+    text = _serialize(payload)
+    if len(text) <= max_inline_chars:
+        return f"{label}: {text}", {}
+    ref = PAYLOAD_REF_PREFIX + hashlib.sha1(text.encode()).hexdigest()[:12]
+    preview = text[:max_inline_chars].rstrip()
+    content = f"{label} ({len(text)} chars, stored as {ref}): {preview}…"
+    return content, {ref: payload}
+
+
+def resolve_payload(payloads: dict[str, Any], value: Any) -> Any:
+    """Return the payload ``value`` refers to, or ``value`` itself when it is not a reference."""
+    if not (isinstance(value, str) and value.startswith(PAYLOAD_REF_PREFIX)):
+        return value
+    if value not in payloads:
+        raise KeyError(f"Unknown payload reference {value}")
+    return payloads[value]
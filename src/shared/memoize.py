@@ -0,0 +1,244 @@
+"""Memoized LLM decisions for graph nodes.
+
+Within one run and across runs the same (question, document) pairs are
+graded again, the same questions are rewritten again and the same
+conversations are routed again. ``memoize`` caches the outputs of these
+deterministic node steps under a stable hash of their inputs and of the
+configuration the result depends on (model, prompt), so a change of model
+or prompt never serves a stale answer.
+
+Backends, selected per run with ``memo_backend``:
+
+- ``MemoryBackend``: a per-process LRU with per-entry expiry;
+- ``SqliteBackend``: a SQLite table shared by processes and kept across
+  restarts (``memo_path``).
+
+Entries expire after ``memo_ttl_seconds``. Values must be JSON-serializable.
+Hits and misses are recorded as ``memo.calls{task,result}``.
+"""
+
+import asyncio
+import dataclasses
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from src.services.metrics import metrics
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+
+def _canonical(value: Any) -> Any:
+    """JSON-ready form of ``value`` that only depends on its content."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    # Messages carry random ids; only their role and content identify them.
+    if hasattr(value, "type") and hasattr(value, "content"):
+        return {"type": value.type, "content": _canonical(value.content)}
+    if hasattr(value, "page_content"):
+        return {
+            "page_content": value.page_content,
+            "metadata": _canonical(getattr(value, "metadata", {})),
+        }
+    if dataclasses.is_dataclass(value):
+        return _canonical(dataclasses.asdict(value))
+    return str(value)
+
+
+def stable_key(task: str, *parts: Any) -> str:
+    """Hash of ``task`` and ``parts`` that is the same in every process."""
+    body = json.dumps(
+        [task, _canonical(parts)],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class MemoBackend(Protocol):
+    """Storage for memoized node results."""
+
+    def get(self, key: str) -> Any:
+        """Return the stored value, or ``_MISSING`` when absent or expired."""
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+
+
+class MemoryBackend:
+    """Thread-safe LRU of at most ``maxsize`` entries, each expiring ``ttl`` seconds after it was set."""
+
+    def __init__(self, maxsize: int = 4096):
+        """Hold at most ``maxsize`` entries."""
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """Return the stored value, or ``_MISSING`` when absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store ``value`` under ``key`` for ``ttl`` seconds, evicting the oldest entries."""
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        """Return the number of entries, including expired ones."""
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """Entries in a SQLite table, shared by every process using the same file.
+
+    At most ``maxsize`` entries are kept: expired entries, then the oldest
+    ones, are deleted when the table grows past it.
+    """
+
+    def __init__(self, path: str, maxsize: int = 100_000):
+        """Open or create the table in the SQLite file at ``path``."""
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS node_memo "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Any:
+        """Return the stored value, or ``_MISSING`` when absent or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM node_memo WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else _MISSING
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO node_memo (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now + ttl),
+            )
+            self._writes += 1
+            # Pruning scans the table, so only check the size every few hundred writes.
+            if self._writes % 256 == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self._conn.execute("DELETE FROM node_memo WHERE expires_at <= ?", (now,))
+        excess = (
+            self._conn.execute("SELECT COUNT(*) FROM node_memo").fetchone()[0]
+            - self.maxsize
+        )
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM node_memo WHERE key IN (SELECT key FROM node_memo ORDER BY created_at LIMIT ?)",
+                (excess,),
+            )
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._conn.close()
+
+
+@functools.cache
+def get_memo_backend(
+    kind: str, path: str = "", maxsize: int = 4096
+) -> Optional[MemoBackend]:
+    """Return the process-wide backend for a ``memo_backend`` setting; None when memoization is off."""
+    if kind == "off":
+        return None
+    if kind == "memory":
+        return MemoryBackend(maxsize)
+    if kind == "sqlite":
+        return SqliteBackend(path, maxsize)
+    raise ValueError(f"Unknown memo backend: {kind}")
+
+
+def memoize(
+    task: str, depends_on: Callable[[Any], Sequence[Any]]
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Cache an async ``fn(configuration, *args)`` by ``args`` and ``depends_on(configuration)``.
+
+    ``configuration`` selects the backend and TTL (``memo_backend``,
+    ``memo_path``, ``memo_max_entries``, ``memo_ttl_seconds``);
+    ``depends_on`` returns the configuration values the result depends on,
+    such as the model and prompt. Failures are not cached.
+    """
+
+    def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(fn)
+        async def wrapper(configuration: Any, *args: Any) -> T:
+            if configuration.memo_backend == "off":
+                return await fn(configuration, *args)
+            # SQLite calls can wait on other processes' writes (busy_timeout); keep them off the event loop.
+            blocking = configuration.memo_backend == "sqlite"
+
+            async def call(method: Callable[..., Any], *call_args: Any) -> Any:
+                return (
+                    await asyncio.to_thread(method, *call_args)
+                    if blocking
+                    else method(*call_args)
+                )
+
+            backend = await call(
+                get_memo_backend,
+                configuration.memo_backend,
+                configuration.memo_path,
+                configuration.memo_max_entries,
+            )
+            key = stable_key(task, depends_on(configuration), args)
+            value = await call(backend.get, key)
+            if value is not _MISSING:
+                metrics.incr("memo.calls", task=task, result="hit")
+                return value
+            metrics.incr("memo.calls", task=task, result="miss")
+            value = await fn(configuration, *args)
+            await call(backend.set, key, value, configuration.memo_ttl_seconds)
+            return value
+
+        return wrapper
+
+    return decorator
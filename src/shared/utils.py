@@ -1,9 +1,13 @@
-from typing import Optional
+import threading
+from collections import OrderedDict
+from functools import cache
+from typing import Hashable, Optional
 
 from langchain.chat_models import init_chat_model
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseChatModel
 
+
 def _format_doc(doc: Document) -> str:
     """Format a single document as XML.
 
@@ -20,6 +24,62 @@ def _format_doc(doc: Document) -> str:
 
     return f"<document{meta}>\n{doc.page_content}\n</document>"
 
+class _RenderCache:
+    """Small thread-safe LRU cache for rendered document strings."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict[Hashable, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+_rendered_docs = _RenderCache(maxsize=4096)
+_rendered_contexts = _RenderCache(maxsize=256)
+
+
+def _doc_key(doc: Document) -> Optional[Hashable]:
+    """Cache key for a rendered document, or None when its metadata is not hashable.
+
+    Documents carry a content-derived ``uuid`` once they pass through
+    ``reduce_docs``; otherwise the content itself identifies them (str hashes
+    are cached, so this is cheap). The metadata is part of the key because it
+    is rendered too.
+    """
+    metadata = doc.metadata or {}
+    try:
+        frozen = tuple(sorted(metadata.items()))
+        hash(frozen)
+    except TypeError:
+        return None
+    return (metadata.get("uuid") or doc.page_content, frozen)
+
+
+def render_doc(doc: Document) -> str:
+    """``_format_doc`` memoized by document identity."""
+    key = _doc_key(doc)
+    if key is None:
+        return _format_doc(doc)
+    rendered = _rendered_docs.get(key)
+    if rendered is None:
+        rendered = _format_doc(doc)
+        _rendered_docs.put(key, rendered)
+    return rendered
+
+
 def format_docs(docs: Optional[list[Document]]) -> str:
     """Format a list of documents as XML.
 
@@ -48,10 +108,19 @@ def format_docs(docs: Optional[list[Document]]) -> str:
     """
     if not docs:
         return "<documents></documents>"
-    formatted = "\n".join(_format_doc(doc) for doc in docs)
-    return f"""<documents>
+    # Re-running generation on the same documents reuses the whole context string.
+    keys = tuple(_doc_key(doc) for doc in docs)
+    if None not in keys:
+        context = _rendered_contexts.get(keys)
+        if context is not None:
+            return context
+    formatted = "\n".join(render_doc(doc) for doc in docs)
+    context = f"""<documents>
 {formatted}
 </documents>"""
+    if None not in keys:
+        _rendered_contexts.put(keys, context)
+    return context
 
 def load_chat_model(fully_specified_name: str) -> BaseChatModel:
     """Load a chat model from a fully specified name.
@@ -64,4 +133,11 @@ def load_chat_model(fully_specified_name: str) -> BaseChatModel:
     else:
         provider = ""
         model = fully_specified_name
-    return init_chat_model(model, model_provider=provider)
\ No newline at end of file
+    # Retries go through src.services.resilience, so the client's own retry
+    # loop is disabled to avoid multiplying attempts.
+    return init_chat_model(model, model_provider=provider, max_retries=0)
+
+@cache
+def get_chat_model(fully_specified_name: str) -> BaseChatModel:
+    """Shared ``load_chat_model`` instance, so concurrent runs reuse one client and its connection pool."""
+    return load_chat_model(fully_specified_name)
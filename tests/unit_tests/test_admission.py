@@ -0,0 +1,183 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.admission import (
+    AdmissionController,
+    AdmissionSettings,
+    ModelLimits,
+    TokenBucket,
+)
+
+
+def _controller(**kwargs) -> AdmissionController:
+    settings = AdmissionSettings(endpoint_concurrency={"query": 1}, **kwargs)
+    return AdmissionController(settings)
+
+
+def test_full_queue_is_shed_with_429():
+    async def scenario():
+        admission = _controller(queue_size=0, queue_timeout=1.0)
+        async with admission.admit("query"):
+            with pytest.raises(HTTPException) as exc:
+                async with admission.admit("query"):
+                    pass
+        return exc.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert "Retry-After" in error.headers
+
+
+def test_queue_timeout_is_shed_with_503():
+    async def scenario():
+        admission = _controller(queue_size=1, queue_timeout=0.05)
+        async with admission.admit("query"):
+            with pytest.raises(HTTPException) as exc:
+                async with admission.admit("query"):
+                    pass
+        return exc.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_rate_limited_model_is_shed_with_429():
+    async def scenario():
+        admission = _controller(
+            queue_timeout=0.05,
+            model_limits={"openai/gpt-4o-mini": ModelLimits(rpm=60)},
+        )
+        async with admission.admit("query", model="openai/gpt-4o-mini", requests=60):
+            pass
+        with pytest.raises(HTTPException) as exc:
+            async with admission.admit("query", model="openai/gpt-4o-mini", requests=1):
+                pass
+        return exc.value
+
+    assert asyncio.run(scenario()).status_code == 429
+
+
+def test_token_bucket_waits_for_refill():
+    async def scenario():
+        bucket = TokenBucket(rate=100.0, capacity=1.0)
+        assert await bucket.acquire(1, timeout=0) is None
+        assert await bucket.acquire(1, timeout=0) is not None
+        return await bucket.acquire(1, timeout=0.1)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_waiting_request_does_not_hold_up_rejections():
+    async def scenario():
+        bucket = TokenBucket(rate=2.0, capacity=1.0)
+        await bucket.acquire(1, timeout=0)
+        waiter = asyncio.create_task(bucket.acquire(1, timeout=1.0))
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        # Queued behind the waiter's reservation, and rejected without waiting for it.
+        assert await bucket.acquire(1, timeout=0.1) is not None
+        elapsed = time.perf_counter() - started
+        waiter.cancel()
+        return elapsed
+
+    assert asyncio.run(scenario()) < 0.1
+
+
+def test_request_and_token_limits_share_one_deadline():
+    async def scenario():
+        limits = ModelLimits(rpm=600, tpm=600)
+        admission = _controller(
+            queue_timeout=0.15, model_limits={"openai/gpt-4o-mini": limits}
+        )
+        async with admission.admit(
+            "query", model="openai/gpt-4o-mini", requests=600, tokens=600
+        ):
+            pass
+        started = time.perf_counter()
+        # Each bucket needs 0.1s to refill: served after one wait, not two.
+        async with admission.admit(
+            "query", model="openai/gpt-4o-mini", requests=1, tokens=1
+        ):
+            pass
+        elapsed = time.perf_counter() - started
+        # A request over the token budget is shed without spending its request budget.
+        with pytest.raises(HTTPException):
+            async with admission.admit(
+                "query", model="openai/gpt-4o-mini", requests=1, tokens=600
+            ):
+                pass
+        return elapsed, admission._buckets["model:openai/gpt-4o-mini:rpm"].wait_time(1)
+
+    elapsed, rpm_wait = asyncio.run(scenario())
+    assert 0.09 < elapsed < 0.18
+    assert rpm_wait < 0.15
+
+
+def test_stages_share_one_queue_timeout():
+    async def scenario():
+        admission = _controller(
+            queue_timeout=0.2,
+            model_limits={"openai/gpt-4o-mini": ModelLimits(concurrency=1)},
+        )
+
+        async def hold(endpoint, seconds, model=None):
+            async with admission.admit(endpoint, model=model):
+                await asyncio.sleep(seconds)
+
+        holders = [
+            asyncio.create_task(hold("query", 0.15)),
+            asyncio.create_task(hold("index", 1.0, model="openai/gpt-4o-mini")),
+        ]
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        # Waits 0.15s for the endpoint, then only the 0.05s left for the model.
+        with pytest.raises(HTTPException) as exc:
+            async with admission.admit("query", model="openai/gpt-4o-mini"):
+                pass
+        elapsed = time.perf_counter() - started
+        for holder in holders:
+            holder.cancel()
+        await asyncio.gather(*holders, return_exceptions=True)
+        return exc.value.status_code, elapsed
+
+    status_code, elapsed = asyncio.run(scenario())
+    assert status_code == 503
+    assert elapsed < 0.3
+
+
+def test_index_reserves_one_request_per_embedding_batch(monkeypatch):
+    from contextlib import asynccontextmanager
+
+    from fastapi import Response
+
+    from src.api.routes import index_documents
+    from src.api.schemas import DocumentRequest
+
+    monkeypatch.setenv("EMBEDDING_BATCH_SIZE", "32")
+    admitted = {}
+
+    class RecordingAdmission:
+        @asynccontextmanager
+        async def admit(self, endpoint, **kwargs):
+            admitted.update(kwargs)
+            yield
+
+    class FakeGraph:
+        checkpointer = None
+
+        async def ainvoke(self, graph_input, config=None, **kwargs):
+            return {}
+
+    request = DocumentRequest(documents=[f"document {i}" for i in range(100)])
+    asyncio.run(
+        index_documents(
+            request,
+            Response(),
+            graph=FakeGraph(),
+            admission=RecordingAdmission(),
+            x_profile=None,
+        )
+    )
+    assert admitted["requests"] == 4
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from src.scripts.bulk_index import Progress, bulk_load, iter_documents
+
+
+def _embed(texts):
+    return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def test_documents_are_read_from_json_and_jsonl(tmp_path):
+    json_file = tmp_path / "docs.json"
+    json_file.write_text(
+        json.dumps([{"page_content": "a", "metadata": {"source": "s"}}, "b"])
+    )
+    jsonl_file = tmp_path / "docs.jsonl"
+    jsonl_file.write_text(
+        '{"text": "c", "genre": "Drama", "year": 1999}\n\n{"text": "d"}\n'
+    )
+    assert list(iter_documents(str(json_file))) == [
+        Document(page_content="a", metadata={"source": "s"}),
+        Document(page_content="b"),
+    ]
+    assert [doc.metadata for doc in iter_documents(str(jsonl_file))] == [
+        {"genre": "Drama", "year": 1999},
+        {},
+    ]
+
+
+def _docs(count):
+    return [Document(page_content=str(i)) for i in range(count)]
+
+
+def _texts(batch):
+    return [doc.page_content for doc in batch]
+
+
+def test_batches_are_written_in_order(tmp_path):
+    written = []
+    stats = bulk_load(
+        _docs(10),
+        _embed,
+        lambda batch, vectors: written.append(_texts(batch)),
+        batch_size=3,
+        workers=2,
+    )
+    assert written == [["0", "1", "2"], ["3", "4", "5"], ["6", "7", "8"], ["9"]]
+    assert (stats.documents, stats.vectors, stats.batches) == (10, 10, 4)
+
+
+def test_interrupted_load_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "progress.json")
+    docs = _docs(10)
+    written = []
+
+    def failing_write(batch, vectors):
+        if batch[0].page_content == "6":
+            raise ConnectionError("milvus went away")
+        written.append(_texts(batch))
+
+    with pytest.raises(ConnectionError):
+        bulk_load(
+            docs,
+            _embed,
+            failing_write,
+            batch_size=3,
+            workers=2,
+            progress=Progress(key="k"),
+            checkpoint=checkpoint,
+        )
+
+    progress = Progress.load(checkpoint, "k")
+    assert (progress.batches, progress.documents) == (2, 6)
+    bulk_load(
+        docs,
+        _embed,
+        lambda b, v: written.append(_texts(b)),
+        batch_size=3,
+        progress=progress,
+        checkpoint=checkpoint,
+    )
+    assert sum(written, []) == _texts(docs)
+    assert Progress.load(checkpoint, "other").batches == 0
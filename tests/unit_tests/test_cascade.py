@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.evaluation.stand_ins import HashingEmbeddings
+from src.services.metrics import metrics
+from src.shared.cascade import (
+    CentroidClassifier,
+    LocalDecision,
+    SimilarityGate,
+    cascade,
+    decide_locally,
+)
+
+embed = HashingEmbeddings(dim=256).generate_embeddings
+
+
+@pytest.fixture(autouse=True)
+def _reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_centroid_classifier_reports_its_margin():
+    classifier = CentroidClassifier(
+        embed,
+        {
+            "movie": ["who directed the movie", "film actors cast"],
+            "general": ["weather today", "capital city"],
+        },
+        min_margin=0.2,
+    )
+    decision = classifier.classify("which actors are in the film")
+    assert decision.guess == "movie" and decision.confident
+    assert not classifier.classify("hello there").confident
+
+
+def test_similarity_gate_leaves_the_middle_band_to_the_llm():
+    gate = SimilarityGate(embed, high=0.8, low=0.1)
+    same, unrelated, partial = gate.decide(
+        "dune score composer",
+        ["dune score composer", "pasta recipe tomato", "dune desert planet spice"],
+    )
+    assert (same.guess, same.confident) == ("yes", True)
+    assert (unrelated.guess, unrelated.confident) == ("no", True)
+    assert not partial.confident
+
+
+def test_cascade_escalates_only_uncertain_decisions_and_records_agreement():
+    calls = []
+
+    async def llm():
+        calls.append(1)
+        return "no"
+
+    async def run():
+        assert await cascade("grade", LocalDecision("yes", 0.9, True), llm) == "yes"
+        assert await cascade("grade", LocalDecision("yes", 0.5, False), llm) == "no"
+        assert await cascade("grade", None, llm) == "no"
+        # Audited decisions are confident but still checked; the LLM's answer wins.
+        assert (
+            await cascade("grade", LocalDecision("no", 0.9, True), llm, audit_rate=1.0)
+            == "no"
+        )
+
+    asyncio.run(run())
+    counters = metrics.snapshot()["counters"]
+    assert len(calls) == 3
+    assert counters["cascade.calls{path=local,task=grade}"] == 1
+    assert counters["cascade.calls{path=escalated,task=grade}"] == 2
+    assert counters["cascade.calls{path=audited,task=grade}"] == 1
+    assert counters["cascade.agreement{agree=false,confident=false,task=grade}"] == 1
+    assert counters["cascade.agreement{agree=true,confident=true,task=grade}"] == 1
+
+
+def test_a_failing_local_classifier_defers_to_the_llm():
+    def broken(text):
+        raise RuntimeError("model not installed")
+
+    assert asyncio.run(decide_locally("router", broken, "hi")) is None
+    assert metrics.snapshot()["counters"]["cascade.errors{task=router}"] == 1
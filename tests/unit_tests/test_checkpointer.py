@@ -0,0 +1,74 @@
+import asyncio
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from src.shared.checkpointer import (
+    CompressedSerializer,
+    checkpoint_kwargs,
+    close_checkpointer,
+    open_checkpointer,
+    resume_or_start,
+)
+
+
+def test_large_blobs_are_compressed_and_round_trip():
+    serde = CompressedSerializer(min_size=64)
+    value = {"text": "x" * 4096}
+    type_, data = serde.dumps_typed(value)
+    assert type_.endswith("+zlib")
+    assert len(data) < 4096
+    assert serde.loads_typed((type_, data)) == value
+
+    small = serde.dumps_typed({"a": 1})
+    assert not small[0].endswith("+zlib")
+    assert serde.loads_typed(small) == {"a": 1}
+
+
+class _State(TypedDict):
+    steps: str
+
+
+def test_failed_run_resumes_from_last_checkpoint(tmp_path):
+    calls = {"first": 0, "second": 0}
+
+    async def first(state):
+        calls["first"] += 1
+        return {"steps": state["steps"] + "1"}
+
+    async def second(state):
+        calls["second"] += 1
+        if calls["second"] == 1:
+            raise RuntimeError("crash")
+        return {"steps": state["steps"] + "2"}
+
+    workflow = StateGraph(_State)
+    workflow.add_node(first)
+    workflow.add_node(second)
+    workflow.add_edge(START, "first")
+    workflow.add_edge("first", "second")
+    workflow.add_edge("second", END)
+
+    async def scenario():
+        checkpointer = await open_checkpointer(str(tmp_path / "checkpoints.sqlite"))
+        try:
+            graph = workflow.compile(checkpointer=checkpointer)
+            config = {"configurable": {"thread_id": "t1"}}
+            try:
+                await graph.ainvoke(
+                    await resume_or_start(graph, {"steps": ""}, config),
+                    config,
+                    **checkpoint_kwargs(),
+                )
+            except RuntimeError:
+                pass
+            return await graph.ainvoke(
+                await resume_or_start(graph, {"steps": ""}, config),
+                config,
+                **checkpoint_kwargs(),
+            )
+        finally:
+            await close_checkpointer()
+
+    assert asyncio.run(scenario()) == {"steps": "12"}
+    assert calls == {"first": 1, "second": 2}
@@ -1,5 +1,77 @@
+import pytest
+
 from agent.configuration import Configuration
+from src.shared.configuration import ConfigurationError, reload_configuration
 
 
 def test_configuration_empty() -> None:
     Configuration.from_runnable_config({})
+
+
+def test_configuration_is_cached_per_configurable_values() -> None:
+    first = Configuration.from_runnable_config(
+        {"configurable": {"thread_id": "a", "top_k": 5}}
+    )
+    second = Configuration.from_runnable_config(
+        {"configurable": {"thread_id": "b", "top_k": 5}}
+    )
+    assert first is second
+    assert first.top_k == 5
+    assert (
+        Configuration.from_runnable_config({"configurable": {"top_k": 6}}) is not first
+    )
+    # Unhashable values nested in dicts are frozen for the cache key.
+    config = {
+        "configurable": {"search_params": {"metric_type": "L2", "params": [1, 2]}}
+    }
+    assert Configuration.from_runnable_config(
+        config
+    ) is Configuration.from_runnable_config(config)
+
+
+def test_invalid_values_fail_at_resolution() -> None:
+    with pytest.raises(ConfigurationError, match="top_k"):
+        Configuration.from_runnable_config({"configurable": {"top_k": "3"}})
+    with pytest.raises(ConfigurationError, match="retrieval_mode"):
+        Configuration.from_runnable_config(
+            {"configurable": {"retrieval_mode": "hybrid"}}
+        )
+    Configuration.from_runnable_config(
+        {"configurable": {"tenant": None, "vector_storage": "int8"}}
+    )
+
+
+def test_validation_does_not_depend_on_cached_equal_values() -> None:
+    Configuration.from_runnable_config({"configurable": {"top_k": 1}})
+    with pytest.raises(ConfigurationError, match="top_k"):
+        Configuration.from_runnable_config({"configurable": {"top_k": 1.0}})
+    Configuration.from_runnable_config({"configurable": {"extract_filters": True}})
+    with pytest.raises(ConfigurationError, match="extract_filters"):
+        Configuration.from_runnable_config({"configurable": {"extract_filters": 1}})
+
+
+def test_malformed_environment_is_a_422(monkeypatch) -> None:
+    from fastapi import HTTPException
+
+    from src.api.routes import _resolve_configuration
+
+    monkeypatch.setenv("MILVUS_NUM_PARTITIONS", "many")
+    reload_configuration()
+    try:
+        with pytest.raises(HTTPException) as error:
+            _resolve_configuration(Configuration, {"configurable": {}})
+        assert error.value.status_code == 422
+    finally:
+        monkeypatch.delenv("MILVUS_NUM_PARTITIONS")
+        reload_configuration()
+
+
+def test_reload_reads_the_environment_again(monkeypatch) -> None:
+    monkeypatch.setenv("MILVUS_COLLECTION", "before")
+    reload_configuration()
+    assert Configuration.from_runnable_config({}).milvus_collection == "before"
+    monkeypatch.setenv("MILVUS_COLLECTION", "after")
+    assert Configuration.from_runnable_config({}).milvus_collection == "before"
+    reload_configuration()
+    assert Configuration.from_runnable_config({}).milvus_collection == "after"
+    reload_configuration()
@@ -0,0 +1,136 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from src.hierarchical_graph.content import (
+    ContentLimits,
+    NearDuplicateFilter,
+    clean_pages,
+    prepare_content,
+    strip_boilerplate,
+    truncate,
+)
+
+ARTICLE = (
+    "Dune: Part Two is a 2024 science fiction film directed by Denis Villeneuve.\n"
+    "The film was shot in Jordan and the United Arab Emirates over several months.\n"
+)
+
+
+def _page(text, title="Dune"):
+    return Document(page_content=text, metadata={"title": title})
+
+
+def test_boilerplate_lines_are_removed():
+    text = (
+        "Home\nMovies\nAccept all cookies to continue browsing this site\n\n"
+        + ARTICLE
+        + "© 2024 Example Inc.\n"
+    )
+    assert strip_boilerplate(text) == ARTICLE.strip().split("\n")
+
+
+def test_near_duplicate_paragraphs_are_detected():
+    seen = NearDuplicateFilter()
+    paragraph = "The film was shot in Jordan and the United Arab Emirates over several months of production work"
+    assert not seen.is_duplicate(paragraph)
+    assert seen.is_duplicate(paragraph.replace("production", "principal"))
+    assert not seen.is_duplicate(
+        "Critics praised the sound design, the cinematography and the performances of the cast."
+    )
+
+
+def test_pages_fit_the_size_budgets():
+    paragraphs = "\n".join(
+        f"Paragraph {i} has a few unique words about scene number {i} in it."
+        for i in range(500)
+    )
+    limits = ContentLimits(
+        max_page_chars=5000, max_total_chars=6000, summarize_above_chars=None
+    )
+    pages = asyncio.run(
+        prepare_content([_page(paragraphs, "a"), _page(ARTICLE + ARTICLE, "b")], limits)
+    )
+    assert [title for title, _ in pages] == ["a", "b"]
+    assert all(len(text) <= 3000 + len(" […]") for _, text in pages)
+    # The second page repeats itself and only keeps one copy of the article.
+    assert pages[1][1] == ARTICLE.strip()
+
+
+def test_long_pages_are_map_reduce_summarized_with_bounded_parallelism():
+    state = {"in_flight": 0, "peak": 0, "calls": 0}
+
+    class FakeModel:
+        async def ainvoke(self, prompt, **kwargs):
+            state["calls"] += 1
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            await asyncio.sleep(0.01)
+            state["in_flight"] -= 1
+            return AIMessage(content="summary")
+
+    text = "\n".join(
+        f"Sentence {i} describes another distinct scene of the movie in detail."
+        for i in range(400)
+    )
+    limits = ContentLimits(
+        chunk_chars=2000, summarize_above_chars=1000, max_concurrency=3
+    )
+    pages = asyncio.run(prepare_content([_page(text)], limits, model=FakeModel()))
+    assert pages == [("Dune", "summary")]
+    assert state["peak"] <= 3
+    # One call per chunk plus the reduce step.
+    assert state["calls"] > 2
+
+
+def test_truncate_cuts_at_a_boundary():
+    assert truncate("short", 10) == "short"
+    assert truncate("first line\nsecond line", 15) == "first line […]"
+
+
+def test_boilerplate_banners_and_link_bars_are_removed():
+    lines = [
+        "We use cookies to improve your experience on our website.",
+        "Subscribe to our newsletter for weekly updates!",
+        "Please enable JavaScript to view this page.",
+        "Privacy Policy | Terms of Use | Cookie Settings",
+        "Copyright 2024 Example Media Group.",
+        "Example Media Group. All rights reserved.",
+    ]
+    assert strip_boilerplate("\n".join(lines)) == []
+
+
+def test_sentences_mentioning_boilerplate_words_are_kept():
+    lines = [
+        "The catalog includes over 300 titles from the studio's golden era.",
+        "Bake the cookies at 180 degrees for twelve minutes.",
+        "React is a JavaScript library for building user interfaces.",
+        "She chose to subscribe to the magazine after reading its film reviews.",
+        "The hacker needed a login to the studio's archive in the second act.",
+    ]
+    assert strip_boilerplate("\n".join(lines)) == lines
+
+
+def test_short_factual_lines_are_kept():
+    lines = [
+        "Financial Results",
+        "Revenue: $4.2B",
+        "March 5, 2024",
+        "Denis Villeneuve",
+        "Box Office",
+        "Dune | 2021 | $402M",
+    ]
+    assert strip_boilerplate("\n".join(lines)) == lines
+
+
+def test_menus_and_navigation_repeated_across_pages_are_removed():
+    page = "Home\nMovies\nTV Shows\nReviews\n" + ARTICLE
+    assert strip_boilerplate(page) == ARTICLE.strip().split("\n")
+
+    other = "Top Picks\nCritics praised the sound design and the score of the film.\n"
+    pages = clean_pages(
+        [_page("Top Picks\n" + ARTICLE, "a"), _page(other, "b")],
+        ContentLimits(summarize_above_chars=None),
+    )
+    assert pages == [("a", ARTICLE.strip()), ("b", other.split("\n")[1])]
@@ -0,0 +1,31 @@
+import numpy as np
+
+from src.shared.diversity import collapse_near_duplicates, diversify, mmr
+
+
+def _vectors():
+    # Rows 0 and 1 are near-identical; row 2 points elsewhere; row 3 duplicates row 2.
+    return np.array(
+        [[1.0, 0.0, 0.0], [0.99, 0.05, 0.0], [0.0, 1.0, 0.0], [0.0, 0.98, 0.1]],
+        dtype=np.float32,
+    )
+
+
+def test_near_duplicates_keep_the_best_ranked_hit():
+    assert collapse_near_duplicates(_vectors(), 0.95) == [0, 2]
+    assert collapse_near_duplicates(_vectors(), 0.9999) == [0, 1, 2, 3]
+    assert collapse_near_duplicates(_vectors()[:1], 0.95) == [0]
+
+
+def test_mmr_trades_relevance_for_diversity():
+    query = np.array([1.0, 0.2, 0.0], dtype=np.float32)
+    assert mmr(query, _vectors(), 2, lambda_mult=1.0) == [1, 0]
+    assert mmr(query, _vectors(), 2, lambda_mult=0.5)[1] in (2, 3)
+    assert mmr(query, _vectors(), 0) == []
+
+
+def test_diversify_combines_both_stages():
+    query = np.array([1.0, 0.2, 0.0], dtype=np.float32)
+    assert diversify(query, _vectors(), 3, dedup_threshold=0.95) == [0, 2]
+    assert diversify(query, _vectors(), 1, dedup_threshold=0.95, mmr_lambda=0.7) == [0]
+    assert diversify(query, _vectors(), 2) == [0, 1]
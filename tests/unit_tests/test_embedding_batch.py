@@ -0,0 +1,76 @@
+import base64
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.services.embedding_handler import (
+    EmbeddingBatch,
+    EmbeddingHandler,
+    decode_base64_embeddings,
+)
+from src.services.quantization import as_float32_matrix
+
+
+def _vectors(texts, dim=1536):
+    rng = np.random.default_rng(len(texts))
+    return rng.normal(size=(len(texts), dim)).astype(np.float32)
+
+
+class _Embeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.requests = []
+
+    def create(self, input, model, encoding_format):
+        assert encoding_format == "base64"
+        start = sum(len(batch) for batch in self.requests)
+        self.requests.append(list(input))
+        items = [
+            SimpleNamespace(
+                index=i,
+                embedding=base64.b64encode(
+                    self.vectors[start + i].astype("<f4").tobytes()
+                ).decode(),
+            )
+            for i in range(len(input))
+        ]
+        # The API does not promise response order; rows are placed by index.
+        return SimpleNamespace(data=items[::-1])
+
+
+def test_openai_embeddings_are_batched_and_decoded_into_one_matrix():
+    texts = [f"text {i}" for i in range(70)]
+    expected = _vectors(texts)
+    handler = EmbeddingHandler(
+        model_name="openai/text-embedding-3-small", batch_size=32
+    )
+    embeddings = _Embeddings(expected)
+    handler._openai_client = SimpleNamespace(embeddings=embeddings)
+
+    batch = handler.embed(texts)
+
+    assert [len(request) for request in embeddings.requests] == [32, 32, 6]
+    assert isinstance(batch, EmbeddingBatch) and batch.model == handler.model_name
+    assert len(batch) == 70 and batch.dim == 1536 and batch.nbytes == 70 * 1536 * 4
+    np.testing.assert_array_equal(batch.vectors, expected)
+
+
+def test_batches_are_passed_on_without_copies():
+    batch = EmbeddingBatch(vectors=_vectors(["a", "b"]), model="m")
+    assert np.asarray(batch) is batch.vectors
+    assert np.shares_memory(as_float32_matrix(batch), batch.vectors)
+
+    with pytest.raises(ValueError):
+        EmbeddingBatch(vectors=np.zeros((2, 4), dtype=np.float64), model="m")
+    with pytest.raises(ValueError):
+        EmbeddingBatch(vectors=np.zeros((4, 2), dtype=np.float32).T, model="m")
+
+
+def test_decoding_rejects_wrong_dimensions():
+    out = np.empty((1, 8), dtype=np.float32)
+    item = SimpleNamespace(
+        index=0, embedding=base64.b64encode(np.zeros(4, dtype="<f4").tobytes()).decode()
+    )
+    with pytest.raises(ValueError, match="8-dimensional"):
+        decode_base64_embeddings([item], out)
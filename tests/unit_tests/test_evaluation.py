@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from src.evaluation.harness import evaluate, expand_grid, load_fixture
+from src.evaluation.metrics import agreement, recall_at_k, reciprocal_rank
+
+
+def test_retrieval_metrics():
+    retrieved = ["a", "b", "c"]
+    assert recall_at_k(retrieved, ["a", "c", "d"], 2) == pytest.approx(1 / 3)
+    assert reciprocal_rank(retrieved, ["c"]) == pytest.approx(1 / 3)
+    assert reciprocal_rank(retrieved, ["x"]) == 0.0
+
+
+def test_grader_agreement():
+    assert agreement([(True, True), (False, False)]) == (1.0, 1.0)
+    accuracy, kappa = agreement(
+        [(True, True), (True, False), (False, True), (False, False)]
+    )
+    assert accuracy == 0.5 and kappa == 0.0
+
+
+def test_grid_expansion():
+    assert expand_grid({"top_k": [1, 3], "nprobe": [4]}) == [
+        {"top_k": 1, "nprobe": 4},
+        {"top_k": 3, "nprobe": 4},
+    ]
+
+
+def test_evaluation_runs_offline_and_is_reproducible():
+    docs, cases = load_fixture()
+    cases = cases[:4]
+    settings = {"top_k": 3, "nprobe": 4}
+    first = asyncio.run(evaluate(settings, docs, cases)).summary()
+    second = asyncio.run(evaluate(settings, docs, cases)).summary()
+    for key in ("wall_p50_seconds", "wall_p95_seconds"):
+        first.pop(key), second.pop(key)
+    assert first == second
+    assert first["recall_at_k"] == 1.0
+    assert first["completion_rate"] == 1.0
+    assert first["cost_per_question"] > 0
+
+
+def test_invalid_settings_fail_before_running():
+    docs, cases = load_fixture()
+    with pytest.raises(ValueError):
+        asyncio.run(evaluate({"retrieval_mode": "hybrid"}, docs, cases))
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.services import milvus_handler
+from src.services.milvus_handler import (
+    build_filter_expr,
+    document_fields,
+    tenant_partition_name,
+)
+
+
+def test_filters_build_milvus_expressions():
+    assert build_filter_expr(None) is None
+    assert build_filter_expr({"genre": None}) is None
+    assert build_filter_expr({"genre": "Drama"}) == 'genre == "drama"'
+    assert (
+        build_filter_expr({"genre": ["drama", "comedy"]})
+        == 'genre in ["drama", "comedy"]'
+    )
+    assert (
+        build_filter_expr({"year": {"gte": 1990, "lte": "1999"}, "source": "imdb.com"})
+        == 'year >= 1990 and year <= 1999 and source == "imdb.com"'
+    )
+
+
+def test_string_values_are_escaped():
+    assert (
+        build_filter_expr({"source": 'a" or year > 0 or "'})
+        == 'source == "a\\" or year > 0 or \\""'
+    )
+
+
+def test_unknown_fields_and_operators_are_rejected():
+    with pytest.raises(ValueError):
+        build_filter_expr({"id": 1})
+    with pytest.raises(ValueError):
+        build_filter_expr({"year": {"ne": 1990}})
+    with pytest.raises(ValueError):
+        build_filter_expr({"year": "nineties"})
+
+
+def test_document_fields_are_normalized():
+    fields = document_fields("text", {"genre": "Sci-Fi", "year": "2024", "rating": 5})
+    assert fields == {
+        "summary": "text",
+        "source": None,
+        "genre": "sci-fi",
+        "year": 2024,
+    }
+
+
+def test_tenant_partition_names_are_milvus_safe():
+    assert tenant_partition_name("default") == "_default"
+    assert tenant_partition_name("acme_1") == "tenant_acme_1"
+    name = tenant_partition_name("acme.com/eu")
+    assert name.startswith("tenant_acme_com_eu_") and name != tenant_partition_name(
+        "acme.com_eu"
+    )
+
+
+class _FakeCollection:
+    def __init__(self, partition_key, partitions=("_default",)):
+        key = SimpleNamespace(name="tenant") if partition_key else None
+        self.schema = SimpleNamespace(partition_key_field=key, fields=[])
+        self.partitions = set(partitions)
+        self.loaded = []
+        self.searches = []
+
+    def has_partition(self, name):
+        return name in self.partitions
+
+    def load(self, partition_names=None, **kwargs):
+        self.loaded.append(partition_names)
+
+    def search(self, **kwargs):
+        self.searches.append(kwargs)
+        return [[] for _ in kwargs["data"]]
+
+
+def _search(monkeypatch, collection, **kwargs):
+    monkeypatch.setattr(milvus_handler, "Collection", lambda name: collection)
+    handler = milvus_handler.MilvusHandler()
+    return handler.search("docs", np.ones((1, 4), dtype=np.float32), **kwargs)
+
+
+def test_partition_key_searches_filter_on_the_tenant(monkeypatch):
+    collection = _FakeCollection(partition_key=True)
+    _search(monkeypatch, collection, tenant="acme", filters={"genre": "drama"})
+    assert collection.loaded == [None]
+    assert collection.searches[0]["expr"] == 'tenant == "acme" and (genre == "drama")'
+    assert collection.searches[0]["partition_names"] is None
+
+
+def test_partition_searches_only_load_the_tenant_partition(monkeypatch):
+    collection = _FakeCollection(
+        partition_key=False, partitions=("_default", "tenant_acme")
+    )
+    _search(monkeypatch, collection, tenant="acme")
+    assert collection.loaded == [["tenant_acme"]]
+    assert collection.searches[0]["partition_names"] == ["tenant_acme"]
+    assert collection.searches[0]["expr"] is None
+
+    # A tenant without a partition has no documents; nothing is loaded or searched.
+    collection = _FakeCollection(partition_key=False)
+    assert _search(monkeypatch, collection, tenant="unknown") == [[]]
+    assert collection.loaded == [] and collection.searches == []
@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+
+from src.shared.utils import _format_doc, format_docs
+
+
+def test_rendered_context_is_reused_for_the_same_documents():
+    docs = [
+        Document(page_content="Hello", metadata={"uuid": "1"}),
+        Document(page_content="World"),
+    ]
+    first = format_docs(docs)
+    assert (
+        first
+        == "<documents>\n"
+        + "\n".join(_format_doc(doc) for doc in docs)
+        + "\n</documents>"
+    )
+    copies = [
+        Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+        for doc in docs
+    ]
+    assert format_docs(copies) is first
+
+
+def test_changed_metadata_is_rendered_again():
+    doc = Document(page_content="Hello", metadata={"id": 1, "distance": 0.5})
+    moved = Document(page_content="Hello", metadata={"id": 1, "distance": 0.2})
+    assert "0.2" in format_docs([moved]) and "0.5" in format_docs([doc])
+
+
+def test_unhashable_metadata_is_rendered_uncached():
+    doc = Document(page_content="Hello", metadata={"tags": ["a", "b"]})
+    assert (
+        format_docs([doc])
+        == format_docs([doc])
+        == f"<documents>\n{_format_doc(doc)}\n</documents>"
+    )
+
+
+def test_grounding_prompt_is_compiled_once_per_context():
+    from src.agent import prompts
+    from src.agent.rag_self_reflection.graph import _grounding_prompt, _render
+
+    template = prompts.HALLUCINATION_GRADER_HUMAN_PROMPT
+    context = format_docs([Document(page_content="Braces {stay} as they are")])
+    for generation in ("first answer", "second answer"):
+        rendered = _render(
+            _grounding_prompt(template, context), question="q?", generation=generation
+        )
+        assert rendered == template.format(
+            context=context, question="q?", generation=generation
+        )
+    assert _grounding_prompt.cache_info().hits >= 1
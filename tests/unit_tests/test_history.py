@@ -0,0 +1,75 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.shared.history import (
+    history_prompt,
+    messages_to_summarize,
+    offload_payload,
+    resolve_payload,
+    window_messages,
+)
+
+
+def _conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i}", id=f"h{i}"))
+        messages.append(AIMessage(content=f"answer {i}", id=f"a{i}"))
+    return messages
+
+
+def test_window_keeps_recent_messages_and_the_task():
+    messages = _conversation(10)
+    assert window_messages(messages, 4) == messages[-4:]
+    windowed = window_messages(messages, 4, keep_first=True)
+    assert windowed == [messages[0]] + messages[-3:]
+
+
+def test_window_does_not_start_with_a_tool_result():
+    messages = [
+        HumanMessage(content="q"),
+        AIMessage(
+            content="", tool_calls=[{"name": "search", "args": {}, "id": "call"}]
+        ),
+        ToolMessage(content="result", tool_call_id="call"),
+        AIMessage(content="done"),
+    ]
+    assert window_messages(messages, 2) == messages[-1:]
+
+
+def test_prompt_size_is_bounded_by_the_window():
+    sizes = [
+        len(
+            history_prompt(
+                "system", _conversation(turns), max_messages=6, summary="summary"
+            )
+        )
+        for turns in (5, 50, 500)
+    ]
+    assert sizes == [8, 8, 8]
+
+
+def test_old_messages_are_summarized_in_batches():
+    messages = _conversation(5)
+    assert messages_to_summarize(messages, max_messages=8, batch_size=4) == []
+    assert messages_to_summarize(messages, max_messages=6, batch_size=4) == messages[:4]
+
+
+def test_large_payloads_are_stored_by_reference():
+    results = [
+        {"url": f"https://example.com/{i}", "content": "x" * 500} for i in range(5)
+    ]
+    content, payloads = offload_payload("Search result", results, max_inline_chars=200)
+    (ref,) = payloads
+    assert ref in content
+    assert len(content) < 300
+    assert resolve_payload(payloads, ref) == results
+
+    content, payloads = offload_payload("Search result", "short", max_inline_chars=200)
+    assert content == "Search result: short"
+    assert payloads == {}
+
+
+def test_values_that_are_not_references_resolve_to_themselves():
+    results = [{"url": "https://example.com"}]
+    assert resolve_payload({}, results) is results
+    assert resolve_payload({}, "plain text") == "plain text"
@@ -0,0 +1,267 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from src.api.jobs import JobQueue, JobStore
+
+
+class _Admission:
+    def __init__(self, rejections=0):
+        self.rejections = rejections
+        self.admitted = []
+
+    @asynccontextmanager
+    async def admit(self, endpoint, model=None, requests=1, tokens=0):
+        if self.rejections:
+            self.rejections -= 1
+            raise HTTPException(
+                status_code=429, detail="busy", headers={"Retry-After": "0"}
+            )
+        self.admitted.append((endpoint, requests))
+        yield
+
+
+class _Graph:
+    checkpointer = None
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.batches = []
+
+    async def ainvoke(self, state, config=None, **kwargs):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id in self.fail_on:
+            self.fail_on.discard(thread_id)
+            raise RuntimeError("milvus down")
+        self.batches.append(list(state.docs))
+
+
+def _queue(tmp_path, graph, admission=None, **kwargs):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    return JobQueue(
+        store, lambda: graph, admission or _Admission(), batch_size=2, **kwargs
+    )
+
+
+def test_same_content_is_deduplicated(tmp_path):
+    async def scenario():
+        queue = _queue(tmp_path, _Graph())
+        await queue.store.open()
+        try:
+            job, created = await queue.submit(["a", "b"], {"tenant": "t1"})
+            again, created_again = await queue.submit(["a", "b"], {"tenant": "t1"})
+            other, created_other = await queue.submit(["a", "b"], {"tenant": "t2"})
+            return job, created, again, created_again, other, created_other
+        finally:
+            await queue.store.close()
+
+    job, created, again, created_again, other, created_other = asyncio.run(scenario())
+    assert created and not created_again and created_other
+    assert again.id == job.id and again.status == "queued"
+    assert other.id != job.id
+
+
+def test_job_runs_in_batches_and_reports_progress(tmp_path):
+    graph = _Graph()
+    admission = _Admission(rejections=1)
+
+    async def scenario():
+        queue = _queue(tmp_path, graph, admission)
+        await queue.store.open()
+        try:
+            job, _ = await queue.submit(["a", "b", "c", "d", "e"], {})
+            await queue.run(await queue.store.claim(60))
+            return await queue.store.get(job.id)
+        finally:
+            await queue.store.close()
+
+    job = asyncio.run(scenario())
+    assert graph.batches == [["a", "b"], ["c", "d"], ["e"]]
+    # The rejected batch waited and was admitted again.
+    assert admission.admitted == [("index", 2), ("index", 2), ("index", 1)]
+    assert job.status == "succeeded" and job.done == job.total == 5
+    assert job.docs_per_second > 0 and job.error is None
+
+
+def test_failed_job_is_retried_from_its_last_batch(tmp_path):
+    async def scenario():
+        store = JobStore(str(tmp_path / "jobs.sqlite"))
+        await store.open()
+        job, _ = await store.submit(["a", "b", "c", "d"], {})
+        await store.close()
+        graph = _Graph(fail_on={f"{job.id}:2"})
+        queue = _queue(tmp_path, graph, max_attempts=2)
+        await queue.store.open()
+        try:
+            await queue.run(await queue.store.claim(60))
+            failed = await queue.store.get(job.id)
+            await queue.run(await queue.store.claim(60))
+            return graph, failed, await queue.store.get(job.id)
+        finally:
+            await queue.store.close()
+
+    graph, failed, job = asyncio.run(scenario())
+    assert failed.status == "queued" and failed.done == 2
+    assert failed.error == "RuntimeError: milvus down"
+    assert graph.batches == [["a", "b"], ["c", "d"]]
+    assert job.status == "succeeded" and job.attempts == 2 and job.error is None
+
+
+def test_job_fails_after_max_attempts_and_resubmission_requeues_it(tmp_path):
+    async def scenario():
+        queue = _queue(tmp_path, _Graph(), max_attempts=1)
+        await queue.store.open()
+        try:
+            job, _ = await queue.submit(["a"], {})
+            queue.graph_factory = lambda: _Graph(fail_on={f"{job.id}:0"})
+            await queue.run(await queue.store.claim(60))
+            failed = await queue.store.get(job.id)
+            again, created = await queue.submit(["a"], {})
+            return failed, again, created
+        finally:
+            await queue.store.close()
+
+    failed, again, created = asyncio.run(scenario())
+    assert failed.status == "failed" and failed.finished_at is not None
+    assert not created and again.id == failed.id
+    assert again.status == "queued" and again.error is None
+
+
+def test_expired_lease_is_claimed_again_after_a_restart(tmp_path):
+    async def scenario():
+        store = JobStore(str(tmp_path / "jobs.sqlite"))
+        await store.open()
+        job, _ = await store.submit(["a", "b", "c"], {})
+        claimed = await store.claim(lease_seconds=60)
+        await store.progress(claimed.id, 2, 0.5, lease_seconds=60)
+        # Another worker sees nothing to do while the lease is held.
+        held = await store.claim(60)
+        await store.conn.execute(
+            "UPDATE index_jobs SET lease_until = ?", (time.time() - 1,)
+        )
+        await store.close()
+
+        # A restarted process picks the job up and finishes the remaining batch.
+        graph = _Graph()
+        queue = _queue(tmp_path, graph, poll_interval=0.01)
+        await queue.store.open()
+        queue.start()
+        try:
+            for _ in range(200):
+                resumed = await queue.store.get(job.id)
+                if resumed.status == "succeeded":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+            await queue.store.close()
+        return held, graph, resumed
+
+    held, graph, resumed = asyncio.run(scenario())
+    assert held is None
+    assert graph.batches == [["c"]]
+    assert resumed.status == "succeeded" and resumed.done == 3 and resumed.attempts == 2
+
+
+def test_concurrent_claims_take_different_jobs(tmp_path):
+    async def scenario():
+        store = JobStore(str(tmp_path / "jobs.sqlite"))
+        await store.open()
+        try:
+            await store.submit(["a"], {})
+            await store.submit(["b"], {})
+            return await asyncio.gather(
+                store.claim(60), store.claim(60), store.claim(60)
+            )
+        finally:
+            await store.close()
+
+    first, second, third = asyncio.run(scenario())
+    assert first.id != second.id and first.status == second.status == "running"
+    assert first.payload["documents"] != second.payload["documents"]
+    assert third is None
+
+
+def test_several_workers_drain_the_queue(tmp_path):
+    graph = _Graph()
+
+    async def scenario():
+        queue = _queue(tmp_path, graph, workers=3, poll_interval=0.01)
+        await queue.store.open()
+        queue.start()
+        try:
+            jobs = [
+                (await queue.submit([f"{i}a", f"{i}b", f"{i}c"], {}))[0]
+                for i in range(6)
+            ]
+            for _ in range(300):
+                statuses = [(await queue.store.get(job.id)).status for job in jobs]
+                if all(status == "succeeded" for status in statuses):
+                    break
+                await asyncio.sleep(0.01)
+            alive = all(not task.done() for task in queue._tasks)
+        finally:
+            await queue.stop()
+            await queue.store.close()
+        return statuses, alive
+
+    statuses, alive = asyncio.run(scenario())
+    assert statuses == ["succeeded"] * 6 and alive
+    # Each batch ran exactly once.
+    assert sorted(doc for batch in graph.batches for doc in batch) == sorted(
+        f"{i}{c}" for i in range(6) for c in "abc"
+    )
+
+
+def test_index_node_does_not_block_the_event_loop(monkeypatch):
+    from src.index_graph import graph as index_graph
+    from src.index_graph.state import IndexState
+
+    inserted = []
+
+    class _Embeddings:
+        vector_dim = 4
+
+        def __init__(self, **kwargs):
+            pass
+
+        def embed(self, texts):
+            time.sleep(0.2)  # local inference or a retry backoff
+            return [[0.0] * 4 for _ in texts]
+
+    class _Milvus:
+        def __init__(self, **kwargs):
+            pass
+
+        def connect(self):
+            pass
+
+        def ensure_collection(self, name, vector_dim):
+            pass
+
+        def insert_data(self, collection_name, embeddings, texts, metadata, tenant):
+            inserted.extend(texts)
+
+    monkeypatch.setattr(index_graph, "EmbeddingHandler", _Embeddings)
+    monkeypatch.setattr(index_graph, "MilvusHandler", _Milvus)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await index_graph.index_docs(
+            IndexState(docs=["a", "b"]), config={"configurable": {}}
+        )
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+    assert inserted == ["a", "b"]
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.evaluation.harness import evaluate, load_fixture
+from src.services.metrics import metrics
+from src.shared.memoize import (
+    _MISSING,
+    MemoryBackend,
+    SqliteBackend,
+    get_memo_backend,
+    memoize,
+    stable_key,
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_backends():
+    get_memo_backend.cache_clear()
+    yield
+    get_memo_backend.cache_clear()
+
+
+def test_keys_ignore_message_ids_and_dict_order():
+    assert stable_key("t", [HumanMessage(content="hi", id="1")]) == stable_key(
+        "t", [HumanMessage(content="hi", id="2")]
+    )
+    assert stable_key("t", {"a": 1, "b": 2}) == stable_key("t", {"b": 2, "a": 1})
+    assert stable_key("t", "q") != stable_key("u", "q")
+
+
+def test_memory_backend_evicts_least_recent_and_expired_entries():
+    backend = MemoryBackend(maxsize=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    assert backend.get("a") == 1
+    backend.set("c", 3, ttl=60)
+    assert backend.get("b") is _MISSING and backend.get("a") == 1
+    backend.set("d", 4, ttl=-1)
+    assert backend.get("d") is _MISSING
+
+
+def test_sqlite_backend_persists_across_instances(tmp_path):
+    path = str(tmp_path / "memo.sqlite")
+    first = SqliteBackend(path)
+    first.set("k", {"type": "yes"}, ttl=60)
+    first.set("old", "x", ttl=-1)
+    first.close()
+    second = SqliteBackend(path)
+    assert second.get("k") == {"type": "yes"}
+    assert second.get("old") is _MISSING
+    second.close()
+
+
+def _configuration(**overrides):
+    values = dict(
+        memo_backend="memory",
+        memo_path="",
+        memo_max_entries=16,
+        memo_ttl_seconds=60.0,
+        model="m1",
+    )
+    return SimpleNamespace(**{**values, **overrides})
+
+
+def test_results_are_keyed_by_arguments_and_configuration():
+    calls = []
+
+    @memoize("grade", lambda c: (c.model,))
+    async def grade(configuration, question, document):
+        calls.append((configuration.model, question, document))
+        return "yes"
+
+    async def scenario():
+        await grade(_configuration(), "q", "d1")
+        await grade(_configuration(), "q", "d1")
+        await grade(_configuration(), "q", "d2")
+        await grade(_configuration(model="m2"), "q", "d1")
+        await grade(_configuration(memo_backend="off"), "q", "d1")
+
+    asyncio.run(scenario())
+    assert calls == [
+        ("m1", "q", "d1"),
+        ("m1", "q", "d2"),
+        ("m2", "q", "d1"),
+        ("m1", "q", "d1"),
+    ]
+
+
+def test_failures_are_not_cached():
+    attempts = []
+
+    @memoize("flaky", lambda c: ())
+    async def flaky(configuration):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("timeout")
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await flaky(_configuration())
+        return await flaky(_configuration()), await flaky(_configuration())
+
+    assert asyncio.run(scenario()) == ("ok", "ok")
+    assert len(attempts) == 2
+
+
+def test_repeated_questions_reuse_grades_and_rewrites():
+    docs, cases = load_fixture()
+    cases = cases[:4]
+    settings = {"top_k": 3, "nprobe": 4, "grader_threshold": 0.9}
+    plain = asyncio.run(evaluate(settings, docs, cases))
+    memoized = {**settings, "memo_backend": "memory"}
+
+    def hits():
+        return metrics.snapshot()["counters"].get(
+            "memo.calls{result=hit,task=grade_documents}", 0
+        )
+
+    first = asyncio.run(evaluate(memoized, docs, cases))
+    before = hits()
+    second = asyncio.run(evaluate(memoized, docs, cases))
+
+    assert hits() > before
+
+    def tokens(report):
+        return report.summary()["tokens_per_question"]
+
+    assert tokens(second) < tokens(first) <= tokens(plain)
+    # Same answers, just fewer calls.
+    assert [r.answer for r in second.results] == [r.answer for r in plain.results]
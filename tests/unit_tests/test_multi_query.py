@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+from src.services.milvus_handler import merge_hits
+
+
+def _hit(id, distance):
+    return SimpleNamespace(id=id, distance=distance, entity={"summary": f"doc {id}"})
+
+
+def test_merge_hits_deduplicates_and_keeps_the_closest_match():
+    results = [
+        [_hit(1, 0.4), _hit(2, 0.5)],
+        [_hit(2, 0.1), _hit(3, 0.9)],
+        [],
+    ]
+    merged = merge_hits(results)
+    assert [hit.id for hit in merged] == [2, 1, 3]
+    assert merged[0].distance == 0.1
+
+
+def test_merged_hits_are_capped():
+    results = [
+        [_hit(i, i / 10) for i in range(3)],
+        [_hit(i + 10, i / 10 + 0.05) for i in range(3)],
+    ]
+    assert [hit.id for hit in merge_hits(results, limit=3)] == [0, 10, 1]
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from src.services.profiling import (
+    GRAPH_OVERHEAD,
+    NodeProfileReport,
+    node_profiles,
+    profiled,
+    should_profile,
+)
+
+
+class _State(TypedDict):
+    total: int
+
+
+async def crunch(state):
+    # Python work on the event loop.
+    deadline = time.perf_counter() + 0.15
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(1000))
+    return {"total": total}
+
+
+async def wait(state):
+    # Waiting on "I/O".
+    await asyncio.sleep(0.15)
+    return {"total": state["total"] + 1}
+
+
+def _graph():
+    workflow = StateGraph(_State)
+    workflow.add_node(crunch)
+    workflow.add_node(wait)
+    workflow.add_edge(START, "crunch")
+    workflow.add_edge("crunch", "wait")
+    workflow.add_edge("wait", END)
+    return workflow.compile()
+
+
+def test_profile_modes(monkeypatch):
+    monkeypatch.setenv("PROFILE_MODE", "off")
+    assert not should_profile("1")
+    monkeypatch.setenv("PROFILE_MODE", "header")
+    assert should_profile("1") and should_profile("true") and not should_profile(None)
+    monkeypatch.setenv("PROFILE_MODE", "all")
+    assert should_profile(None)
+
+
+def test_disabled_profiling_leaves_the_config_alone():
+    async def scenario():
+        config = {"configurable": {"thread_id": "t"}}
+        async with profiled("test", config, enabled=False) as run:
+            return config, run
+
+    config, run = asyncio.run(scenario())
+    assert run.config is config and run.path is None
+
+
+def test_profiled_run_writes_speedscope_file_and_node_report(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_INTERVAL_MS", "2")
+    node_profiles.reset()
+    graph = _graph()
+
+    async def scenario():
+        async with profiled("test", {"configurable": {}}) as run:
+            await graph.ainvoke({"total": 0}, run.config)
+        return run
+
+    run = asyncio.run(scenario())
+    with open(run.path, encoding="utf-8") as f:
+        profile = json.load(f)
+
+    names = [frame["name"] for frame in profile["shared"]["frames"]]
+    assert "[node] crunch" in names and "crunch" in names
+    main = next(p for p in profile["profiles"] if p["name"] == "MainThread")
+    assert main["type"] == "sampled" and len(main["samples"]) == len(main["weights"])
+    crunch_frame = names.index("[node] crunch")
+    # Node frames are the roots of the stacks sampled while the node ran.
+    assert any(
+        stack[0] == crunch_frame and names[stack[-1]] == "crunch"
+        for stack in main["samples"]
+    )
+
+    report = node_profiles.snapshot()
+    assert report["runs"] == 1
+    nodes = report["nodes"]
+    assert nodes["crunch"]["calls"] == nodes["wait"]["calls"] == 1
+    assert nodes["wait"]["wall_seconds"] >= 0.15
+    # Busy Python shows up as CPU; sleeping does not.
+    assert nodes["crunch"]["cpu_seconds"] > 0.1
+    assert nodes["wait"]["cpu_seconds"] < nodes["crunch"]["cpu_seconds"] / 2
+
+
+def test_report_accumulates_across_runs():
+    report = NodeProfileReport()
+
+    class _Tracker:
+        intervals = [("grade", 0.0, 1.0)]
+
+    class _Profiler:
+        def node_seconds(self):
+            return {"grade": 0.25, GRAPH_OVERHEAD: 0.5}
+
+    report.add(_Tracker(), _Profiler())
+    report.add(_Tracker(), _Profiler())
+    snapshot = report.snapshot()
+    assert snapshot["runs"] == 2
+    assert snapshot["nodes"]["grade"]["calls"] == 2
+    assert snapshot["nodes"]["grade"]["mean_cpu_seconds"] == 0.25
+    assert snapshot["nodes"][GRAPH_OVERHEAD]["cpu_seconds"] == 1.0
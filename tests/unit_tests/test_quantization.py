@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from src.services.quantization import (
+    binarize,
+    bytes_per_vector,
+    calibrate_int8_scale,
+    decode_from_storage,
+    encode_for_storage,
+    hamming_distances,
+    quantize_int8,
+    rescore,
+    stored_bytes_per_vector,
+)
+
+# The dimension of the default embedding model (text-embedding-3-small).
+DIM = 1536
+TOP_K = 10
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Clustered, unit-normalized vectors with queries near existing documents."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(50, DIM))
+    docs = centers[rng.integers(0, 50, 2000)] + 0.8 * rng.normal(size=(2000, DIM))
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries = docs[rng.choice(len(docs), 100, replace=False)]
+    queries = queries + 0.2 * rng.normal(size=queries.shape) / np.sqrt(DIM)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs.astype(np.float32), queries.astype(np.float32)
+
+
+def _top_k(queries, docs):
+    return np.argsort(-(queries @ docs.T), axis=1)[:, :TOP_K]
+
+
+def _recall(approx, exact):
+    return np.mean([len(set(a) & set(e)) / TOP_K for a, e in zip(approx, exact)])
+
+
+@pytest.mark.parametrize(
+    "storage, min_recall",
+    [("float32", 1.0), ("float16", 0.99), ("bfloat16", 0.98)],
+)
+def test_quantized_recall(corpus, storage, min_recall):
+    docs, queries = corpus
+    decoded = decode_from_storage(encode_for_storage(docs, storage), DIM, storage)
+    assert _recall(_top_k(queries, decoded), _top_k(queries, docs)) >= min_recall
+
+
+def _l2_top_k(queries, docs):
+    distances = (
+        (queries**2).sum(axis=1)[:, None]
+        - 2 * queries @ docs.T
+        + (docs**2).sum(axis=1)[None, :]
+    )
+    return np.argsort(distances, axis=1)[:, :TOP_K]
+
+
+def test_int8_recall_with_quantized_queries(corpus):
+    docs, queries = corpus
+    scale = calibrate_int8_scale(docs[:256])
+    # Milvus compares int8 codes of the query and the documents by L2 distance.
+    codes = np.asarray(encode_for_storage(docs, "int8", scale), dtype=np.float32)
+    query_codes = np.asarray(
+        encode_for_storage(queries, "int8", scale), dtype=np.float32
+    )
+    assert np.abs(codes).max() > 100
+    assert _recall(_l2_top_k(query_codes, codes), _top_k(queries, docs)) >= 0.95
+
+
+def test_binary_search_with_rescoring_recall(corpus):
+    docs, queries = corpus
+    packed = binarize(docs)
+    scale = calibrate_int8_scale(docs[:256])
+    codes = decode_from_storage(quantize_int8(docs, scale), DIM, "int8", scale)
+
+    approx = []
+    for query in queries:
+        distances = hamming_distances(binarize(query), packed)
+        candidates = np.argsort(distances, kind="stable")[: TOP_K * 4]
+        order, _ = rescore(query, codes[candidates], TOP_K)
+        approx.append(candidates[order])
+
+    assert _recall(approx, _top_k(queries, docs)) >= 0.85
+
+
+def test_storage_sizes():
+    assert bytes_per_vector(1536, "float32") == 6144
+    assert bytes_per_vector(1536, "float16") == 3072
+    assert bytes_per_vector(1536, "int8") == 1536
+    assert bytes_per_vector(1536, "binary") == 192
+    assert len(encode_for_storage(np.ones((1, 1536)), "binary")[0]) == 192
+    # Binary rows also store the int8 rescoring codes.
+    assert stored_bytes_per_vector(1536, "binary") == 192 + 1536
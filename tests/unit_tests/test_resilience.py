@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from src.services import resilience
+from src.services.metrics import metrics
+from src.services.resilience import (
+    CircuitOpenError,
+    RetryPolicy,
+    acall_with_retry,
+    call_with_retry,
+    get_endpoint,
+)
+
+
+@pytest.fixture
+def endpoint(request):
+    name = f"test.{request.node.name}"
+    state = get_endpoint(name)
+    state.policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+    yield name
+    resilience._endpoints.pop(name, None)
+
+
+def _flaky(failures, exc=ConnectionError):
+    calls = {"n": 0}
+
+    def fn():
+        calls["n"] += 1
+        if calls["n"] <= failures:
+            raise exc("transient")
+        return "ok"
+
+    return fn, calls
+
+
+def test_transient_failures_are_retried(endpoint):
+    fn, calls = _flaky(2)
+    assert call_with_retry(fn, endpoint=endpoint) == "ok"
+    assert calls["n"] == 3
+    assert (
+        metrics.snapshot()["counters"][f"resilience.retries{{endpoint={endpoint}}}"]
+        == 2
+    )
+
+
+def test_non_retryable_errors_are_raised_immediately(endpoint):
+    fn, calls = _flaky(1, exc=ValueError)
+    with pytest.raises(ValueError):
+        call_with_retry(fn, endpoint=endpoint)
+    assert calls["n"] == 1
+
+
+def test_breaker_opens_after_repeated_failures(endpoint):
+    get_endpoint(endpoint).breaker.failure_threshold = 3
+    fn, _ = _flaky(10)
+    with pytest.raises(ConnectionError):
+        call_with_retry(fn, endpoint=endpoint)
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(fn, endpoint=endpoint)
+
+
+def test_hedged_request_returns_the_faster_attempt(endpoint):
+    get_endpoint(endpoint).hedge_after = 0.01
+    calls = {"n": 0}
+
+    async def fn():
+        calls["n"] += 1
+        await asyncio.sleep(1.0 if calls["n"] == 1 else 0.0)
+        return calls["n"]
+
+    started = time.perf_counter()
+    assert asyncio.run(acall_with_retry(fn, endpoint=endpoint, hedge=True)) == 2
+    assert time.perf_counter() - started < 0.5
+
+
+def test_backoff_on_the_event_loop_is_reported(endpoint):
+    blocking = f"resilience.blocking_backoffs{{endpoint={endpoint}}}"
+
+    async def on_loop():
+        fn, _ = _flaky(1)
+        return call_with_retry(fn, endpoint=endpoint)
+
+    async def offloaded():
+        fn, _ = _flaky(1)
+        return await asyncio.to_thread(call_with_retry, fn, endpoint=endpoint)
+
+    assert asyncio.run(offloaded()) == "ok"
+    assert blocking not in metrics.snapshot()["counters"]
+    assert asyncio.run(on_loop()) == "ok"
+    assert metrics.snapshot()["counters"][blocking] == 1
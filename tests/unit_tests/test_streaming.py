@@ -0,0 +1,100 @@
+import asyncio
+import json
+from contextlib import AsyncExitStack
+from typing import Annotated, TypedDict
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph, add_messages
+
+from src.api.admission import AdmissionController, AdmissionSettings
+from src.api.streaming import HeldStreamingResponse, stream_graph
+
+
+class _State(TypedDict):
+    messages: Annotated[list, add_messages]
+    payloads: dict
+
+
+def _graph():
+    model = GenericFakeChatModel(
+        messages=iter([AIMessage(content="partial scrape summary")])
+    )
+
+    def summarize(state, config):
+        return {
+            "messages": [model.invoke("summarize", config)],
+            "payloads": {"payload:1": "x" * 10_000},
+        }
+
+    workflow = StateGraph(_State)
+    workflow.add_node(summarize)
+    workflow.add_edge(START, "summarize")
+    workflow.add_edge("summarize", END)
+    return workflow.compile()
+
+
+def _parse(frames):
+    events = []
+    for frame in frames:
+        event, data = frame.strip().split("\n")
+        events.append(
+            (event.removeprefix("event: "), json.loads(data.removeprefix("data: ")))
+        )
+    return events
+
+
+def test_tokens_and_updates_are_streamed_before_the_end_event():
+    async def collect():
+        config = {"configurable": {"thread_id": "t1"}}
+        return [
+            frame async for frame in stream_graph(_graph(), {"messages": []}, config)
+        ]
+
+    events = _parse(asyncio.run(collect()))
+    kinds = [event for event, _ in events]
+    assert kinds[0] == "token" and kinds[-2:] == ["update", "end"]
+    assert (
+        "".join(data["content"] for event, data in events if event == "token")
+        == "partial scrape summary"
+    )
+
+    update = events[-2][1]
+    assert update["node"] == "summarize"
+    assert update["update"]["messages"][0]["content"] == "partial scrape summary"
+    assert "payloads" not in update["update"]
+    assert events[-1][1] == {"thread_id": "t1"}
+
+
+def test_held_resources_are_released_when_the_client_leaves_before_the_first_chunk():
+    async def scenario():
+        admission = AdmissionController(
+            AdmissionSettings(endpoint_concurrency={"research": 1})
+        )
+        stack = AsyncExitStack()
+        await stack.enter_async_context(admission.admit("research"))
+        started = asyncio.Event()
+
+        async def body():
+            yield "never sent"
+
+        async def send(message):
+            started.set()
+            # The client is gone; the response start is never delivered.
+            await asyncio.Event().wait()
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        response = HeldStreamingResponse(body(), stack, media_type="text/event-stream")
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        task = asyncio.create_task(response(scope, receive, send))
+        await started.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return admission._gates["endpoint:research"].in_flight
+
+    assert asyncio.run(scenario()) == 0